@@ -1,4 +1,7 @@
 from cvc_cli import convert
 from cvc_cli import cli
+from cvc_cli.mono.rectifier import MonoRectifier
+from cvc_cli.stereo.calibrator import Calibrator
+from cvc_cli.stereo.rectifier import StereoRectifier
 
-__all__ = ['convert', 'cli']
+__all__ = ['convert', 'cli', 'Calibrator', 'MonoRectifier', 'StereoRectifier']
@@ -6,12 +6,38 @@ from os.path import join
 from tqdm import tqdm
 from enum import Enum
 from typing import Tuple
-from cvc_cli.stereo.utils import get_list_of_images
-from cvc_cli.mono.calibration import mono_calibration
+from cvc_cli.stereo.utils import get_list_of_images, subsample
+from cvc_cli.mono.rectifier import MonoRectifier
+from cvc_cli.stereo.detection import benchmark_detectors
+from cvc_cli.stereo.calibrator import Calibrator
+from cvc_cli.stereo.params import load_intrinsics
 
 
 class PatternType(str, Enum):
     checkerboard = 'checkerboard'
+    circles = 'circles'
+    acircles = 'acircles'
+    charuco = 'charuco'
+
+
+class Precheck(str, Enum):
+    none = 'none'
+    fast = 'fast'
+    check = 'check'
+
+
+class Detector(str, Enum):
+    classic = 'classic'
+    sb = 'sb'
+
+
+class DistortionModel(str, Enum):
+    k1k2 = 'k1k2'
+    standard = 'standard'
+    rational = 'rational'
+    thin_prism = 'thin-prism'
+    tilted = 'tilted'
+    fisheye = 'fisheye'
 
 
 app = typer.Typer()
@@ -20,74 +46,126 @@ app = typer.Typer()
 @app.command()
 def cal(image_folder, pattern_type: PatternType = PatternType.checkerboard,
         pattern_shape: Tuple[int, int] = [9, 6], pattern_size: int = 25, show: bool = False,
-        debug: bool = False, output_filename='calib.yml'):
+        debug: bool = False, output_filename='calib.yml', recursive: bool = False, max_frames: int = 0,
+        stride: int = 1, seed: int = 0, max_views: int = 0, precheck: Precheck = Precheck.none,
+        detector: Detector = Detector.classic, marker_size: float = 0, aruco_dict: str = 'DICT_5X5_100',
+        reject_threshold: float = 0, reject_rounds: int = 3, init_intrinsics: str = None, init_camera: int = 0,
+        model: DistortionModel = DistortionModel.standard, max_iter: int = 30, eps: float = 0.001):
     """ Monocular calibration
 
+    Use --model to choose the distortion model: k1k2 (radial k1, k2), standard (k1, k2, p1, p2, k3), rational
+    (+ k4, k5, k6), thin-prism (+ s1..s4), tilted (+ tilted sensor) or fisheye (cv2.fisheye equidistant model).
+    The solver stops after --max-iter iterations or when the change is below --eps.
+
+    Use --precheck check (cv2.checkChessboard on a downscaled image) or --precheck fast (the same test on the
+    full resolution image) to quickly discard frames without the pattern. The number of frames
+    rejected by the pre-check is printed apart from the detection failures.
+
+    Circle grids (--pattern-type circles or acircles) use --pattern-shape as circles per row and rows, and
+    --pattern-size as the circle spacing in mm.
+
+    ChArUco boards (--pattern-type charuco) use --pattern-shape as the number of squares, --pattern-size as the
+    square size and --marker-size as the marker size in mm (3/4 of the square by default). Partially visible
+    boards are used.
+
+    Use --detector sb to detect the chessboard with findChessboardCornersSB instead of findChessboardCorners.
+
+    Use --init-intrinsics to warm-start the solve from a calibration file (cvc-mono cal output, OpenCV
+    camera_matrix/distortion_coefficients, or M1/D1/M2/D2 stereo intrinsics with --init-camera 0 or 1).
+
+    Use --reject-threshold (pixels) to automatically drop the views with a larger reprojection RMS and solve
+    again, for at most --reject-rounds rounds.
+
+    Use --max-views to solve with a diverse subset (board position, scale and tilt) of the detected views.
+
+    Use --stride and --max-frames to calibrate from a deterministic (seeded) subset of the images,
+    for example on long continuous recordings
+
     Example:
 
     cvc-mono cal ./data/stereo/left
     """
 
-    paths = get_list_of_images(image_folder)
-
-    result, mtx, dist, rvecs, tvecs, w, h = mono_calibration(paths, pattern_type.value, pattern_shape,
-                                                             pattern_size, show)
-
-    if result is False:
-        typer.echo('Calibration pattern not found in any image', err=True)
+    paths = get_list_of_images(image_folder, recursive)
+    paths = subsample(paths, max_frames, stride, seed)
+
+    camera = None
+    if init_intrinsics is not None:
+        try:
+            camera = load_intrinsics(init_intrinsics)[init_camera]
+        except (ValueError, IndexError):
+            typer.echo(f'Camera {init_camera} intrinsics not found in {init_intrinsics}', err=True)
+            exit()
+
+    calibrator = Calibrator(pattern_type.value, pattern_shape, pattern_size, detector=detector.value,
+                            precheck=precheck.value, marker_size=marker_size, aruco_dict=aruco_dict,
+                            model=model.value, max_iter=max_iter, eps=eps, max_views=max_views,
+                            reject_threshold=reject_threshold, reject_rounds=reject_rounds, show=show, debug=debug,
+                            verbose=True)
+    try:
+        rectifier = calibrator.calibrate_mono(paths, init_intrinsics=camera)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
         exit()
 
-    # Before saving the files, convert the intrinsics to deal with black pixels. Create a scaled image
-    # without missed pixels
-    newcameramtx, roi = cv2.getOptimalNewCameraMatrix(mtx, dist, (w, h), 1, (w, h))
-    mapx, mapy = cv2.initUndistortRectifyMap(mtx, dist, None, newcameramtx, (w, h), 5)
-
+    # The mapping keeps all the source pixels (scaled intrinsics), roi is the region without black pixels
     print(f'Saving camera mapping in {output_filename}')
-    cv_file = cv2.FileStorage(output_filename, cv2.FILE_STORAGE_WRITE)
-    cv_file.write('roi', roi)
-    cv_file.write('intrinsics', mtx)
-    cv_file.write('dist', dist)
-    cv_file.write('mapx', mapx)
-    cv_file.write('mapy', mapy)
-    cv_file.release()
+    rectifier.save(output_filename)
 
 
 @app.command()
-def rect(image_folder, cal_file, debug: bool = False, use_roi: bool = True, output_folder: str = './output'):
+def rect(image_folder, cal_file, debug: bool = False, use_roi: bool = True, output_folder: str = './output',
+         color: bool = False, also_gray: bool = False):
     """ Rectify images from a given folder using a cal_file
 
+    Use --color to rectify the color (BGR) images, add --also-gray to also write the gray images (in
+    output_folder/gray) from the same decode
+
     Example:
 
     cvc-mono rect ./data/stereo/left ./data/calibration_files/left.yml
     """
-    cv_file = cv2.FileStorage(cal_file, cv2.FILE_STORAGE_READ)
-    roi = cv_file.getNode("roi").mat()
-    mapx = cv_file.getNode("mapx").mat()
-    mapy = cv_file.getNode("mapy").mat()
-    cv_file.release()
+    try:
+        rectifier = MonoRectifier.from_file(cal_file, use_roi=use_roi)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        exit()
 
     paths = get_list_of_images(image_folder)
 
     if len(paths) > 0:
         system(f'mkdir -p {output_folder}')
+        if color and also_gray:
+            system(f'mkdir -p {output_folder}/gray')
 
         for im_path in tqdm(paths):
-            im_gray = cv2.imread(im_path, 0)
-
-            # Applying stereo image rectification on the left image
-            im_rect = cv2.remap(im_gray, mapx, mapy, cv2.INTER_LANCZOS4, cv2.BORDER_CONSTANT, 0)
-            x, y, w, h = roi
-            x = int(x)
-            y = int(y)
-            w = int(w)
-            h = int(h)
-            im_rect = im_rect[y:y+h, x:x+w]
+            # Color images are decoded once and the channels are remapped together
+            im = cv2.imread(im_path, cv2.IMREAD_COLOR if color else cv2.IMREAD_GRAYSCALE)
+            im_rect = rectifier.rectify(im)
             new_path = join(f'{output_folder}', pathlib.Path(im_path).name)
             cv2.imwrite(new_path, im_rect)
+            if color and also_gray:
+                cv2.imwrite(join(f'{output_folder}/gray', pathlib.Path(im_path).name),
+                            cv2.cvtColor(im_rect, cv2.COLOR_BGR2GRAY))
 
     print(f'Rectification ended, results are inside {output_folder}')
 
 
+@app.command()
+def bench_detectors(image_folder, pattern_shape: Tuple[int, int] = [9, 6], max_frames: int = 100):
+    """ Compares the detection rate and time per image of the chessboard detectors
+
+    Example:
+
+    cvc-mono bench-detectors ./data/stereo/left
+    """
+    paths = subsample(get_list_of_images(image_folder), max_frames)
+    results = benchmark_detectors(paths, pattern_shape)
+    print(f'{"detector":>10} {"detected":>10} {"ms/image":>10}')
+    for name, (found, total, ms) in results.items():
+        print(f'{name:>10} {f"{found}/{total}":>10} {ms:10.1f}')
+
+
 def main():
     app()
 
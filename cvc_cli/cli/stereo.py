@@ -1,5 +1,8 @@
 import cv2
+import itertools
 import pathlib
+import signal
+import time
 import typer
 import numpy as np
 from tqdm import tqdm
@@ -7,21 +10,89 @@ from enum import Enum
 from os.path import join
 from os import system
 from typing import Tuple
-from cvc_cli.stereo.utils import get_list_of_stereo_images as get_list_of_images
-from cvc_cli.stereo.calibration import stereo_calibration
+from cvc_cli.stereo.manifest import (MANIFEST_NAME, build_manifest, image_size, load_manifest, save_manifest,
+                                     load_stereo_pairs)
+from cvc_cli.stereo.utils import iter_stereo_pairs, subsample
+from cvc_cli.stereo.params import load_intrinsics, load_stereo_params
+from cvc_cli.stereo.solver import distortion_model
+from cvc_cli.stereo.calibrator import Calibrator
+from cvc_cli.stereo.rectifier import StereoRectifier
+from cvc_cli.stereo.batch import OutputSpec, merge_stats, parse_outputs, print_output_stats, write_rectified_pair
+from cvc_cli.stereo.depth import DepthEstimator, write_depth_pair
+from cvc_cli.stereo.depth_store import DepthWriter
+from cvc_cli.stereo.pipeline import DepthPipeline, write_pipeline_pair
+from cvc_cli.stereo.pool import DepthPool, RectifierPool
+from cvc_cli.stereo.prefetch import PairPrefetcher
+from cvc_cli.stereo.server import RectificationServer, benchmark_server, print_latencies
 
 
 class PatternType(str, Enum):
     checkerboard = 'checkerboard'
+    circles = 'circles'
+    acircles = 'acircles'
+    charuco = 'charuco'
+
+
+class Precheck(str, Enum):
+    none = 'none'
+    fast = 'fast'
+    check = 'check'
+
+
+class Detector(str, Enum):
+    classic = 'classic'
+    sb = 'sb'
+
+
+class DistortionModel(str, Enum):
+    k1k2 = 'k1k2'
+    standard = 'standard'
+    rational = 'rational'
+    thin_prism = 'thin-prism'
+    tilted = 'tilted'
+    fisheye = 'fisheye'
+
+
+class Matcher(str, Enum):
+    sgbm = 'sgbm'
+    bm = 'bm'
+
+
+class DepthType(str, Enum):
+    uint16 = 'uint16'
+    float16 = 'float16'
+    float32 = 'float32'
+
+
+class Compression(str, Enum):
+    zlib = 'zlib'
+    lz4 = 'lz4'
+    none = 'none'
 
 
 app = typer.Typer()
 
 
 @app.command()
-def rect(stereo_folder, cal_file, debug: bool = False, output_folder: str = './output'):
+def rect(stereo_folder, cal_file, debug: bool = False, output_folder: str = './output', manifest: str = None,
+         workers: int = 1, outputs: str = 'left,right', stack: bool = False, stack_lines: int = 9,
+         line_color: Tuple[int, int, int] = (255, 0, 0), color: bool = False, also_gray: bool = False):
     """ Stereo rectification
 
+    Use --color to rectify the color (BGR) images, add --also-gray to also write the gray outputs (left_gray,
+    right_gray and stack_gray folders) from the same decode
+
+    Use --outputs to select the written images among left, right and stack, each one as name[:format[:quality]],
+    for example --outputs left:jpg,right:jpg:90,stack:png (the format of the source images by default). left and
+    right must have the same format, so that cvc-stereo depth can pair them. Files, bytes and write time of each
+    output are printed at the end.
+
+    The stack output (or --stack) is the side by side rectified pair with --stack-lines horizontal guide lines
+    of --line-color (B G R, gray images use B). It costs one more encode per pair, so it is off by default
+
+    Use --workers to rectify with several processes, the maps are loaded once and shared by all of them
+    (multiprocessing.shared_memory)
+
     Notes:
 
     Spected structure of the stereo folder
@@ -37,63 +108,249 @@ def rect(stereo_folder, cal_file, debug: bool = False, output_folder: str = './o
 
     """
     # Reading the mapping values for stereo image rectification
-    cv_file = cv2.FileStorage(cal_file, cv2.FILE_STORAGE_READ)
-    left_stereo_map_x = cv_file.getNode("left_stereo_map_x").mat()
-    left_stereo_map_y = cv_file.getNode("left_stereo_map_y").mat()
-    right_stereo_map_x = cv_file.getNode("right_stereo_map_x").mat()
-    right_stereo_map_y = cv_file.getNode("right_stereo_map_y").mat()
-    cv_file.release()
+    try:
+        rectifier = StereoRectifier.from_file(cal_file)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        exit()
 
-    stereo_pairs, _ = get_list_of_images(stereo_folder)
+    if also_gray and not color:
+        typer.echo('--also-gray needs --color, the gray outputs are converted from the color ones', err=True)
+        exit()
+    try:
+        output_specs = parse_outputs(outputs)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        exit()
+    if stack and 'stack' not in [output.name for output in output_specs]:
+        output_specs.append(OutputSpec('stack', None, None))
+
+    stereo_pairs, _ = load_stereo_pairs(stereo_folder, manifest)
 
     if len(stereo_pairs) > 0:
-        system(f'mkdir -p {output_folder}/left')
-        system(f'mkdir -p {output_folder}/right')
-        system(f'mkdir -p {output_folder}/stack')
-
-        for left_path, right_path in tqdm(stereo_pairs):
-            left_im_gray = cv2.imread(left_path, 0)
-            right_im_gray = cv2.imread(right_path, 0)
-
-            # Applying stereo image rectification on the left image
-            left_rect = cv2.remap(left_im_gray, left_stereo_map_x, left_stereo_map_y, cv2.INTER_LANCZOS4,
-                                  cv2.BORDER_CONSTANT, 0)
-
-            # Applying stereo image rectification on the right image
-            right_rect = cv2.remap(right_im_gray, right_stereo_map_x, right_stereo_map_y, cv2.INTER_LANCZOS4,
-                                   cv2.BORDER_CONSTANT, 0)
-
-            if debug:
-                stereo_stack = np.hstack((left_rect, right_rect))
-                cv2.imshow('stereo_rect', stereo_stack)
-                cv2.waitKey(2000)
-
-            new_left_path = join(f'{output_folder}/left', pathlib.Path(left_path).name)
-            new_right_path = join(f'{output_folder}/right', pathlib.Path(right_path).name)
-            stack_path = join(f'{output_folder}/stack', pathlib.Path(right_path).name)
-
-            stack = np.hstack((left_rect, right_rect))
-            # Add lines to stack
-            step = int(stack.shape[0]/10)
-            for i in range(1, 10):
-                pt1 = (0, step * i)
-                pt2 = (stack.shape[1] - 1, step * i)
-                stack = cv2.line(stack, pt1, pt2, (255, 0, 0), 1)
-
-            cv2.imwrite(new_left_path, left_rect)
-            cv2.imwrite(new_right_path, right_rect)
-            cv2.imwrite(stack_path, stack)
-        print('Results are in ./output')
+        for output in output_specs:
+            system(f'mkdir -p {output_folder}/{output.name}')
+            if color and also_gray:
+                system(f'mkdir -p {output_folder}/{output.name}_gray')
+        options = {'lines': stack_lines, 'line_color': tuple(line_color), 'color': color, 'gray': also_gray}
+
+        stats = {}
+        start = time.perf_counter()
+        if workers > 1 and not debug:
+            with RectifierPool(rectifier, workers=workers) as pool:
+                for pair_stats in tqdm(pool.write_many(stereo_pairs, output_folder, output_specs, **options),
+                                       total=len(stereo_pairs)):
+                    merge_stats(stats, pair_stats)
+        else:
+            # The side-by-side buffers are reused for all the pairs
+            buffers = None
+            for left_path, right_path in tqdm(stereo_pairs):
+                buffers, pair_stats = write_rectified_pair(rectifier, left_path, right_path, output_folder,
+                                                           output_specs, buffers, show=debug, **options)
+                merge_stats(stats, pair_stats)
+        print_output_stats(stats, time.perf_counter() - start)
+        print(f'Results are in {output_folder}')
+    else:
+        print('No image pair found')
+
+
+@app.command()
+def depth(stereo_folder, cal_file, output_folder: str = None, manifest: str = None, workers: int = 1,
+          matcher: Matcher = Matcher.sgbm, num_disparities: int = 64, block_size: int = 5, scale: float = 1.0,
+          tile_height: int = 0, preview: bool = True, arrays: bool = True, raw: bool = False, outputs: str = None,
+          depth_file: str = None, depth_type: DepthType = DepthType.uint16,
+          compression: Compression = Compression.zlib):
+    """ Disparity and depth of stereo pairs
+
+    stereo_folder holds the rectified pairs in its left and right folders (for example the output folder of
+    cvc-stereo rect) and cal_file is the calibration used to rectify them, its Q matrix converts disparities to
+    depth (meters). The colored disparity previews are written in output_folder/depth and the float32 depth
+    arrays (0 where unknown) in output_folder/depth_npy, output_folder is stereo_folder by default so
+    view-images shows them.
+
+    With --raw, stereo_folder holds the raw pairs: each pair is rectified with the maps of cal_file and matched in
+    memory, without writing and reading the rectified images back. Use --outputs (as in cvc-stereo rect) to also
+    write some rectified images, for example --outputs left. The pairs are streamed while the folder is being
+    listed, unless --manifest is given.
+
+    Use --matcher bm for the faster block matcher, --num-disparities (multiple of 16) for the search range in
+    pixels, --scale 0.5 to match half resolution images for throughput, --tile-height to match large images in
+    horizontal bands of that many rows and --workers to compute several pairs in parallel.
+
+    Use --depth-file to store the whole depth sequence in one chunked and compressed file (read it with
+    cvc_cli.stereo.depth_store.DepthReader), as --depth-type uint16 millimeters, float16 or float32 meters,
+    compressed with --compression zlib or lz4. Add --no-arrays to skip the depth_npy files. The file is written
+    by the main process, so it needs --workers 1.
+
+    Example:
+
+    cvc-stereo rect ./data/stereo/ stereo_params.yml --output-folder ./output
+
+    cvc-stereo depth ./output stereo_params.yml
+
+    cvc-stereo depth ./data/stereo/ stereo_params.yml --raw --output-folder ./output
+
+    cvc-stereo depth ./output stereo_params.yml --depth-file ./output/depth.cvcd --no-arrays
+    """
+    try:
+        if raw:
+            rectifier = StereoRectifier.from_file(cal_file)
+            params = rectifier.params
+        else:
+            params = load_stereo_params(cal_file)
+        output_specs = parse_outputs(outputs) if outputs else []
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        exit()
+    if output_specs and not raw:
+        typer.echo('--outputs needs --raw', err=True)
+        exit()
+    if depth_file is not None and workers > 1:
+        typer.echo('--depth-file needs --workers 1', err=True)
+        exit()
+    if 'Q' not in params:
+        typer.echo(f'No Q matrix in {cal_file}, calibrate again with cvc-stereo cal', err=True)
+        exit()
+    try:
+        estimator = DepthEstimator(params['Q'], matcher.value, num_disparities, block_size, scale, tile_height)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        exit()
+
+    if manifest is not None:
+        stereo_pairs = iter(load_stereo_pairs(stereo_folder, manifest)[0])
+    elif all(pathlib.Path(stereo_folder, side).is_dir() for side in ['left', 'right']):
+        stereo_pairs = iter_stereo_pairs(stereo_folder)
     else:
+        typer.echo(f'{stereo_folder} does not contain the left and right folders', err=True)
+        exit()
+    first_pair = next(stereo_pairs, None)
+    if first_pair is None:
         print('No image pair found')
+        exit()
+    if 'image_size' in params and image_size(first_pair[0]) != params['image_size']:
+        typer.echo(f'The images of {stereo_folder} are not of the calibration size {params["image_size"]}',
+                   err=True)
+        exit()
+    stereo_pairs = itertools.chain([first_pair], stereo_pairs)
+
+    depth_writer = None
+    if depth_file is not None:
+        try:
+            depth_writer = DepthWriter(depth_file, depth_type.value, compression.value)
+        except ValueError as e:
+            typer.echo(str(e), err=True)
+            exit()
+
+    output_folder = output_folder or stereo_folder
+    system(f'mkdir -p {output_folder}/depth {output_folder}/depth_npy')
+    for output in output_specs:
+        system(f'mkdir -p {output_folder}/{output.name}')
+    options = {'preview': preview, 'arrays': arrays}
+    stats = {}
+    start = time.perf_counter()
+    if depth_writer is not None:
+        options['depth_writer'] = depth_writer
+    try:
+        if raw and workers > 1:
+            with RectifierPool(rectifier, workers=workers, estimator=estimator) as pool:
+                for pair_stats in tqdm(pool.write_depth_many(stereo_pairs, output_folder, output_specs, **options)):
+                    merge_stats(stats, pair_stats)
+        elif raw:
+            # Rectified into one reused buffer and matched in memory
+            pipeline = DepthPipeline(rectifier, estimator)
+            for left_path, right_path in tqdm(stereo_pairs):
+                merge_stats(stats, write_pipeline_pair(pipeline, left_path, right_path, output_folder, output_specs,
+                                                       **options))
+        elif workers > 1:
+            with DepthPool(estimator, workers) as pool:
+                for pair_stats in tqdm(pool.write_many(stereo_pairs, output_folder, **options)):
+                    merge_stats(stats, pair_stats)
+        else:
+            for left_path, right_path in tqdm(stereo_pairs):
+                merge_stats(stats, write_depth_pair(estimator, left_path, right_path, output_folder, **options))
+    finally:
+        # The frames written so far stay readable if the loop fails or is interrupted
+        if depth_writer is not None:
+            depth_writer.close()
+    if depth_writer is not None:
+        size = pathlib.Path(depth_file).stat().st_size
+        print(f'{len(depth_writer.names)} depth maps in {depth_file} ({size / 1e6:.2f} MB)')
+    print_output_stats(stats, time.perf_counter() - start)
+    print(f'Results are in {output_folder}')
+
+
+@app.command()
+def pack_depth(depth_folder, output_filename, depth_type: DepthType = DepthType.uint16,
+               compression: Compression = Compression.zlib, chunk_frames: int = 32):
+    """ Packs a folder of .npy depth maps (for example depth_npy) into one chunked and compressed file
+
+    The maps are stored sorted by name, as --depth-type uint16 millimeters (up to 65.535 m, farther depths are
+    stored as 0), float16 or float32 meters, in chunks of --chunk-frames frames compressed with --compression.
+    Read them with cvc_cli.stereo.depth_store.DepthReader.
+
+    Example:
+
+    cvc-stereo pack-depth ./output/depth_npy ./output/depth.cvcd
+    """
+    paths = sorted(pathlib.Path(depth_folder).glob('*.npy'))
+    if len(paths) == 0:
+        print(f'No .npy file found in {depth_folder}')
+        exit()
+    nbytes = 0
+    try:
+        with DepthWriter(output_filename, depth_type.value, compression.value, chunk_frames) as writer:
+            for path in tqdm(paths):
+                writer.append(np.load(path), path.stem)
+                nbytes += path.stat().st_size
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        exit()
+    size = pathlib.Path(output_filename).stat().st_size
+    print(f'{len(paths)} depth maps packed in {output_filename}: {size / 1e6:.2f} MB, '
+          f'{nbytes / max(size, 1):.1f} times smaller')
 
 
 @app.command()
 def cal(stereo_folder, pattern_type: PatternType = PatternType.checkerboard,
         pattern_shape: Tuple[int, int] = [9, 6], pattern_size: int = 25, show: bool = False,
-        debug: bool = False):
+        debug: bool = False, manifest: str = None, max_frames: int = 0, stride: int = 1, seed: int = 0,
+        max_views: int = 0, precheck: Precheck = Precheck.none,
+        detector: Detector = Detector.classic, marker_size: float = 0, aruco_dict: str = 'DICT_5X5_100',
+        reject_threshold: float = 0, reject_rounds: int = 3, init_intrinsics: str = None,
+        fix_intrinsics: bool = False, output_filename: str = 'stereo_params.yml',
+        model: DistortionModel = DistortionModel.standard, max_iter: int = 30, eps: float = 0.001):
     """ Stereo calibration
 
+    Use --model to choose the distortion model: k1k2 (radial k1, k2), standard (k1, k2, p1, p2, k3), rational
+    (+ k4, k5, k6), thin-prism (+ s1..s4), tilted (+ tilted sensor) or fisheye (cv2.fisheye equidistant model,
+    for wide-angle cameras). The mono and stereo solvers stop after --max-iter iterations or when the change is
+    below --eps.
+
+    Use --precheck check (cv2.checkChessboard on a downscaled image) or --precheck fast (the same test on the
+    full resolution image) to quickly discard frames without the pattern. The number of frames
+    rejected by the pre-check is printed apart from the detection failures.
+
+    Circle grids (--pattern-type circles or acircles) use --pattern-shape as circles per row and rows, and
+    --pattern-size as the circle spacing in mm.
+
+    ChArUco boards (--pattern-type charuco) use --pattern-shape as the number of squares, --pattern-size as the
+    square size and --marker-size as the marker size in mm (3/4 of the square by default). Partially visible
+    boards are used.
+
+    Use --detector sb to detect the chessboard with findChessboardCornersSB instead of findChessboardCorners.
+
+    Use --init-intrinsics with a file holding M1/D1/M2/D2 (e.g. data/stereo/intrinsics.yml or a previous
+    stereo_params.yml) to warm-start the mono solves, add --fix-intrinsics to skip them entirely.
+
+    Use --reject-threshold (pixels) to automatically drop the views with a larger reprojection RMS and solve
+    again, for at most --reject-rounds rounds.
+
+    Use --max-views to solve with a diverse subset (board position, scale and tilt) of the detected views.
+
+    Use --stride and --max-frames to calibrate from a deterministic (seeded) subset of the pairs,
+    for example on long continuous recordings
+
     Notes:
 
     Spected structure of the stereo folder
@@ -108,29 +365,166 @@ def cal(stereo_folder, pattern_type: PatternType = PatternType.checkerboard,
             - ...\n
 
     """
-    stereo_pairs, _ = get_list_of_images(stereo_folder)
+    stereo_pairs, _ = load_stereo_pairs(stereo_folder, manifest)
+    stereo_pairs = subsample(stereo_pairs, max_frames, stride, seed)
+
+    cameras = None
+    if init_intrinsics is not None:
+        try:
+            cameras = load_intrinsics(init_intrinsics)
+        except ValueError as e:
+            typer.echo(str(e), err=True)
+            exit()
+        if len(cameras) < 2:
+            typer.echo(f'{init_intrinsics} does not contain the intrinsics of both cameras', err=True)
+            exit()
+    elif fix_intrinsics:
+        typer.echo('--fix-intrinsics needs --init-intrinsics', err=True)
+        exit()
+
+    calibrator = Calibrator(pattern_type.value, pattern_shape, pattern_size, detector=detector.value,
+                            precheck=precheck.value, marker_size=marker_size, aruco_dict=aruco_dict,
+                            model=model.value, max_iter=max_iter, eps=eps, max_views=max_views,
+                            reject_threshold=reject_threshold, reject_rounds=reject_rounds, show=show, debug=debug,
+                            verbose=True)
+    try:
+        rectifier = calibrator.calibrate_stereo(stereo_pairs, init_intrinsics=cameras, fix_intrinsics=fix_intrinsics)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        exit()
+
+    print(f'Saving stereo mapping in {output_filename}')
+    rectifier.save(output_filename)
+
+
+@app.command()
+def recal(stereo_folder, cal_file, pattern_type: PatternType = PatternType.checkerboard,
+          pattern_shape: Tuple[int, int] = [9, 6], pattern_size: int = 25, show: bool = False,
+          debug: bool = False, manifest: str = None, max_frames: int = 20, stride: int = 1, seed: int = 0,
+          precheck: Precheck = Precheck.none, detector: Detector = Detector.classic, marker_size: float = 0,
+          aruco_dict: str = 'DICT_5X5_100', reject_threshold: float = 0, reject_rounds: int = 3,
+          output_filename: str = 'stereo_params.yml', max_iter: int = 30, eps: float = 0.001):
+    """ Quick extrinsics-only stereo recalibration
+
+    Keeps the intrinsics of a previous calibration (cal_file, for example stereo_params.yml written by cvc-stereo
+    cal), detects the pattern on a few fresh pairs (--max-frames, 20 by default), solves only the rotation and
+    translation between the cameras (CALIB_FIX_INTRINSIC) and writes new rectification maps. The distortion model
+    is the one of cal_file.
+
+    Example:
+
+    cvc-stereo recal ./data/stereo/ stereo_params.yml --output-filename stereo_params_recal.yml
+    """
+    try:
+        cameras = load_intrinsics(cal_file)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        exit()
+    if len(cameras) < 2:
+        typer.echo(f'{cal_file} does not contain the intrinsics of both cameras', err=True)
+        exit()
 
-    result, left_stereo_map, right_stereo_map = stereo_calibration(stereo_pairs, pattern_type.value, pattern_shape,
-                                                                   pattern_size, show)
+    try:
+        model = distortion_model(cameras[0][1])
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        exit()
 
-    if result is False:
-        typer.echo('Calibration pattern not found in any image', err=True)
+    stereo_pairs, _ = load_stereo_pairs(stereo_folder, manifest)
+    stereo_pairs = subsample(stereo_pairs, max_frames, stride, seed)
+
+    calibrator = Calibrator(pattern_type.value, pattern_shape, pattern_size, detector=detector.value,
+                            precheck=precheck.value, marker_size=marker_size, aruco_dict=aruco_dict, model=model,
+                            max_iter=max_iter, eps=eps, reject_threshold=reject_threshold,
+                            reject_rounds=reject_rounds, show=show, debug=debug,
+                            verbose=True)
+    try:
+        rectifier = calibrator.calibrate_stereo(stereo_pairs, init_intrinsics=cameras, fix_intrinsics=True)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
         exit()
 
-    params_filename = 'stereo_params.yml'
-    print(f'Saving stereo mapping in {params_filename}')
-    cv_file = cv2.FileStorage(params_filename, cv2.FILE_STORAGE_WRITE)
-    cv_file.write('left_stereo_map_x', left_stereo_map[0])
-    cv_file.write('left_stereo_map_y', left_stereo_map[1])
-    cv_file.write('right_stereo_map_x', right_stereo_map[0])
-    cv_file.write('right_stereo_map_y', right_stereo_map[1])
-    cv_file.release()
+    print(f'Saving stereo mapping in {output_filename}')
+    rectifier.save(output_filename)
 
 
 @app.command()
-def view_images(stereo_folder, save: bool = False, output_folder='./output/'):
+def serve(cal_file, socket_path: str = '/tmp/cvc-stereo.sock'):
+    """ Long running rectification server on a Unix socket
+
+    The maps of cal_file are loaded once. Clients (cvc_cli.stereo.server.RectificationClient) send raw uint8
+    pairs (gray or BGR) and receive the rectified pairs. Stop it with Ctrl+C.
+
+    Example:
+
+    cvc-stereo serve stereo_params.yml --socket-path /tmp/cvc-stereo.sock
+
+    cvc-stereo bench-serve ./data/stereo/ --socket-path /tmp/cvc-stereo.sock
+    """
+    try:
+        rectifier = StereoRectifier.from_file(cal_file)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        exit()
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # Services are usually stopped with SIGTERM, the socket file is removed in both cases
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server = RectificationServer(socket_path, rectifier)
+    except FileExistsError as e:
+        typer.echo(str(e), err=True)
+        exit()
+    print(f'Rectifying on {socket_path}, Ctrl+C to stop')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@app.command()
+def bench_serve(stereo_folder, socket_path: str = '/tmp/cvc-stereo.sock', requests: int = 300, clients: int = 1,
+                rate: float = 0, color: bool = False, max_frames: int = 10, manifest: str = None):
+    """ Load generator for cvc-stereo serve, prints the latency percentiles
+
+    Up to --max-frames pairs of stereo_folder are decoded and sent in a loop, --requests times by each of the
+    --clients concurrent clients, at --rate pairs per second (0 sends them back to back).
+
+    Example:
+
+    cvc-stereo bench-serve ./data/stereo/ --clients 2 --rate 30
+    """
+    stereo_pairs, _ = load_stereo_pairs(stereo_folder, manifest)
+    stereo_pairs = subsample(stereo_pairs, max_frames)
+    if len(stereo_pairs) == 0:
+        print('No image pair found')
+        exit()
+    flag = cv2.IMREAD_COLOR if color else cv2.IMREAD_GRAYSCALE
+    pairs = [(cv2.imread(left_path, flag), cv2.imread(right_path, flag)) for left_path, right_path in stereo_pairs]
+
+    try:
+        latencies, elapsed = benchmark_server(socket_path, pairs, requests, clients, rate)
+    except (ConnectionError, FileNotFoundError) as e:
+        typer.echo(f'Can not reach the server on {socket_path}: {e}', err=True)
+        exit()
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        exit()
+    print_latencies(latencies, elapsed)
+
+
+@app.command()
+def view_images(stereo_folder, save: bool = False, output_folder='./output/', manifest: str = None,
+                prefetch: int = 8, max_width: int = 1280):
     """Show stereo images as a horizontal stacked image (downsampled)
 
+    The stacked pairs are downscaled to --max-width pixels (0 keeps the full resolution). The next and previous
+    --prefetch pairs are decoded in the background, so browsing does not wait for the decoder.
+
     Notes:
 
     Spected structure of the stereo folder
@@ -153,35 +547,68 @@ def view_images(stereo_folder, save: bool = False, output_folder='./output/'):
             - ...\n
 
     """
-    stereo_pairs, subfolders = get_list_of_images(stereo_folder)
+    stereo_pairs, subfolders = load_stereo_pairs(stereo_folder, manifest)
 
     if not save:
-        print('Commands  n: next, q:quit')
+        print('Commands  n: next, p: previous, q:quit')
     else:
         system(f'mkdir -p {output_folder}')
         for f in subfolders:
             system(f'mkdir -p {output_folder}/{f}')
-        print('Commands  n: next, q:quit, s:save')
-
-    for left_path, right_path in stereo_pairs:
-        left_im = cv2.imread(left_path)
-        right_im = cv2.imread(right_path)
-
-        stereo_im = np.hstack((left_im, right_im))
-        cv2.imshow('stereo_pair', stereo_im)
-        key = cv2.waitKey(0)
-        if key == ord('q'):
-            quit()
-        elif key == ord('n'):
-            continue
-        elif key == ord('s') and save:
-            frame_name = pathlib.Path(left_path).name
-            for f in subfolders:
-                if f in ['right', 'left', 'right_rect', 'left_rect', 'depth']:
-                    system(f'cp {stereo_folder}/{f}/{frame_name} {output_folder}/{f}/')
-                if f == 'depth_npy':
-                    depth_name = frame_name.split('.')[0]
-                    system(f'cp {stereo_folder}/{f}/{depth_name} {output_folder}/{f}/')
+        print('Commands  n: next, p: previous, q:quit, s:save')
+
+    position = 0
+    with PairPrefetcher(stereo_pairs, prefetch, max_width) as pairs:
+        while position < len(stereo_pairs):
+            left_path, _ = stereo_pairs[position]
+            cv2.imshow('stereo_pair', pairs.get(position))
+            key = cv2.waitKey(0)
+            if key == ord('q'):
+                break
+            elif key == ord('p'):
+                position = max(position - 1, 0)
+                continue
+            elif key == ord('s') and save:
+                frame_name = pathlib.Path(left_path).name
+                for f in subfolders:
+                    if f in ['right', 'left', 'right_rect', 'left_rect', 'depth']:
+                        system(f'cp {stereo_folder}/{f}/{frame_name} {output_folder}/{f}/')
+                    if f == 'depth_npy':
+                        depth_name = frame_name.split('.')[0]
+                        system(f'cp {stereo_folder}/{f}/{depth_name}.npy {output_folder}/{f}/')
+            position += 1
+
+
+@app.command()
+def index(stereo_folder, output_filename: str = None, content_hash: bool = False, full: bool = False):
+    """ Writes a manifest of the stereo pairs, usable with --manifest by cal, rect and view-images
+
+    Notes:
+
+    By default the manifest is written in stereo_folder/manifest.json.gz. If the manifest already exists,
+    it is refreshed incrementally (only the left/right folders whose mtime changed are scanned),
+    use --full to rebuild it from scratch.
+
+    Example:
+
+    cvc-stereo index ./data/stereo/
+
+    cvc-stereo rect ./data/stereo/ stereo_params.yml --manifest ./data/stereo/manifest.json.gz
+    """
+    if output_filename is None:
+        output_filename = join(stereo_folder, MANIFEST_NAME)
+
+    previous = None
+    if not full and pathlib.Path(output_filename).exists():
+        previous = load_manifest(output_filename)
+
+    try:
+        stereo_manifest = build_manifest(stereo_folder, content_hash, previous)
+    except FileNotFoundError as e:
+        typer.echo(str(e), err=True)
+        exit()
+    save_manifest(stereo_manifest, output_filename)
+    print(f'{len(stereo_manifest["pairs"])} stereo pairs indexed in {output_filename}')
 
 
 def main():
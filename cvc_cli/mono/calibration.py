@@ -1,9 +1,17 @@
 import cv2
-import numpy as np
+import time
 from tqdm import tqdm
+from cvc_cli.stereo.detection import CalibrationPattern
+from cvc_cli.stereo.reprojection import print_errors
+from cvc_cli.stereo.solver import calibrate_cameras
+from cvc_cli.stereo.selection import view_descriptor, select_diverse_views, report_selection
+from cvc_cli.stereo.utils import print_timings
 
 
-def mono_calibration(images, pattern_type, pattern_shape, pattern_size, show=False, debug=False):
+def mono_calibration(images, pattern_type, pattern_shape, pattern_size, show=False, debug=False, max_views=0,
+                     precheck='none', detector='classic', marker_size=None, aruco_dict='DICT_5X5_100',
+                     reject_threshold=0, reject_rounds=3, init_intrinsics=None, model='standard', criteria=None,
+                     verbose=True):
     """ Calibrates a stereo camera
 
     Parameters
@@ -11,15 +19,39 @@ def mono_calibration(images, pattern_type, pattern_shape, pattern_size, show=Fal
     images(list):
         list of images paths
     pattern_type (str):
-        Calibration pattern type
+        Calibration pattern type: 'checkerboard', 'circles', 'acircles' or 'charuco'
     pattern_shape(list):
-        Number of valid squares, for example (9,7)
+        Number of valid squares (circles per row and rows, or charuco squares), for example (9,7)
     pattern_size(int):
-        Pattern size in mm
+        Pattern size (square size or circle spacing) in mm
     show (bool):
         Show the calibration process (patterns and detections)
     debug (bool):
         If debug, shows more info
+    max_views (int):
+        If > 0, at most max_views diverse views (board position, scale and tilt) are used to calibrate
+    precheck (str):
+        Cheap rejection of images without chessboard before the detection: 'none', 'check'
+        (cv2.checkChessboard on a downscaled image) or 'fast' (cv2.checkChessboard on the full resolution image)
+    detector (str):
+        Chessboard detector, 'classic' (findChessboardCorners + cornerSubPix) or 'sb' (findChessboardCornersSB)
+    marker_size (float):
+        ChArUco marker size in mm (3/4 of pattern_size by default)
+    aruco_dict (str):
+        ChArUco marker dictionary
+    reject_threshold (float):
+        If > 0, views with a reprojection RMS above reject_threshold pixels are dropped and the camera is solved
+        again (warm-started), for at most reject_rounds rounds
+    reject_rounds (int):
+        Maximum number of outlier rejection rounds
+    init_intrinsics (tuple):
+        (intrinsic matrix, distortion) used as initial guess, which shortens the solve
+    model (str):
+        Distortion model: 'k1k2', 'standard', 'rational', 'thin-prism', 'tilted' or 'fisheye'
+    criteria (tuple):
+        Termination criteria of the solver (see cvc_cli.stereo.solver.termination_criteria)
+    verbose (bool):
+        Print the detection progress, the calibration and the errors
 
     Returns
     -------
@@ -27,64 +59,76 @@ def mono_calibration(images, pattern_type, pattern_shape, pattern_size, show=Fal
        Calibration parameters
     """
 
-    # Termination criteria for refining the detected corners
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-
-    # Defining the world coordinates for 3D points
-    objp = np.zeros((1, pattern_shape[0] * pattern_shape[1], 3), np.float32)
-
-    # This represents the real dimensions of the chess board squares
-    objp[0, :, :2] = np.mgrid[0:pattern_shape[0], 0:pattern_shape[1]].T.reshape(-1, 2)
-    objp *= pattern_size/1000
-    print(pattern_size/1000)
+    # Pattern detection and world coordinates for 3D points
+    pattern = CalibrationPattern(pattern_type, pattern_shape, pattern_size, detector, precheck, marker_size,
+                                 aruco_dict)
 
     # Prepare image point containers
     img_pts = []
     obj_pts = []
 
     # To retain image informatin after the loop
-    im_gray = None
+    image_size = None
 
     # Stadistics
     total = len(images)
     used = 0
-    for image_path in tqdm(images):
-        im = cv2.imread(image_path)
+    prerejected = 0
+    timings = {}
+    start = time.perf_counter()
+    for image_path in tqdm(images, disable=not verbose):
         im_gray = cv2.imread(image_path, 0)
 
-        if pattern_type == 'checkerboard':
-            exists_pattern, corners = cv2.findChessboardCorners(im_gray, pattern_shape, None)
+        if not pattern.passes_precheck(im_gray):
+            prerejected += 1
+            continue
+        exists_pattern, corners, ids = pattern.detect(im_gray)
 
-            if exists_pattern:
-                used += 1
-                obj_pts.append(objp)
-                cv2.cornerSubPix(im_gray, corners, (11, 11), (-1, -1), criteria)
+        if exists_pattern:
+            used += 1
+            obj_pts.append(pattern.object_points(ids))
+            image_size = im_gray.shape[::-1]
 
-                im = cv2.drawChessboardCorners(im, pattern_shape, corners, exists_pattern)
-                if show:
-                    cv2.imshow('image', im)
-                    cv2.waitKey(1000)
+            if show:
+                im = pattern.draw(cv2.imread(image_path), corners, ids)
+                cv2.imshow('image', im)
+                cv2.waitKey(1000)
 
-                img_pts.append(corners)
-            else:
-                if debug:
-                    print(f'Pattern was not detected on {image_path}')
+            img_pts.append(corners)
+        else:
+            if debug:
+                print(f'Pattern was not detected on {image_path}')
+    timings['detection'] = time.perf_counter() - start
+    if verbose:
+        if precheck != 'none':
+            print(f'{prerejected}/{total} images rejected by the pre-check')
+        print(f'used {used}/{total}, pattern not detected on {total - prerejected - used}')
     if used == 0:
         return False, None, None, None, None, None, None
-    else:
-        print(f'used {used}/{total}')
-    # Calibrating camera
-    flags = 0
-    ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(obj_pts, img_pts, im_gray.shape[::-1], None, None, flags=flags)
-    print('Intrinsic matrix')
-    print(mtx)
-    print('Distorsion parameters')
-    print(dist)
-    mean_error = 0
-    for i in range(len(obj_pts)):
-        imgpoints2, _ = cv2.projectPoints(obj_pts[i], rvecs[i], tvecs[i], mtx, dist)
-        error = cv2.norm(img_pts[i], imgpoints2, cv2.NORM_L2)/len(imgpoints2)
-        mean_error += error
-    print(f'total error: {mean_error/len(obj_pts)}')
 
-    return ret, mtx, dist, rvecs, tvecs, im_gray.shape[1], im_gray.shape[0]
+    # Keep a diverse subset of views, this bounds the solve time
+    if 0 < max_views < used:
+        descriptors = [view_descriptor(corners, obj, image_size) for corners, obj in zip(img_pts, obj_pts)]
+        selected = select_diverse_views(descriptors, max_views)
+        if verbose:
+            report_selection([img_pts], selected, image_size)
+        obj_pts = [obj_pts[i] for i in selected]
+        img_pts = [img_pts[i] for i in selected]
+
+    # Calibrating camera, optionally dropping the outlier views
+    init = [init_intrinsics] if init_intrinsics is not None else None
+    kept, (calibration,) = calibrate_cameras(obj_pts, [img_pts], image_size, reject_threshold, reject_rounds,
+                                             init=init, model=model, criteria=criteria, timings=timings,
+                                             verbose=verbose)
+    ret, mtx, dist, rvecs, tvecs, errors = calibration
+    if verbose:
+        if len(kept) < len(obj_pts):
+            print(f'{len(kept)}/{len(obj_pts)} views kept after the outlier rejection')
+        print('Intrinsic matrix')
+        print(mtx)
+        print('Distorsion parameters')
+        print(dist)
+        print_errors(errors)
+        print_timings(timings)
+
+    return ret, mtx, dist, rvecs, tvecs, image_size[0], image_size[1]
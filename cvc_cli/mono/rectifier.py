@@ -0,0 +1,92 @@
+import cv2
+import numpy as np
+
+
+class MonoRectifier:
+    """ Undistortion of a single camera with the remap tables kept in memory
+
+    Example
+    -------
+    rectifier = MonoRectifier.from_file('calib.yml')
+    im_rect = rectifier.rectify(im)
+
+    Parameters
+    ----------
+    mapx, mapy (np.array):
+        Undistortion maps, as written by cvc-mono cal
+    roi (tuple):
+        (x, y, w, h) region of the undistorted image without black pixels
+    mtx, dist (np.array):
+        Intrinsic matrix and distortion coefficients, may be None
+    model (str):
+        Distortion model of the calibration
+    use_roi (bool):
+        Crop the undistorted images to roi
+    interpolation (int):
+        cv2.remap interpolation
+    """
+
+    def __init__(self, mapx, mapy, roi=None, mtx=None, dist=None, model='standard', use_roi=True,
+                 interpolation=cv2.INTER_LANCZOS4):
+        self.mapx = mapx
+        self.mapy = mapy
+        self.roi = None if roi is None else tuple(int(v) for v in np.asarray(roi).ravel())
+        self.mtx = mtx
+        self.dist = dist
+        self.model = model
+        self.use_roi = use_roi
+        self.interpolation = interpolation
+
+    @classmethod
+    def from_calibration(cls, mtx, dist, image_size, model='standard', **kwargs):
+        """ Builds the undistortion maps of a calibration
+
+        The intrinsics are scaled so the undistorted image keeps all the source pixels (alpha 1, or balance 1
+        for the fisheye model), roi is the region without black pixels.
+        """
+        w, h = image_size
+        if model == 'fisheye':
+            new_mtx = cv2.fisheye.estimateNewCameraMatrixForUndistortRectify(mtx, dist, (w, h), np.eye(3), balance=1)
+            mapx, mapy = cv2.fisheye.initUndistortRectifyMap(mtx, dist, np.eye(3), new_mtx, (w, h), cv2.CV_32FC1)
+            roi = (0, 0, w, h)
+        else:
+            new_mtx, roi = cv2.getOptimalNewCameraMatrix(mtx, dist, (w, h), 1, (w, h))
+            mapx, mapy = cv2.initUndistortRectifyMap(mtx, dist, None, new_mtx, (w, h), cv2.CV_32FC1)
+        return cls(mapx, mapy, roi, mtx, dist, model, **kwargs)
+
+    @classmethod
+    def from_file(cls, filename, **kwargs):
+        """ Loads the maps of a cvc-mono cal file """
+        cv_file = cv2.FileStorage(filename, cv2.FILE_STORAGE_READ)
+        if not cv_file.isOpened():
+            raise ValueError(f'Can not read {filename}')
+        mapx = cv_file.getNode('mapx').mat()
+        mapy = cv_file.getNode('mapy').mat()
+        roi = cv_file.getNode('roi').mat()
+        mtx = cv_file.getNode('intrinsics').mat()
+        dist = cv_file.getNode('dist').mat()
+        model = cv_file.getNode('model').string() or 'standard'
+        cv_file.release()
+        if mapx is None or mapy is None:
+            raise ValueError(f'No undistortion maps found in {filename}')
+        return cls(mapx, mapy, roi, mtx, dist, model, **kwargs)
+
+    def save(self, filename):
+        """ Writes the calibration and the maps, readable by from_file and cvc-mono rect """
+        cv_file = cv2.FileStorage(filename, cv2.FILE_STORAGE_WRITE)
+        cv_file.write('roi', np.array(self.roi))
+        cv_file.write('intrinsics', self.mtx)
+        cv_file.write('dist', self.dist)
+        cv_file.write('model', self.model)
+        cv_file.write('mapx', self.mapx)
+        cv_file.write('mapy', self.mapy)
+        cv_file.release()
+
+    def rectify(self, im):
+        """ Undistorts an image (gray or color), cropped to roi if use_roi """
+        im_rect = cv2.remap(im, self.mapx, self.mapy, self.interpolation, borderMode=cv2.BORDER_CONSTANT,
+                            borderValue=0)
+        if self.use_roi and self.roi is not None:
+            x, y, w, h = self.roi
+            im_rect = im_rect[y:y+h, x:x+w]
+        return im_rect
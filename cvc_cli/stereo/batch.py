@@ -0,0 +1,228 @@
+import cv2
+import time
+import pathlib
+import numpy as np
+from collections import namedtuple
+from functools import lru_cache
+from os.path import join
+from cvc_cli.stereo.utils import IMAGE_EXTENSIONS
+
+
+# Images written by cvc-stereo rect, each one in its own subfolder
+OUTPUT_NAMES = ('left', 'right', 'stack')
+
+OutputSpec = namedtuple('OutputSpec', ['name', 'ext', 'quality'])
+OutputSpec.__doc__ = """ Output of cvc-stereo rect
+
+name: 'left', 'right' or 'stack'
+ext: image extension (for example '.png'), None keeps the extension of the source image
+quality: encoder quality (JPEG/WebP 0-100, PNG compression 0-9), None for the OpenCV default
+"""
+
+# cv2.imwrite parameter of the quality of each format
+_QUALITY_PARAMS = {'.jpg': cv2.IMWRITE_JPEG_QUALITY, '.jpeg': cv2.IMWRITE_JPEG_QUALITY,
+                   '.webp': cv2.IMWRITE_WEBP_QUALITY, '.png': cv2.IMWRITE_PNG_COMPRESSION}
+# Valid range of the quality of each format
+_QUALITY_RANGES = {'.jpg': (0, 100), '.jpeg': (0, 100), '.webp': (0, 100), '.png': (0, 9)}
+
+
+def parse_outputs(spec):
+    """ Parses an outputs specification, for example 'left:jpg,right:jpg:90,stack:png:1'
+
+    Each comma separated item is name[:format[:quality]], see OutputSpec. Each name can only be given once, and
+    left and right must have the same format, the stereo pairs are matched by file name
+
+    Returns
+    -------
+    list
+        OutputSpec of each output
+    """
+    outputs = []
+    for item in spec.split(','):
+        fields = item.strip().split(':')
+        if fields[0] not in OUTPUT_NAMES or len(fields) > 3:
+            raise ValueError(f'Invalid output {item}, expected name[:format[:quality]] with name in '
+                             f'{", ".join(OUTPUT_NAMES)}')
+        if fields[0] in [output.name for output in outputs]:
+            raise ValueError(f'Output {fields[0]} is selected more than once')
+        ext = '.' + fields[1].lower().lstrip('.') if len(fields) > 1 and fields[1] else None
+        if ext is not None and ext not in IMAGE_EXTENSIONS:
+            raise ValueError(f'Unknown image format in {item}')
+        quality = None
+        if len(fields) > 2:
+            if ext not in _QUALITY_PARAMS:
+                raise ValueError(f'Quality is not supported for the format of {item}')
+            low, high = _QUALITY_RANGES[ext]
+            if not fields[2].isdigit() or not low <= int(fields[2]) <= high:
+                raise ValueError(f'Invalid quality in {item}, expected an integer in [{low}, {high}]')
+            quality = int(fields[2])
+        outputs.append(OutputSpec(fields[0], ext, quality))
+    formats = {output.name: output.ext for output in outputs if output.name in ('left', 'right')}
+    if len(formats) == 2 and formats['left'] != formats['right']:
+        raise ValueError('The left and right outputs must have the same format')
+    return outputs
+
+
+def write_image(path, im, ext, quality=None):
+    """ Encodes and writes an image
+
+    Returns
+    -------
+    int
+        Number of written bytes
+    """
+    params = [] if quality is None else [_QUALITY_PARAMS[ext], quality]
+    exists, buffer = cv2.imencode(ext, im, params)
+    if not exists:
+        raise ValueError(f'Can not encode {path}')
+    buffer.tofile(path)
+    return buffer.size
+
+
+def merge_stats(total, stats):
+    """ Adds the per output counters [files, bytes, seconds] of stats to total """
+    for name, counters in stats.items():
+        total.setdefault(name, [0, 0, 0.0])
+        for i, value in enumerate(counters):
+            total[name][i] += value
+    return total
+
+
+def print_output_stats(stats, elapsed):
+    """ Prints the files, bytes and encode + write time of each output """
+    print(f'{"output":>8} {"files":>8} {"MB":>10} {"KB/file":>10} {"write s":>10} {"ms/file":>10}')
+    for name, (files, nbytes, seconds) in stats.items():
+        print(f'{name:>8} {files:8d} {nbytes / 1e6:10.2f} {nbytes / 1e3 / max(files, 1):10.1f} {seconds:10.2f} '
+              f'{1000 * seconds / max(files, 1):10.2f}')
+    print(f'Total time {elapsed:.2f} s')
+
+
+@lru_cache(maxsize=16)
+def epipolar_rows(height, lines=9):
+    """ Rows of the horizontal guide lines of a stack image, evenly spaced (cached per image height) """
+    step = height // (lines + 1)
+    rows = step * np.arange(1, lines + 1)
+    rows.flags.writeable = False
+    return rows
+
+
+def draw_epipolar_lines(stack, lines=9, color=(255, 0, 0)):
+    """ Draws horizontal guide lines on a rectified stack image, in place, with one vectorized row assignment
+
+    Parameters
+    ----------
+    stack (np.array):
+        Side-by-side rectified pair, gray or BGR
+    lines (int):
+        Number of lines
+    color (tuple):
+        BGR color of the lines, gray images use the first component (as cv2.line)
+    """
+    rows = epipolar_rows(stack.shape[0], lines)
+    stack[rows] = color[:stack.shape[2]] if stack.ndim == 3 else color[0]
+    return stack
+
+
+def write_outputs(images, outputs, output_folder, lines=9, line_color=(255, 0, 0)):
+    """ Encodes and writes the selected outputs of a rectified pair
+
+    Parameters
+    ----------
+    images (dict):
+        name: (source path, image) of the available outputs, the name_gray entries are written along with name
+    outputs (list):
+        OutputSpec of the images to write
+    output_folder (str):
+        Folder with a subfolder per output
+    lines (int):
+        Number of guide lines of the stack images, drawn in place
+    line_color (tuple):
+        BGR color of the guide lines
+
+    Returns
+    -------
+    dict
+        Counters [files, bytes, seconds] of each output
+    """
+    # The halves are written before the lines are drawn on the shared stack buffers
+    stats = {}
+    for output in sorted(outputs, key=lambda output: output.name == 'stack'):
+        for name in [output.name, output.name + '_gray']:
+            if name not in images:
+                continue
+            source_path, im = images[name]
+            if output.name == 'stack':
+                draw_epipolar_lines(im, lines, line_color)
+            source_path = pathlib.Path(source_path)
+            ext = output.ext or source_path.suffix
+            start = time.perf_counter()
+            nbytes = write_image(join(output_folder, name, source_path.stem + ext), im, ext, output.quality)
+            stats[name] = [1, nbytes, time.perf_counter() - start]
+    return stats
+
+
+def write_rectified_pair(rectifier, left_path, right_path, output_folder, outputs, buffers=None, show=False,
+                         lines=9, line_color=(255, 0, 0), color=False, gray=False):
+    """ Rectifies a stereo pair from disk and writes the selected outputs (left, right and stack images)
+
+    Both images are remapped straight into the halves of one side-by-side buffer, so the stack costs no copy
+    and, when the buffers are passed back for the next pair, nothing is allocated. Color images are decoded once
+    in BGR and the three channels are remapped by a single cv2.remap call.
+
+    Parameters
+    ----------
+    rectifier (StereoRectifier):
+        Rectification maps
+    left_path, right_path (str):
+        Paths of the stereo pair
+    output_folder (str):
+        Folder with a subfolder per output
+    outputs (list):
+        OutputSpec of the images to write
+    buffers (dict):
+        Buffers returned by the previous call, None to allocate them
+    show (bool):
+        Show the rectified pair (without lines) for 2 seconds
+    lines (int):
+        Number of guide lines of the stack image
+    line_color (tuple):
+        BGR color of the guide lines
+    color (bool):
+        Rectify in color (BGR), gray otherwise
+    gray (bool):
+        With color, also write the gray version of each output (in the name_gray subfolders), converted from the
+        rectified color images. Raises ValueError without color
+
+    Returns
+    -------
+    dict, dict
+        Buffers to pass to the next call, and the counters [files, bytes, seconds] of each output
+    """
+    if gray and not color:
+        raise ValueError('The gray outputs are only written when rectifying in color')
+    buffers = {} if buffers is None else buffers
+    flag = cv2.IMREAD_COLOR if color else cv2.IMREAD_GRAYSCALE
+    left_im = cv2.imread(left_path, flag)
+    right_im = cv2.imread(right_path, flag)
+
+    # Applying stereo image rectification on the left and right images
+    stack, left_rect, right_rect = rectifier.rectify_stack(left_im, right_im, buffers.get('stack'))
+    buffers['stack'] = stack
+    # The stack is named after the right image
+    images = {'left': (left_path, left_rect), 'right': (right_path, right_rect), 'stack': (right_path, stack)}
+
+    if gray:
+        gray_stack = buffers.get('gray')
+        if gray_stack is None or gray_stack.shape != stack.shape[:2]:
+            gray_stack = np.empty(stack.shape[:2], stack.dtype)
+        buffers['gray'] = cv2.cvtColor(stack, cv2.COLOR_BGR2GRAY, dst=gray_stack)
+        width = left_rect.shape[1]
+        images.update({'left_gray': (left_path, gray_stack[:, :width]),
+                       'right_gray': (right_path, gray_stack[:, width:]),
+                       'stack_gray': (right_path, gray_stack)})
+
+    if show:
+        cv2.imshow('stereo_rect', stack)
+        cv2.waitKey(2000)
+
+    return buffers, write_outputs(images, outputs, output_folder, lines, line_color)
@@ -1,18 +1,18 @@
 import cv2
+import time
 import numpy as np
 from tqdm import tqdm
+from cvc_cli.stereo.detection import CalibrationPattern, match_ids
+from cvc_cli.stereo.reprojection import print_errors
+from cvc_cli.stereo.solver import calibrate_cameras, stereo_calibrate, stereo_rectify
+from cvc_cli.stereo.selection import view_descriptor, select_diverse_views, report_selection
+from cvc_cli.stereo.utils import print_timings
 
 
-def compute_error(obj_pts, img_pts, rvecs, tvecs, mtx, dist):
-    mean_error = 0
-    for i in range(len(obj_pts)):
-        imgpoints2, _ = cv2.projectPoints(obj_pts[i], rvecs[i], tvecs[i], mtx, dist)
-        error = cv2.norm(img_pts[i], imgpoints2, cv2.NORM_L2)/len(imgpoints2)
-        mean_error += error
-    print(f'total error: {mean_error/len(obj_pts)}')
-
-
-def stereo_calibration(stereo_pairs, pattern_type, pattern_shape, pattern_size, show, debug=False):
+def stereo_calibration(stereo_pairs, pattern_type, pattern_shape, pattern_size, show, debug=False, max_views=0,
+                       precheck='none', detector='classic', marker_size=None, aruco_dict='DICT_5X5_100',
+                       reject_threshold=0, reject_rounds=3, init_intrinsics=None, fix_intrinsics=False,
+                       model='standard', criteria=None, verbose=True):
     """ Calibrates a stereo camera
 
     Parameters
@@ -20,28 +20,55 @@ def stereo_calibration(stereo_pairs, pattern_type, pattern_shape, pattern_size,
     stereo_pairs (list):
         list of stereo images path
     pattern_type (str):
-        Calibration pattern type
-    pattern_size (list):
-        Number of valid squares, for example (9,7)
+        Calibration pattern type: 'checkerboard', 'circles', 'acircles' or 'charuco'
+    pattern_shape (list):
+        Number of valid squares (circles per row and rows, or charuco squares), for example (9,7)
+    pattern_size (int):
+        Pattern size (square size or circle spacing) in mm
     show (bool):
         Show the calibration process (patterns and detections)
     debug (bool):
         If debug, shows more info
+    max_views (int):
+        If > 0, at most max_views diverse views (board position, scale and tilt in both cameras) are used
+    precheck (str):
+        Cheap rejection of images without chessboard before the detection: 'none', 'check'
+        (cv2.checkChessboard on a downscaled image) or 'fast' (cv2.checkChessboard on the full resolution image)
+    detector (str):
+        Chessboard detector, 'classic' (findChessboardCorners + cornerSubPix) or 'sb' (findChessboardCornersSB)
+    marker_size (float):
+        ChArUco marker size in mm (3/4 of pattern_size by default)
+    aruco_dict (str):
+        ChArUco marker dictionary. ChArUco boards may be partially visible, corners are matched by id between
+        the left and right images
+    reject_threshold (float):
+        If > 0, pairs with a reprojection RMS above reject_threshold pixels in any camera are dropped and the
+        cameras are solved again (warm-started), for at most reject_rounds rounds
+    reject_rounds (int):
+        Maximum number of outlier rejection rounds
+    init_intrinsics (list):
+        (intrinsic matrix, distortion) of the left and right cameras, used as initial guess of the mono solves
+    fix_intrinsics (bool):
+        Keep init_intrinsics as they are, skipping the mono solves (only the extrinsics are estimated)
+    model (str):
+        Distortion model: 'k1k2', 'standard', 'rational', 'thin-prism', 'tilted' or 'fisheye' (cv2.fisheye
+        calibration and rectification, the maps are stored and used as the pinhole ones)
+    criteria (tuple):
+        Termination criteria of the solvers (see cvc_cli.stereo.solver.termination_criteria), 30 iterations or
+        a change below 0.001 by default
+    verbose (bool):
+        Print the detection progress, the calibration and the errors
 
     Returns
     -------
-    left_map, right_map
-        Mappings for stereo rectification
+    result, left_map, right_map, params
+        Mappings for stereo rectification, and the parametric calibration (M1, D1, M2, D2, R, T, E, F, R1, R2,
+        P1, P2, Q and image_size)
     """
 
-    # Termination criteria for refining the detected corners
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-
-    # Defining the world coordinates for 3D points
-    objp = np.zeros((1, pattern_shape[0] * pattern_shape[1], 3), np.float32)
-    # This represents the real dimensions of the chess board squares
-    objp[0, :, :2] = np.mgrid[0:pattern_shape[0], 0:pattern_shape[1]].T.reshape(-1, 2)
-    objp *= pattern_size/1000
+    # Pattern detection and world coordinates for 3D points
+    pattern = CalibrationPattern(pattern_type, pattern_shape, pattern_size, detector, precheck, marker_size,
+                                 aruco_dict)
 
     # Prepare image point containers
     img_ptsL = []
@@ -49,86 +76,120 @@ def stereo_calibration(stereo_pairs, pattern_type, pattern_shape, pattern_size,
     obj_pts = []
 
     # To retain image information after the loop
-    left_im_gray = None
-    right_im_gray = None
+    image_size = None
 
     # Statistics
     total = len(stereo_pairs)
     used = 0
-    for left_path, right_path in tqdm(stereo_pairs):
-        left_im = cv2.imread(left_path)
-        right_im = cv2.imread(right_path)
-
+    prerejected = 0
+    timings = {}
+    start = time.perf_counter()
+    for left_path, right_path in tqdm(stereo_pairs, disable=not verbose):
         left_im_gray = cv2.imread(left_path, 0)
-        right_im_gray = cv2.imread(right_path, 0)
 
-        if pattern_type == 'checkerboard':
-            exists_pattern_left, corners_left = cv2.findChessboardCorners(left_im_gray, pattern_shape, None)
-            exists_pattern_right, corners_right = cv2.findChessboardCorners(right_im_gray, pattern_shape, None)
-
-            if exists_pattern_left and exists_pattern_right:
-                used += 1
-                obj_pts.append(objp)
-                cv2.cornerSubPix(right_im_gray, corners_right, (11, 11), (-1, -1), criteria)
-                cv2.cornerSubPix(left_im_gray, corners_left, (11, 11), (-1, -1), criteria)
-
-                left_im = cv2.drawChessboardCorners(left_im, pattern_shape, corners_left, exists_pattern_left)
-                right_im = cv2.drawChessboardCorners(right_im, pattern_shape, corners_right, exists_pattern_right)
+        # The right image is only decoded and searched when the left one has the pattern
+        if not pattern.passes_precheck(left_im_gray):
+            prerejected += 1
+            continue
+        exists_pattern_left, corners_left, ids_left = pattern.detect(left_im_gray)
+        exists_pattern_right = False
+        if exists_pattern_left:
+            right_im_gray = cv2.imread(right_path, 0)
+            if not pattern.passes_precheck(right_im_gray):
+                prerejected += 1
+                continue
+            exists_pattern_right, corners_right, ids_right = pattern.detect(right_im_gray)
+
+        ids = None
+        if exists_pattern_left and exists_pattern_right and pattern.partial:
+            corners_left, corners_right, ids = match_ids(corners_left, ids_left, corners_right, ids_right)
+            exists_pattern_right = len(ids) >= pattern.min_charuco_corners
+
+        if exists_pattern_left and exists_pattern_right:
+            used += 1
+            obj_pts.append(pattern.object_points(ids))
+            image_size = left_im_gray.shape[::-1]
+
+            if show:
+                left_im = pattern.draw(cv2.imread(left_path), corners_left, ids)
+                right_im = pattern.draw(cv2.imread(right_path), corners_right, ids)
                 stereo_pair = np.hstack((left_im, right_im))
-                if show:
-                    cv2.imshow('stereo_pair', stereo_pair)
-                    cv2.waitKey(1000)
-
-                img_ptsL.append(corners_left)
-                img_ptsR.append(corners_right)
-            else:
-                if debug:
-                    print(f'Pattern was not detected on {left_path},{right_path}')
-                    print(f'left pattern {exists_pattern_left}, right pattern {exists_pattern_right}')
+                cv2.imshow('stereo_pair', stereo_pair)
+                cv2.waitKey(1000)
+
+            img_ptsL.append(corners_left)
+            img_ptsR.append(corners_right)
+        else:
+            if debug:
+                print(f'Pattern was not detected on {left_path},{right_path}')
+                print(f'left pattern {exists_pattern_left}, right pattern {exists_pattern_right}')
+    timings['detection'] = time.perf_counter() - start
+    if verbose and precheck != 'none':
+        print(f'{prerejected}/{total} image pairs rejected by the pre-check')
     if used == 0:
-        return False, False, False
-    # Calibrating left and right camera
-    retL, mtxL, distL, rvecsL, tvecsL = cv2.calibrateCamera(obj_pts, img_ptsL, left_im_gray.shape[::-1], None, None)
-    retR, mtxR, distR, rvecsR, tvecsR = cv2.calibrateCamera(obj_pts, img_ptsR, right_im_gray.shape[::-1], None, None)
-
-    print('Intrinsic left camera', mtxL)
-    compute_error(obj_pts, img_ptsL, rvecsL, tvecsL, mtxL, distL)
-    print('Intrinsic right camera', mtxR)
-    compute_error(obj_pts, img_ptsR, rvecsR, tvecsR, mtxR, distR)
+        return False, False, False, False
+
+    # Keep a diverse subset of views, this bounds the solve time
+    if 0 < max_views < used:
+        descriptors = [np.concatenate((view_descriptor(corners_left, obj, image_size),
+                                       view_descriptor(corners_right, obj, image_size)))
+                       for corners_left, corners_right, obj in zip(img_ptsL, img_ptsR, obj_pts)]
+        selected = select_diverse_views(descriptors, max_views)
+        if verbose:
+            report_selection([img_ptsL, img_ptsR], selected, image_size)
+        obj_pts = [obj_pts[i] for i in selected]
+        img_ptsL = [img_ptsL[i] for i in selected]
+        img_ptsR = [img_ptsR[i] for i in selected]
+
+    # Calibrating left and right camera, optionally dropping the views that are outliers in any of them
+    kept, (left_calibration, right_calibration) = calibrate_cameras(obj_pts, [img_ptsL, img_ptsR], image_size,
+                                                                    reject_threshold, reject_rounds,
+                                                                    init=init_intrinsics,
+                                                                    fix_intrinsics=fix_intrinsics, model=model,
+                                                                    criteria=criteria, timings=timings,
+                                                                    verbose=verbose)
+    if len(kept) < len(obj_pts):
+        if verbose:
+            print(f'{len(kept)}/{len(obj_pts)} views kept after the outlier rejection')
+        obj_pts = [obj_pts[i] for i in kept]
+        img_ptsL = [img_ptsL[i] for i in kept]
+        img_ptsR = [img_ptsR[i] for i in kept]
+    mtxL, distL = left_calibration.mtx, left_calibration.dist
+    mtxR, distR = right_calibration.mtx, right_calibration.dist
+
+    if verbose:
+        print('Intrinsic left camera', mtxL)
+        print_errors(left_calibration.errors)
+        print('Intrinsic right camera', mtxR)
+        print_errors(right_calibration.errors)
 
     # hL, wL = left_im_gray.shape[:2]
     # new_mtxL, roiL = cv2.getOptimalNewCameraMatrix(mtxL, distL, (wL, hL), 1, (wL, hL))
     new_mtxL = mtxL
 
-    # Calibrating right camera
-    retR, mtxR, distR, rvecsR, tvecsR = cv2.calibrateCamera(obj_pts, img_ptsR, right_im_gray.shape[::-1], None, None)
     # hR, wR = right_im_gray.shape[:2]
     # new_mtxR, roiR = cv2.getOptimalNewCameraMatrix(mtxR, distR, (wR, hR), 1, (wR, hR))
     new_mtxR = mtxR
 
     # Stereo camera calibration
-    flags = 0
-    flags |= cv2.CALIB_FIX_INTRINSIC
     # Here we fix the intrinsic camera matrices so that only Rot, Trns, Emat and Fmat are calculated.
     # Hence intrinsic parameters are the same
-    criteria_stereo = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-
-    # This step is performed to transformation between the two cameras and calculate Essential and fundamental matrix
-    retS, new_mtxL, distL, new_mtxR, distR, Rot, Trns, Emat, Fmat = cv2.stereoCalibrate(obj_pts, img_ptsL, img_ptsR,
-                                                                                        new_mtxL, distL, new_mtxR,
-                                                                                        distR, left_im_gray.shape[::-1],
-                                                                                        criteria_stereo, flags)
-    print('baseline', Trns[0]*1000, 'mm')
-
-    # Stereo rectification
-    rectify_scale = 1
-    rect_l, rect_r, proj_mat_l, proj_mat_r, Q, roiL, roiR = cv2.stereoRectify(new_mtxL, distL, new_mtxR, distR,
-                                                                              left_im_gray.shape[::-1], Rot, Trns,
-                                                                              rectify_scale, (0, 0))
-    # Compute and saving the mappings
-    Left_Stereo_Map = cv2.initUndistortRectifyMap(new_mtxL, distL, rect_l, proj_mat_l,
-                                                  left_im_gray.shape[::-1], cv2.CV_16SC2)
-    Right_Stereo_Map = cv2.initUndistortRectifyMap(new_mtxR, distR, rect_r, proj_mat_r,
-                                                   right_im_gray.shape[::-1], cv2.CV_16SC2)
-    print(f' From a total of {total} image pairs, {used} were used')
-    return True, Left_Stereo_Map, Right_Stereo_Map
+    start = time.perf_counter()
+    retS, Rot, Trns, Emat, Fmat = stereo_calibrate(obj_pts, img_ptsL, img_ptsR, new_mtxL, distL, new_mtxR, distR,
+                                                   image_size, model, criteria)
+    timings['stereo solve'] = time.perf_counter() - start
+    if verbose:
+        print('baseline', Trns[0]*1000, 'mm')
+
+    # Stereo rectification, computing the mappings
+    start = time.perf_counter()
+    Left_Stereo_Map, Right_Stereo_Map, rectification = stereo_rectify(new_mtxL, distL, new_mtxR, distR, image_size,
+                                                                      Rot, Trns, model)
+    timings['rectification maps'] = time.perf_counter() - start
+    if verbose:
+        print(f' From a total of {total} image pairs, {used} were used, {prerejected} rejected by the pre-check and '
+              f'{total - prerejected - used} without a detected pattern')
+        print_timings(timings)
+    params = {'image_size': np.array(image_size), 'M1': new_mtxL, 'D1': distL, 'M2': new_mtxR, 'D2': distR,
+              'R': Rot, 'T': Trns, 'E': Emat, 'F': Fmat, **rectification}
+    return True, Left_Stereo_Map, Right_Stereo_Map, params
@@ -0,0 +1,134 @@
+from cvc_cli.mono.calibration import mono_calibration
+from cvc_cli.mono.rectifier import MonoRectifier
+from cvc_cli.stereo.calibration import stereo_calibration
+from cvc_cli.stereo.rectifier import StereoRectifier
+from cvc_cli.stereo.solver import check_init_distortion, termination_criteria
+
+
+class Calibrator:
+    """ Mono and stereo calibration with a given pattern and solver configuration
+
+    Example
+    -------
+    calibrator = Calibrator('checkerboard', (9, 6), 25)
+    rectifier = calibrator.calibrate_stereo(stereo_pairs)
+    left_rect, right_rect = rectifier.rectify(left_im, right_im)
+    rectifier.save('stereo_params.yml')
+
+    Parameters
+    ----------
+    pattern_type (str):
+        Calibration pattern type: 'checkerboard', 'circles', 'acircles' or 'charuco'
+    pattern_shape (tuple):
+        Number of valid squares (circles per row and rows, or charuco squares), for example (9, 6)
+    pattern_size (float):
+        Pattern size (square size or circle spacing) in mm
+    detector (str):
+        Chessboard detector, 'classic' or 'sb'
+    precheck (str):
+        Chessboard pre-check, 'none', 'check' or 'fast'
+    marker_size (float):
+        ChArUco marker size in mm (3/4 of pattern_size by default)
+    aruco_dict (str):
+        ChArUco marker dictionary
+    model (str):
+        Distortion model: 'k1k2', 'standard', 'rational', 'thin-prism', 'tilted' or 'fisheye'
+    max_iter, eps:
+        Termination criteria of the solvers
+    max_views (int):
+        If > 0, at most max_views diverse views are used
+    reject_threshold (float):
+        If > 0, views with a reprojection RMS above reject_threshold pixels are dropped
+    reject_rounds (int):
+        Maximum number of outlier rejection rounds
+    show (bool):
+        Show the detections
+    debug (bool):
+        If debug, shows more info
+    verbose (bool):
+        Print the detection progress bar, the calibration and the errors
+    """
+
+    def __init__(self, pattern_type='checkerboard', pattern_shape=(9, 6), pattern_size=25, detector='classic',
+                 precheck='none', marker_size=None, aruco_dict='DICT_5X5_100', model='standard', max_iter=30,
+                 eps=0.001, max_views=0, reject_threshold=0, reject_rounds=3, show=False, debug=False,
+                 verbose=False):
+        self.pattern_type = pattern_type
+        self.pattern_shape = tuple(pattern_shape)
+        self.pattern_size = pattern_size
+        self.detector = detector
+        self.precheck = precheck
+        self.marker_size = marker_size
+        self.aruco_dict = aruco_dict
+        self.model = model
+        self.criteria = termination_criteria(max_iter, eps)
+        self.max_views = max_views
+        self.reject_threshold = reject_threshold
+        self.reject_rounds = reject_rounds
+        self.show = show
+        self.debug = debug
+        self.verbose = verbose
+
+    def calibrate_mono(self, images, init_intrinsics=None):
+        """ Calibrates a camera
+
+        Parameters
+        ----------
+        images (list):
+            list of images paths
+        init_intrinsics (tuple):
+            (intrinsic matrix, distortion) used as initial guess
+
+        Returns
+        -------
+        MonoRectifier
+            Calibration and undistortion maps
+        """
+        if init_intrinsics is not None:
+            check_init_distortion(init_intrinsics[1], self.model)
+        ret, mtx, dist, _, _, w, h = mono_calibration(images, self.pattern_type, self.pattern_shape,
+                                                      self.pattern_size, self.show, self.debug,
+                                                      max_views=self.max_views, precheck=self.precheck,
+                                                      detector=self.detector, marker_size=self.marker_size,
+                                                      aruco_dict=self.aruco_dict,
+                                                      reject_threshold=self.reject_threshold,
+                                                      reject_rounds=self.reject_rounds,
+                                                      init_intrinsics=init_intrinsics, model=self.model,
+                                                      criteria=self.criteria, verbose=self.verbose)
+        if ret is False:
+            raise ValueError('Calibration pattern not found in any image')
+        return MonoRectifier.from_calibration(mtx, dist, (w, h), self.model)
+
+    def calibrate_stereo(self, stereo_pairs, init_intrinsics=None, fix_intrinsics=False):
+        """ Calibrates a stereo camera
+
+        Parameters
+        ----------
+        stereo_pairs (list):
+            list of stereo images path
+        init_intrinsics (list):
+            (intrinsic matrix, distortion) of the left and right cameras, used as initial guess
+        fix_intrinsics (bool):
+            Keep init_intrinsics as they are, only the extrinsics are estimated
+
+        Returns
+        -------
+        StereoRectifier
+            Rectification maps and parametric calibration
+        """
+        for _, dist in init_intrinsics or []:
+            check_init_distortion(dist, self.model)
+        result, left_map, right_map, params = stereo_calibration(stereo_pairs, self.pattern_type,
+                                                                 self.pattern_shape, self.pattern_size, self.show,
+                                                                 self.debug, max_views=self.max_views,
+                                                                 precheck=self.precheck, detector=self.detector,
+                                                                 marker_size=self.marker_size,
+                                                                 aruco_dict=self.aruco_dict,
+                                                                 reject_threshold=self.reject_threshold,
+                                                                 reject_rounds=self.reject_rounds,
+                                                                 init_intrinsics=init_intrinsics,
+                                                                 fix_intrinsics=fix_intrinsics, model=self.model,
+                                                                 criteria=self.criteria, verbose=self.verbose)
+        if result is False:
+            raise ValueError('Calibration pattern not found in any image')
+        return StereoRectifier(left_map, right_map, params)
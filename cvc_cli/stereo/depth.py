@@ -0,0 +1,201 @@
+import cv2
+import time
+import pathlib
+import numpy as np
+from os.path import join
+from cvc_cli.stereo.batch import write_image
+
+
+# Stereo matchers: semi-global block matching (better on low texture) or block matching (faster)
+MATCHERS = ('sgbm', 'bm')
+
+
+class DepthEstimator:
+    """ Disparity and depth of rectified stereo pairs
+
+    Disparities are computed by cv2.StereoSGBM or cv2.StereoBM and converted to depth with the disparity-to-depth
+    matrix Q of the stereo calibration, so depth is in the units of the calibration (meters for cvc-stereo cal).
+
+    Example
+    -------
+    estimator = DepthEstimator(StereoRectifier.from_file('stereo_params.yml').Q)
+    disparity = estimator.disparity(left_rect, right_rect)
+    depth = estimator.depth(disparity)
+
+    Parameters
+    ----------
+    Q (np.array):
+        4x4 disparity-to-depth matrix of the calibration
+    matcher (str):
+        'sgbm' or 'bm'
+    num_disparities (int):
+        Disparity search range in pixels of the full resolution images, multiple of 16
+    block_size (int):
+        Odd matched block size (at least 5 for bm)
+    scale (float):
+        Matching resolution, for example 0.5 matches half resolution images (about 4 times faster). Disparities
+        are upsampled back to the full resolution
+    tile_height (int):
+        Match horizontal bands of tile_height rows of the matched images, which bounds the memory of the matcher
+        on large images. 0 matches the whole images
+    tile_overlap (int):
+        Rows added above and below each band, so the blocks and the matching paths near the band borders see
+        the same context as in a whole image
+    """
+
+    def __init__(self, Q, matcher='sgbm', num_disparities=64, block_size=5, scale=1.0, tile_height=0,
+                 tile_overlap=16):
+        if matcher not in MATCHERS:
+            raise ValueError(f'Unknown matcher {matcher}, expected one of {", ".join(MATCHERS)}')
+        if num_disparities <= 0 or num_disparities % 16:
+            raise ValueError('num_disparities must be a positive multiple of 16')
+        if block_size % 2 == 0 or block_size < (5 if matcher == 'bm' else 1):
+            raise ValueError(f'Invalid block size {block_size} for {matcher}')
+        if not 0 < scale <= 1:
+            raise ValueError('scale must be in (0, 1]')
+        if tile_height < 0 or tile_overlap < 0:
+            raise ValueError('tile_height and tile_overlap must be positive or 0')
+        self.Q = np.asarray(Q, np.float64)
+        self.matcher = matcher
+        self.num_disparities = num_disparities
+        self.block_size = block_size
+        self.scale = scale
+        self.tile_height = tile_height
+        self.tile_overlap = tile_overlap
+
+        # Search range at the matching resolution, still a multiple of 16
+        search = max(16, int(np.ceil(num_disparities * scale / 16)) * 16)
+        if matcher == 'bm':
+            self.stereo = cv2.StereoBM_create(search, block_size)
+        else:
+            self.stereo = cv2.StereoSGBM_create(0, search, block_size, P1=8 * block_size ** 2,
+                                                P2=32 * block_size ** 2, disp12MaxDiff=1, uniquenessRatio=10,
+                                                speckleWindowSize=100, speckleRange=2,
+                                                mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY)
+
+    @property
+    def options(self):
+        """ Constructor arguments, used to build the same estimator in worker processes """
+        return {'Q': self.Q, 'matcher': self.matcher, 'num_disparities': self.num_disparities,
+                'block_size': self.block_size, 'scale': self.scale, 'tile_height': self.tile_height,
+                'tile_overlap': self.tile_overlap}
+
+    def _match(self, left_im, right_im):
+        disparity = self.stereo.compute(left_im, right_im).astype(np.float32)
+        # Fixed point disparities with 4 fractional bits
+        disparity *= 1 / 16
+        return disparity
+
+    def _match_tiles(self, left_im, right_im):
+        height = left_im.shape[0]
+        if not self.tile_height or height <= self.tile_height:
+            return self._match(left_im, right_im)
+        disparity = np.empty(left_im.shape[:2], np.float32)
+        for top in range(0, height, self.tile_height):
+            bottom = min(top + self.tile_height, height)
+            start = max(0, top - self.tile_overlap)
+            stop = min(height, bottom + self.tile_overlap)
+            tile = self._match(left_im[start:stop], right_im[start:stop])
+            disparity[top:bottom] = tile[top - start:bottom - start]
+        return disparity
+
+    def disparity(self, left_rect, right_rect):
+        """ Disparity of a rectified pair (uint8, gray or BGR)
+
+        Returns
+        -------
+        np.array
+            float32 disparity in pixels of the full resolution images, negative where no match was found
+        """
+        if left_rect.ndim == 3:
+            left_rect = cv2.cvtColor(left_rect, cv2.COLOR_BGR2GRAY)
+            right_rect = cv2.cvtColor(right_rect, cv2.COLOR_BGR2GRAY)
+        if self.scale == 1:
+            return self._match_tiles(left_rect, right_rect)
+        height, width = left_rect.shape
+        size = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+        disparity = self._match_tiles(cv2.resize(left_rect, size, interpolation=cv2.INTER_AREA),
+                                      cv2.resize(right_rect, size, interpolation=cv2.INTER_AREA))
+        # Nearest neighbour upsampling keeps the invalid pixels apart from the valid ones
+        disparity = cv2.resize(disparity, (width, height), interpolation=cv2.INTER_NEAREST)
+        disparity *= 1 / self.scale
+        return disparity
+
+    def depth(self, disparity):
+        """ Depth (Z) of a disparity map, Z = Q[2, 3] / (Q[3, 2] d + Q[3, 3])
+
+        Returns
+        -------
+        np.array
+            float32 depth in the units of the calibration, 0 where the disparity is invalid
+        """
+        w = disparity * np.float32(self.Q[3, 2])
+        w += np.float32(self.Q[3, 3])
+        depth = np.zeros_like(w)
+        np.divide(np.float32(self.Q[2, 3]), w, out=depth, where=(disparity > 0) & (w > 0))
+        return depth
+
+    def preview(self, disparity):
+        """ Color (JET colormap) image of a disparity map, near is red, invalid pixels are black """
+        preview = cv2.applyColorMap(cv2.convertScaleAbs(disparity, alpha=255 / self.num_disparities),
+                                    cv2.COLORMAP_JET)
+        preview[disparity <= 0] = 0
+        return preview
+
+
+def write_depth(estimator, disparity, source_path, output_folder, preview=True, arrays=True, depth_writer=None):
+    """ Writes the depth/ preview and the depth_npy/ array of a disparity map
+
+    The preview is named as the source (left) image, the array is the float32 depth saved with np.save (same name,
+    .npy extension). With a depth_writer (cvc_cli.stereo.depth_store.DepthWriter), the depth is also appended to
+    it under the name of the source image without extension.
+
+    Returns
+    -------
+    dict
+        Counters [files, bytes, seconds] of each output (see cvc_cli.stereo.batch.merge_stats)
+    """
+    source_path = pathlib.Path(source_path)
+    stats = {}
+    if preview:
+        start = time.perf_counter()
+        nbytes = write_image(join(output_folder, 'depth', source_path.name), estimator.preview(disparity),
+                             source_path.suffix)
+        stats['depth'] = [1, nbytes, time.perf_counter() - start]
+    if arrays or depth_writer is not None:
+        depth = estimator.depth(disparity)
+    if arrays:
+        start = time.perf_counter()
+        depth_path = join(output_folder, 'depth_npy', source_path.stem + '.npy')
+        np.save(depth_path, depth)
+        stats['depth_npy'] = [1, pathlib.Path(depth_path).stat().st_size, time.perf_counter() - start]
+    if depth_writer is not None:
+        depth_writer.append(depth, source_path.stem)
+    return stats
+
+
+def write_depth_pair(estimator, left_path, right_path, output_folder, preview=True, arrays=True, depth_writer=None):
+    """ Computes the depth of a rectified stereo pair from disk and writes it (see write_depth)
+
+    Parameters
+    ----------
+    estimator (DepthEstimator):
+        Matcher and calibration
+    left_path, right_path (str):
+        Paths of the rectified pair
+    output_folder (str):
+        Folder with the depth and depth_npy subfolders
+    preview, arrays (bool):
+        Write the depth/ preview and the depth_npy/ array
+    depth_writer (DepthWriter):
+        Depth sequence file the depth is appended to, if any
+
+    Returns
+    -------
+    dict
+        Counters [files, bytes, seconds] of each output
+    """
+    left_im = cv2.imread(left_path, cv2.IMREAD_GRAYSCALE)
+    right_im = cv2.imread(right_path, cv2.IMREAD_GRAYSCALE)
+    return write_depth(estimator, estimator.disparity(left_im, right_im), left_path, output_folder, preview, arrays,
+                       depth_writer)
@@ -0,0 +1,234 @@
+import json
+import struct
+import zlib
+import numpy as np
+
+
+# File layout: MAGIC, then the compressed chunks, then the JSON index and the trailer (index offset and size, MAGIC)
+MAGIC = b'CVCDEPTH'
+VERSION = 1
+_TRAILER = struct.Struct('<QQ8s')
+
+# Stored types: uint16 quantized depth (scale units, 1 mm by default), float16 or lossless float32 depth
+DEPTH_DTYPES = ('uint16', 'float16', 'float32')
+COMPRESSIONS = ('zlib', 'lz4', 'none')
+
+
+def _lz4():
+    try:
+        import lz4.frame
+    except ImportError:
+        raise ValueError('lz4 compression needs the lz4 package (pip install lz4)')
+    return lz4.frame
+
+
+def _compress(data, compression, level):
+    if compression == 'zlib':
+        return zlib.compress(data, level)
+    if compression == 'lz4':
+        return _lz4().compress(data)
+    return bytes(data)
+
+
+def _decompress(data, compression):
+    if compression == 'zlib':
+        return zlib.decompress(data)
+    if compression == 'lz4':
+        return _lz4().decompress(data)
+    return data
+
+
+def _shuffle(frames):
+    # Bytes of the same significance are stored together, the high bytes of smooth depth maps are very repetitive
+    return np.ascontiguousarray(frames.view(np.uint8).reshape(-1, frames.dtype.itemsize).T)
+
+
+def _unshuffle(data, dtype, shape):
+    dtype = np.dtype(dtype)
+    planes = np.frombuffer(data, np.uint8).reshape(dtype.itemsize, -1)
+    return np.ascontiguousarray(planes.T).view(dtype).reshape(shape)
+
+
+class DepthWriter:
+    """ Writes a sequence of depth maps into one chunked and compressed file
+
+    Frames are quantized (uint16 depth in scale units, float16 or float32), grouped in chunks of chunk_frames
+    frames, byte shuffled and compressed, so a sequence takes one file instead of one .npy per frame. The file is
+    readable by DepthReader once the writer is closed.
+
+    Example
+    -------
+    with DepthWriter('depth.cvcd') as writer:
+        for name, depth in frames:
+            writer.append(depth, name)
+
+    Parameters
+    ----------
+    filename (str):
+        Output file
+    dtype (str):
+        'uint16' (depth / scale rounded, up to 65535 scale units, 65.535 m with 1 mm, farther depths are stored as
+        0, unknown), 'float16' or 'float32'
+    compression (str):
+        'zlib', 'lz4' (needs the lz4 package, faster) or 'none'
+    chunk_frames (int):
+        Frames per chunk (> 0), a random access decompresses one chunk
+    scale (float):
+        Depth of one uint16 unit, in the units of the depth maps (0.001 is 1 mm for depth in meters)
+    level (int):
+        zlib compression level
+    """
+
+    def __init__(self, filename, dtype='uint16', compression='zlib', chunk_frames=32, scale=0.001, level=6):
+        if dtype not in DEPTH_DTYPES:
+            raise ValueError(f'Unknown depth type {dtype}, expected one of {", ".join(DEPTH_DTYPES)}')
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'Unknown compression {compression}, expected one of {", ".join(COMPRESSIONS)}')
+        if chunk_frames <= 0:
+            raise ValueError(f'Invalid chunk size {chunk_frames}, expected at least one frame per chunk')
+        if compression == 'lz4':
+            _lz4()
+        self.dtype = dtype
+        self.compression = compression
+        self.chunk_frames = chunk_frames
+        self.scale = scale
+        self.level = level
+        self.shape = None
+        self.chunks = []
+        self.names = []
+        self.pending = []
+        self.file = open(filename, 'wb')
+        self.file.write(MAGIC)
+
+    def _quantize(self, depth):
+        if self.dtype == 'uint16':
+            units = np.rint(depth / self.scale)
+            # Depths out of the uint16 range (negative, too far or not finite) are stored as unknown
+            units[~((units >= 0) & (units <= np.iinfo(np.uint16).max))] = 0
+            return units.astype(np.uint16)
+        return depth.astype(self.dtype)
+
+    def append(self, depth, name=''):
+        """ Appends a depth map (2D, same shape for all the frames, 0 where unknown) named name """
+        if self.shape is None:
+            self.shape = depth.shape
+        elif depth.shape != self.shape:
+            raise ValueError(f'Depth map of shape {depth.shape}, expected {self.shape}')
+        self.pending.append(self._quantize(depth))
+        self.names.append(name)
+        if len(self.pending) == self.chunk_frames:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        data = _compress(_shuffle(np.stack(self.pending)), self.compression, self.level)
+        self.chunks.append((self.file.tell(), len(data), len(self.pending)))
+        self.file.write(data)
+        self.pending = []
+
+    def close(self):
+        """ Writes the pending frames and the index """
+        if self.file.closed:
+            return
+        self._flush()
+        index = {'version': VERSION, 'dtype': self.dtype, 'compression': self.compression, 'scale': self.scale,
+                 'shape': list(self.shape or (0, 0)), 'chunk_frames': self.chunk_frames, 'chunks': self.chunks,
+                 'names': self.names}
+        data = json.dumps(index).encode()
+        offset = self.file.tell()
+        self.file.write(data)
+        self.file.write(_TRAILER.pack(offset, len(data), MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DepthReader:
+    """ Random access to the depth maps of a DepthWriter file
+
+    Frames are returned as float32 depth (0 where unknown). The last decompressed chunk is kept, so sequential
+    reads decompress each chunk once.
+
+    Example
+    -------
+    with DepthReader('depth.cvcd') as reader:
+        depth = reader[10]
+        depth = reader.frame('frame_1')
+
+    Parameters
+    ----------
+    filename (str):
+        File written by DepthWriter
+    """
+
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ValueError(f'{filename} is not a depth file')
+        end = self.file.seek(0, 2)
+        magic = None
+        if end >= len(MAGIC) + _TRAILER.size:
+            self.file.seek(end - _TRAILER.size)
+            offset, size, magic = _TRAILER.unpack(self.file.read(_TRAILER.size))
+        if magic != MAGIC:
+            self.file.close()
+            raise ValueError(f'{filename} is incomplete, was its writer closed?')
+        self.file.seek(offset)
+        index = json.loads(self.file.read(size))
+        self.dtype = index['dtype']
+        self.compression = index['compression']
+        self.scale = index['scale']
+        self.shape = tuple(index['shape'])
+        self.chunks = index['chunks']
+        self.names = index['names']
+        self._first_frames = np.cumsum([0] + [frames for _, _, frames in self.chunks])
+        self._positions = {name: i for i, name in enumerate(self.names)}
+        self._cached = (None, None)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _chunk(self, chunk):
+        if self._cached[0] != chunk:
+            offset, size, frames = self.chunks[chunk]
+            self.file.seek(offset)
+            data = _decompress(self.file.read(size), self.compression)
+            self._cached = (chunk, _unshuffle(data, self.dtype, (frames,) + self.shape))
+        return self._cached[1]
+
+    def __getitem__(self, index):
+        """ float32 depth map of the frame index """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f'Frame {index} out of range, the file has {len(self)} frames')
+        chunk = int(np.searchsorted(self._first_frames, index, side='right')) - 1
+        depth = self._chunk(chunk)[index - self._first_frames[chunk]].astype(np.float32)
+        if self.dtype == 'uint16':
+            depth *= self.scale
+        return depth
+
+    def frame(self, name):
+        """ float32 depth map of the frame named name """
+        if name not in self._positions:
+            raise KeyError(f'No frame named {name}')
+        return self[self._positions[name]]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
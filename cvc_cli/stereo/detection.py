@@ -0,0 +1,317 @@
+import cv2
+import time
+import numpy as np
+
+
+# Termination criteria for refining the detected corners
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+def precheck_chessboard(im_gray, pattern_shape, max_side=640):
+    """ Cheap test of the presence of a chessboard, using cv2.checkChessboard on a downscaled image
+
+    Parameters
+    ----------
+    im_gray (np.array):
+        Gray image
+    pattern_shape (tuple):
+        Number of inner corners, for example (9, 6)
+    max_side (int):
+        The image is downscaled so its longest side is at most max_side pixels, None keeps the full resolution
+
+    Returns
+    -------
+    bool
+        False if the image surely does not contain the board
+    """
+    scale = max_side / max(im_gray.shape[:2]) if max_side else 1
+    if scale < 1:
+        im_gray = cv2.resize(im_gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return bool(cv2.checkChessboard(im_gray, tuple(pattern_shape)))
+
+
+def find_chessboard(im_gray, pattern_shape):
+    """ Detects the chessboard corners with cv2.findChessboardCorners and subpixel refinement (classic detector)
+
+    Parameters
+    ----------
+    im_gray (np.array):
+        Gray image
+    pattern_shape (tuple):
+        Number of inner corners, for example (9, 6)
+
+    Returns
+    -------
+    bool, np.array
+        Pattern found, corners
+    """
+    flags = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE
+    exists_pattern, corners = cv2.findChessboardCorners(im_gray, tuple(pattern_shape), None, flags)
+    if exists_pattern:
+        cv2.cornerSubPix(im_gray, corners, (11, 11), (-1, -1), SUBPIX_CRITERIA)
+    return exists_pattern, corners
+
+
+def find_chessboard_sb(im_gray, pattern_shape):
+    """ Detects the chessboard corners with the sector based detector cv2.findChessboardCornersSB
+
+    It is more robust to noise and blur, often faster on high resolution images, and returns subpixel accurate
+    corners, so there is no cornerSubPix step.
+
+    Parameters
+    ----------
+    im_gray (np.array):
+        Gray image
+    pattern_shape (tuple):
+        Number of inner corners, for example (9, 6)
+
+    Returns
+    -------
+    bool, np.array
+        Pattern found, corners
+    """
+    exists_pattern, corners = cv2.findChessboardCornersSB(im_gray, tuple(pattern_shape), None,
+                                                          cv2.CALIB_CB_NORMALIZE_IMAGE)
+    return exists_pattern, corners
+
+
+# Chessboard detector backends, all of them share the find_chessboard signature
+DETECTORS = {'classic': find_chessboard, 'sb': find_chessboard_sb}
+
+
+# Blob detectors by maximum blob area
+_blob_detectors = {}
+
+
+def blob_detector(max_area=1e6):
+    """ SimpleBlobDetector tuned for calibration circle grids
+
+    Compared with the OpenCV defaults, the area limits accept the large blobs of high resolution images and
+    a coarser threshold step halves the number of binarizations per image. max_area must still reject the dark
+    regions much larger than a circle, cv2.findCirclesGrid fails on some grids otherwise.
+    """
+    if max_area not in _blob_detectors:
+        params = cv2.SimpleBlobDetector_Params()
+        params.minThreshold = 10
+        params.maxThreshold = 230
+        params.thresholdStep = 20
+        params.minRepeatability = 2
+        params.filterByColor = True
+        params.blobColor = 0
+        params.filterByArea = True
+        params.minArea = 25
+        params.maxArea = max_area
+        params.filterByCircularity = True
+        params.minCircularity = 0.7
+        params.filterByConvexity = True
+        params.minConvexity = 0.85
+        params.filterByInertia = True
+        params.minInertiaRatio = 0.3
+        _blob_detectors[max_area] = cv2.SimpleBlobDetector_create(params)
+    return _blob_detectors[max_area]
+
+
+def find_circles(im_gray, pattern_shape, asymmetric=False):
+    """ Detects the centers of a (asymmetric) circle grid with cv2.findCirclesGrid
+
+    Parameters
+    ----------
+    im_gray (np.array):
+        Gray image
+    pattern_shape (tuple):
+        Number of circles per row and number of rows, for example (4, 11) for an asymmetric grid
+    asymmetric (bool):
+        True for an asymmetric circle grid
+
+    Returns
+    -------
+    bool, np.array
+        Pattern found, centers
+    """
+    flags = cv2.CALIB_CB_ASYMMETRIC_GRID if asymmetric else cv2.CALIB_CB_SYMMETRIC_GRID
+    # No circle of a visible grid is larger than the image area shared by all the circles
+    max_area = im_gray.shape[0] * im_gray.shape[1] // (pattern_shape[0] * pattern_shape[1])
+    return cv2.findCirclesGrid(im_gray, tuple(pattern_shape), None, flags, blob_detector(max_area))
+
+
+def aruco_dictionary(name):
+    """ Predefined ArUco dictionary from its name, for example 'DICT_5X5_100', raises ValueError if unknown """
+    if not hasattr(cv2, 'aruco'):
+        raise ImportError('ChArUco patterns need cv2.aruco (opencv-python >= 4.7 or opencv-contrib-python)')
+    names = sorted(n for n in dir(cv2.aruco) if n.startswith('DICT_'))
+    if name not in names:
+        raise ValueError(f'Unknown ArUco dictionary {name}, valid ones are {", ".join(names)}')
+    dictionary_id = getattr(cv2.aruco, name)
+    if hasattr(cv2.aruco, 'getPredefinedDictionary'):
+        return cv2.aruco.getPredefinedDictionary(dictionary_id)
+    return cv2.aruco.Dictionary_get(dictionary_id)
+
+
+def charuco_board(pattern_shape, square_length, marker_length, aruco_dict='DICT_5X5_100'):
+    """ ChArUco board of pattern_shape = (squares_x, squares_y), lengths in any unit """
+    dictionary = aruco_dictionary(aruco_dict)
+    if hasattr(cv2.aruco, 'CharucoDetector'):
+        return cv2.aruco.CharucoBoard(tuple(pattern_shape), square_length, marker_length, dictionary)
+    return cv2.aruco.CharucoBoard_create(pattern_shape[0], pattern_shape[1], square_length, marker_length, dictionary)
+
+
+def board_property(board, name):
+    """ Reads a board property with both aruco APIs, for example board_property(board, 'ids') """
+    getter = 'get' + name[0].upper() + name[1:]
+    return getattr(board, getter)() if hasattr(board, getter) else getattr(board, name)
+
+
+class CalibrationPattern:
+    """ Calibration pattern: detection (with the optional pre-check) and object points
+
+    Parameters
+    ----------
+    pattern_type (str):
+        'checkerboard', 'circles', 'acircles' or 'charuco'
+    pattern_shape (tuple):
+        Inner corners (checkerboard), circles per row and rows (circle grids), or squares (charuco)
+    pattern_size (float):
+        Square size (or circle spacing) in mm
+    detector (str):
+        Chessboard detector backend (key of DETECTORS)
+    precheck (str):
+        Chessboard pre-check, 'none', 'check' or 'fast'
+    marker_size (float):
+        ChArUco marker size in mm, 3/4 of the square size by default
+    aruco_dict (str):
+        ChArUco marker dictionary
+    """
+    # Minimum number of ChArUco corners to use a (partial) view
+    min_charuco_corners = 6
+
+    def __init__(self, pattern_type, pattern_shape, pattern_size, detector='classic', precheck='none',
+                 marker_size=None, aruco_dict='DICT_5X5_100'):
+        self.pattern_type = pattern_type
+        self.pattern_shape = tuple(pattern_shape)
+        self.pattern_size = pattern_size
+        self.detector = detector
+        self.precheck = precheck
+        self.board = None
+        self.charuco_detector = None
+        if pattern_type == 'charuco':
+            marker_size = marker_size or 0.75 * pattern_size
+            self.board = charuco_board(pattern_shape, pattern_size / 1000, marker_size / 1000, aruco_dict)
+            self.dictionary = aruco_dictionary(aruco_dict)
+            if hasattr(cv2.aruco, 'CharucoDetector'):
+                self.charuco_detector = cv2.aruco.CharucoDetector(self.board)
+        self.objp = self._object_points()
+
+    @property
+    def partial(self):
+        """ True if the pattern can be detected partially (detections come with ids) """
+        return self.pattern_type == 'charuco'
+
+    def _object_points(self):
+        if self.pattern_type == 'charuco':
+            return np.asarray(board_property(self.board, 'chessboardCorners'), np.float32).reshape(1, -1, 3)
+        cols, rows = self.pattern_shape
+        objp = np.zeros((1, cols * rows, 3), np.float32)
+        grid = np.mgrid[0:cols, 0:rows].T.reshape(-1, 2)
+        if self.pattern_type == 'acircles':
+            # Odd rows are shifted by one spacing, as drawn by PatternMaker.make_acircles_pattern
+            grid[:, 0] = 2 * grid[:, 0] + grid[:, 1] % 2
+        objp[0, :, :2] = grid
+        objp *= self.pattern_size/1000
+        return objp
+
+    def object_points(self, ids=None):
+        """ World coordinates (in meters) of the pattern points, shape (1, N, 3), only the given ids if any """
+        if ids is None:
+            return self.objp
+        return self.objp[:, np.asarray(ids).ravel()]
+
+    def passes_precheck(self, im_gray):
+        """ Applies the pre-check stage, only defined for chessboards (other patterns always pass)
+
+        'fast' is cv2.checkChessboard on the full resolution image, 'check' the same test on a downscaled image.
+        Running it apart from the detector lets the callers count the rejections
+        """
+        if self.precheck == 'none' or self.pattern_type != 'checkerboard':
+            return True
+        return precheck_chessboard(im_gray, self.pattern_shape, None if self.precheck == 'fast' else 640)
+
+    def detect(self, im_gray):
+        """ Detects the pattern
+
+        Returns
+        -------
+        bool, np.array, np.array
+            Pattern found, corners (or circle centers) and ids (None unless the pattern is partial)
+        """
+        if self.pattern_type == 'checkerboard':
+            exists_pattern, corners = DETECTORS[self.detector](im_gray, self.pattern_shape)
+            return exists_pattern, corners, None
+        if self.pattern_type == 'charuco':
+            return self._detect_charuco(im_gray)
+        exists_pattern, centers = find_circles(im_gray, self.pattern_shape, self.pattern_type == 'acircles')
+        return exists_pattern, centers, None
+
+    def _detect_charuco(self, im_gray):
+        if self.charuco_detector is not None:
+            corners, ids, _, _ = self.charuco_detector.detectBoard(im_gray)
+        else:
+            marker_corners, marker_ids, _ = cv2.aruco.detectMarkers(im_gray, self.dictionary)
+            corners, ids = None, None
+            if marker_ids is not None and len(marker_ids) > 0:
+                _, corners, ids = cv2.aruco.interpolateCornersCharuco(marker_corners, marker_ids, im_gray,
+                                                                      self.board)
+        if ids is None or len(ids) < self.min_charuco_corners:
+            return False, None, None
+        return True, corners, ids
+
+    def draw(self, im, corners, ids):
+        """ Draws a detection on a color image """
+        if self.pattern_type == 'charuco':
+            return cv2.aruco.drawDetectedCornersCharuco(im, corners, ids)
+        return cv2.drawChessboardCorners(im, self.pattern_shape, corners, True)
+
+
+def match_ids(corners_left, ids_left, corners_right, ids_right):
+    """ Keeps the corners detected in both images of a stereo pair, matched by id
+
+    Returns
+    -------
+    np.array, np.array, np.array
+        Left corners, right corners and ids, in the same order
+    """
+    ids, index_left, index_right = np.intersect1d(ids_left.ravel(), ids_right.ravel(), return_indices=True)
+    return corners_left[index_left], corners_right[index_right], ids.reshape(-1, 1)
+
+
+def benchmark_detectors(images, pattern_shape, detectors=None):
+    """ Measures the detection rate and detection time per image of the chessboard detectors
+
+    Images are decoded before timing, so only the detection is measured.
+
+    Parameters
+    ----------
+    images (list):
+        list of images paths
+    pattern_shape (tuple):
+        Number of inner corners, for example (9, 6)
+    detectors (list):
+        Names of the detectors to compare, all of them by default
+
+    Returns
+    -------
+    dict
+        For each detector name, (detected images, total images, mean milliseconds per image)
+    """
+    detectors = list(DETECTORS) if detectors is None else detectors
+    ims_gray = [cv2.imread(image_path, 0) for image_path in images]
+    results = {}
+    for name in detectors:
+        detect = DETECTORS[name]
+        found = 0
+        start = time.perf_counter()
+        for im_gray in ims_gray:
+            exists_pattern, _ = detect(im_gray, pattern_shape)
+            found += int(exists_pattern)
+        elapsed = time.perf_counter() - start
+        results[name] = (found, len(ims_gray), 1000 * elapsed / max(len(ims_gray), 1))
+    return results
@@ -0,0 +1,202 @@
+import cv2
+import gzip
+import hashlib
+import json
+import os
+import struct
+from cvc_cli.stereo.utils import scan_images, get_list_of_stereo_images
+
+
+MANIFEST_NAME = 'manifest.json.gz'
+MANIFEST_VERSION = 1
+
+# Entry layout inside a manifest folder: name -> [size, mtime_ns, width, height, hash]
+_SIZE, _MTIME, _WIDTH, _HEIGHT, _HASH = range(5)
+
+
+def _png_size(header):
+    if header[:8] == b'\x89PNG\r\n\x1a\n' and header[12:16] == b'IHDR':
+        return struct.unpack('>II', header[16:24])
+    return None
+
+
+def _jpeg_size(f):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        # Start of frame markers (except DHT, JPG and DAC) carry the image size
+        if marker[1] in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            data = f.read(7)
+            height, width = struct.unpack('>HH', data[3:7])
+            return width, height
+        length = struct.unpack('>H', f.read(2))[0]
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def image_size(image_path):
+    """ Reads the image size, parsing PNG and JPEG headers to avoid decoding the whole image
+
+    Parameters
+    ----------
+    image_path: string
+        Image path
+
+    Returns
+    -------
+    tuple
+        (width, height), or (0, 0) if the image can not be read
+    """
+    with open(image_path, 'rb') as f:
+        header = f.read(24)
+        size = _png_size(header)
+        if size is None and header[:2] == b'\xff\xd8':
+            try:
+                size = _jpeg_size(f)
+            except struct.error:
+                size = None
+    if size is None:
+        im = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+        size = (0, 0) if im is None else (im.shape[1], im.shape[0])
+    return tuple(size)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """ Content hash (blake2b, 128 bits) of a file """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _scan_folder(folder, previous, content_hash):
+    """ Scans one image folder, reusing the previous entries whose size and mtime did not change """
+    previous_entries = previous['entries'] if previous else {}
+    # Read before scanning, so changes made during the scan are picked by the next refresh
+    mtime_ns = os.stat(folder).st_mtime_ns
+    entries = {}
+    for entry in scan_images(folder):
+        st = entry.stat()
+        old = previous_entries.get(entry.name)
+        if old and old[_SIZE] == st.st_size and old[_MTIME] == st.st_mtime_ns:
+            entries[entry.name] = old
+            continue
+        width, height = image_size(entry.path)
+        digest = file_hash(entry.path) if content_hash else ''
+        entries[entry.name] = [st.st_size, st.st_mtime_ns, width, height, digest]
+    return {'mtime_ns': mtime_ns, 'entries': entries}
+
+
+def build_manifest(stereo_folder, content_hash=False, previous=None):
+    """ Builds (or incrementally refreshes) the manifest of a stereo folder
+
+    Only the image folders whose directory mtime changed since the previous manifest are scanned again, and
+    inside them only new or modified files are read. Note that the directory mtime changes when files are added,
+    removed or renamed, not when a file is rewritten in place; use previous=None to force a full refresh.
+
+    Parameters
+    ----------
+    stereo_folder: string
+        Root path of the stereo dataset.
+    content_hash (bool):
+        If True, stores a content hash of every image
+    previous (dict):
+        Previous manifest, used for the incremental refresh
+
+    Returns
+    -------
+    dict
+        Manifest
+    """
+    # Hashes can not be reused from a manifest built without them
+    if previous is not None and (previous.get('version') != MANIFEST_VERSION or
+                                 (content_hash and not previous.get('content_hash', False))):
+        previous = None
+
+    with os.scandir(stereo_folder) as it:
+        subfolders = sorted(entry.name for entry in it if entry.is_dir())
+    if not {'left', 'right'}.issubset(subfolders):
+        raise FileNotFoundError(f'{stereo_folder} does not contain the left and right folders')
+
+    folders = {}
+    for side in ['left', 'right']:
+        folder = os.path.join(stereo_folder, side)
+        old = previous['folders'][side] if previous else None
+        if old is not None and old['mtime_ns'] == os.stat(folder).st_mtime_ns:
+            folders[side] = old
+        else:
+            folders[side] = _scan_folder(folder, old, content_hash)
+
+    right_entries = folders['right']['entries']
+    pairs = sorted(name for name in folders['left']['entries'] if name in right_entries)
+    return {'version': MANIFEST_VERSION, 'content_hash': content_hash, 'subfolders': subfolders,
+            'folders': folders, 'pairs': pairs}
+
+
+def save_manifest(manifest, filename):
+    """ Writes a manifest as compact gzipped json """
+    with gzip.open(filename, 'wt', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+
+
+def load_manifest(filename):
+    """ Reads a manifest written by save_manifest """
+    with gzip.open(filename, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def is_stale(manifest, stereo_folder):
+    """ Checks if the left or right folder changed since the manifest was built (two stat calls) """
+    for side in ['left', 'right']:
+        if manifest['folders'][side]['mtime_ns'] != os.stat(os.path.join(stereo_folder, side)).st_mtime_ns:
+            return True
+    return False
+
+
+def manifest_pairs(manifest, stereo_folder):
+    """ Returns the stereo pairs paths and subfolders of a manifest, as get_list_of_stereo_images does
+
+    Parameters
+    ----------
+    manifest (dict):
+        Manifest
+    stereo_folder: string
+        Root path of the stereo dataset.
+
+    Returns
+    -------
+    list, list
+        List of stereo pairs paths, and subfolders (folder structure)
+    """
+    left_folder = os.path.join(stereo_folder, 'left')
+    right_folder = os.path.join(stereo_folder, 'right')
+    stereo_pairs = [(os.path.join(left_folder, name), os.path.join(right_folder, name)) for name in manifest['pairs']]
+    return stereo_pairs, manifest['subfolders']
+
+
+def load_stereo_pairs(stereo_folder, manifest_filename=None):
+    """ Lists the stereo pairs of a folder, using a manifest when it is given
+
+    A stale manifest is refreshed in memory (only the changed folders are scanned again).
+
+    Parameters
+    ----------
+    stereo_folder: string
+        Root path of the stereo dataset.
+    manifest_filename: string
+        Manifest path, if None the folder is listed from scratch
+
+    Returns
+    -------
+    list, list
+        List of stereo pairs paths, and subfolders (folder structure)
+    """
+    if manifest_filename is None:
+        return get_list_of_stereo_images(stereo_folder)
+    manifest = load_manifest(manifest_filename)
+    if is_stale(manifest, stereo_folder):
+        print(f'Manifest {manifest_filename} is outdated, refreshing it (run cvc-stereo index to update the file)')
+        manifest = build_manifest(stereo_folder, manifest.get('content_hash', False), manifest)
+    return manifest_pairs(manifest, stereo_folder)
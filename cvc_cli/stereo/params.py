@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+
+
+# Supported (intrinsic matrix, distortion) key pairs, in camera order
+_INTRINSICS_KEYS = [
+    [('M1', 'D1'), ('M2', 'D2')],                       # stereo intrinsics (intrinsics.yml, stereo_params.yml)
+    [('camera_matrix', 'distortion_coefficients')],     # OpenCV calibration sample output
+    [('intrinsics', 'dist')],                           # cvc-mono cal output
+]
+
+
+def load_intrinsics(filename):
+    """ Reads the camera intrinsics of a calibration file
+
+    Supported files are stereo intrinsics (M1/D1/M2/D2, like data/stereo/intrinsics.yml or stereo_params.yml),
+    OpenCV sample calibrations (camera_matrix/distortion_coefficients) and cvc-mono cal files (intrinsics/dist).
+
+    Parameters
+    ----------
+    filename (str):
+        Calibration file
+
+    Returns
+    -------
+    list
+        (intrinsic matrix, distortion coefficients) of each camera in the file
+    """
+    cv_file = cv2.FileStorage(filename, cv2.FILE_STORAGE_READ)
+    if not cv_file.isOpened():
+        raise ValueError(f'Can not read {filename}')
+    cameras = []
+    for keys in _INTRINSICS_KEYS:
+        for mtx_key, dist_key in keys:
+            mtx = cv_file.getNode(mtx_key).mat()
+            dist = cv_file.getNode(dist_key).mat()
+            if mtx is None or dist is None:
+                break
+            cameras.append((np.asarray(mtx, np.float64), np.asarray(dist, np.float64).reshape(1, -1)))
+        if cameras:
+            break
+    cv_file.release()
+    if not cameras:
+        raise ValueError(f'No camera intrinsics found in {filename}')
+    return cameras
+
+
+def save_stereo_params(filename, left_map, right_map, params):
+    """ Writes the stereo rectification maps and the parametric stereo calibration
+
+    Parameters
+    ----------
+    filename (str):
+        Output file, for example stereo_params.yml
+    left_map, right_map (tuple):
+        Rectification maps (map_x, map_y) of each camera
+    params (dict):
+        Parametric calibration (M1, D1, M2, D2, R, T, E, F, R1, R2, P1, P2, Q, image_size)
+    """
+    cv_file = cv2.FileStorage(filename, cv2.FILE_STORAGE_WRITE)
+    cv_file.write('left_stereo_map_x', left_map[0])
+    cv_file.write('left_stereo_map_y', left_map[1])
+    cv_file.write('right_stereo_map_x', right_map[0])
+    cv_file.write('right_stereo_map_y', right_map[1])
+    for key, value in params.items():
+        cv_file.write(key, value)
+    cv_file.release()
+
+
+def load_stereo_params(filename):
+    """ Reads the parametric stereo calibration written by save_stereo_params
+
+    Returns
+    -------
+    dict
+        M1, D1, M2, D2, R, T, E, F, R1, R2, P1, P2, Q and image_size (only the keys present in the file)
+    """
+    cv_file = cv2.FileStorage(filename, cv2.FILE_STORAGE_READ)
+    params = {}
+    for key in ['M1', 'D1', 'M2', 'D2', 'R', 'T', 'E', 'F', 'R1', 'R2', 'P1', 'P2', 'Q', 'image_size']:
+        value = cv_file.getNode(key).mat()
+        if value is not None:
+            params[key] = value
+    cv_file.release()
+    if 'image_size' in params:
+        params['image_size'] = tuple(int(v) for v in params['image_size'].ravel())
+    return params
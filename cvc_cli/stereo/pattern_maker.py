@@ -1,8 +1,12 @@
-from cv_cli.stereo.svgfig import SVG, canvas
+import cv2
+import numpy as np
+from cvc_cli.stereo.svgfig import SVG, canvas
+from cvc_cli.stereo.detection import aruco_dictionary, charuco_board, board_property
 
 
 class PatternMaker:
-    def __init__(self, cols, rows, output, units, square_size, radius_rate, page_width, page_height):
+    def __init__(self, cols, rows, output, units, square_size, radius_rate, page_width, page_height,
+                 marker_size=None, aruco_dict='DICT_5X5_100'):
         self.cols = cols
         self.rows = rows
         self.output = output
@@ -11,6 +15,8 @@ class PatternMaker:
         self.radius_rate = radius_rate
         self.width = page_width
         self.height = page_height
+        self.marker_size = marker_size
+        self.aruco_dict = aruco_dict
         self.g = SVG("g")  # the svg group container
 
     def make_circles_pattern(self):
@@ -50,6 +56,42 @@ class PatternMaker:
                                  height=spacing, fill="black", stroke="none")
                     self.g.append(square)
 
+    def make_charuco_pattern(self):
+        spacing = self.square_size
+        marker_size = self.marker_size or 0.75 * spacing
+        xspacing = (self.width - self.cols * spacing) / 2.0
+        yspacing = (self.height - self.rows * spacing) / 2.0
+        dictionary = aruco_dictionary(self.aruco_dict)
+        board = charuco_board((self.cols, self.rows), spacing, marker_size, self.aruco_dict)
+        board_height = self.rows * spacing
+
+        # The marker layout is taken from OpenCV, so it matches the detector of the installed version. Older
+        # versions use a y-up board frame (the 4th marker corner is above the 1st one)
+        marker_corners = [np.asarray(c, np.float64).reshape(4, 3) for c in board_property(board, 'objPoints')]
+        y_up = marker_corners[0][3, 1] < marker_corners[0][0, 1]
+        white_squares = set()
+        bits = dictionary.markerSize + 2
+        module = marker_size / bits
+        for marker_id, corners in zip(np.asarray(board_property(board, 'ids')).ravel(), marker_corners):
+            ys = board_height - corners[:, 1] if y_up else corners[:, 1]
+            x0, y0 = corners[:, 0].min(), ys.min()
+            white_squares.add((int((x0 + marker_size / 2) // spacing), int((y0 + marker_size / 2) // spacing)))
+            if hasattr(cv2.aruco, 'generateImageMarker'):
+                marker = cv2.aruco.generateImageMarker(dictionary, int(marker_id), bits)
+            else:
+                marker = cv2.aruco.drawMarker(dictionary, int(marker_id), bits)
+            for v, u in zip(*np.nonzero(marker < 128)):
+                cell = SVG("rect", x=x0 + u * module + xspacing, y=y0 + v * module + yspacing, width=module,
+                           height=module, fill="black", stroke="none")
+                self.g.append(cell)
+
+        for x in range(0, self.cols):
+            for y in range(0, self.rows):
+                if (x, y) not in white_squares:
+                    square = SVG("rect", x=x * spacing + xspacing, y=y * spacing + yspacing, width=spacing,
+                                 height=spacing, fill="black", stroke="none")
+                    self.g.append(square)
+
     def save(self):
         c = canvas(self.g, width="%d%s" % (self.width, self.units), height="%d%s" % (self.height, self.units),
                    viewBox="0 0 %d %d" % (self.width, self.height))
@@ -0,0 +1,83 @@
+import cv2
+from cvc_cli.stereo.batch import write_outputs
+from cvc_cli.stereo.depth import write_depth
+
+
+class DepthPipeline:
+    """ Fused rectification and matching of raw stereo pairs, in memory
+
+    The raw pair is remapped into one side-by-side buffer reused for all the pairs and matched right away, the
+    rectified images are never encoded and decoded again.
+
+    Example
+    -------
+    pipeline = DepthPipeline(StereoRectifier.from_file('stereo_params.yml'), DepthEstimator(rectifier.Q))
+    for left_rect, right_rect, disparity in pipeline.run(pairs):
+        depth = pipeline.estimator.depth(disparity)
+
+    Parameters
+    ----------
+    rectifier (StereoRectifier):
+        Rectification maps
+    estimator (DepthEstimator):
+        Matcher and calibration
+    """
+
+    def __init__(self, rectifier, estimator):
+        self.rectifier = rectifier
+        self.estimator = estimator
+        self.stack = None
+
+    def process(self, left_im, right_im):
+        """ Rectifies and matches a raw stereo pair (uint8, gray or BGR)
+
+        Returns
+        -------
+        np.array, np.array, np.array
+            Rectified left and right images (views of self.stack, only valid until the next pair) and the
+            disparity (see DepthEstimator.disparity)
+        """
+        self.stack, left_rect, right_rect = self.rectifier.rectify_stack(left_im, right_im, self.stack)
+        return left_rect, right_rect, self.estimator.disparity(left_rect, right_rect)
+
+    def run(self, pairs):
+        """ Processes an iterable of raw (left, right) frames, in order, yielding the results of process """
+        for left_im, right_im in pairs:
+            yield self.process(left_im, right_im)
+
+
+def write_pipeline_pair(pipeline, left_path, right_path, output_folder, outputs=(), preview=True, arrays=True,
+                        lines=9, line_color=(255, 0, 0), depth_writer=None):
+    """ Rectifies and matches a raw stereo pair from disk, and writes the depth and the selected rectified images
+
+    Parameters
+    ----------
+    pipeline (DepthPipeline):
+        Rectification and matching
+    left_path, right_path (str):
+        Paths of the raw stereo pair
+    output_folder (str):
+        Folder with the depth, depth_npy and output subfolders
+    outputs (list):
+        OutputSpec of the rectified images to write (see cvc_cli.stereo.batch), none by default
+    preview, arrays (bool):
+        Write the depth/ preview and the depth_npy/ array
+    lines, line_color:
+        Guide lines of the stack output
+    depth_writer (DepthWriter):
+        Depth sequence file the depth is appended to, if any
+
+    Returns
+    -------
+    dict
+        Counters [files, bytes, seconds] of each output
+    """
+    left_im = cv2.imread(left_path, cv2.IMREAD_GRAYSCALE)
+    right_im = cv2.imread(right_path, cv2.IMREAD_GRAYSCALE)
+    left_rect, right_rect, disparity = pipeline.process(left_im, right_im)
+
+    stats = write_depth(pipeline.estimator, disparity, left_path, output_folder, preview, arrays,
+                        depth_writer)
+    images = {'left': (left_path, left_rect), 'right': (right_path, right_rect), 'stack': (right_path, pipeline.stack)}
+    stats.update(write_outputs(images, outputs, output_folder, lines, line_color))
+    return stats
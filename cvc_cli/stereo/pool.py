@@ -0,0 +1,262 @@
+import cv2
+import multiprocessing
+import numpy as np
+from collections import deque
+from cvc_cli.stereo.batch import write_rectified_pair
+from cvc_cli.stereo.depth import DepthEstimator, write_depth_pair
+from cvc_cli.stereo.pipeline import DepthPipeline, write_pipeline_pair
+from cvc_cli.stereo.rectifier import StereoRectifier
+from cvc_cli.stereo.shared import SharedArrays
+
+
+# State of a worker process, set by _init_worker
+_worker = {}
+
+
+def share_maps(rectifier):
+    """ Copies the maps of a StereoRectifier into shared memory """
+    return SharedArrays.from_arrays({'left_x': rectifier.left_map[0], 'left_y': rectifier.left_map[1],
+                                     'right_x': rectifier.right_map[0], 'right_y': rectifier.right_map[1]})
+
+
+def attach_rectifier(maps_spec, interpolation):
+    """ StereoRectifier over the shared maps of share_maps, nothing is copied """
+    maps = SharedArrays.attach(maps_spec)
+    rectifier = StereoRectifier((maps['left_x'], maps['left_y']), (maps['right_x'], maps['right_y']),
+                                interpolation=interpolation)
+    return maps, rectifier
+
+
+def _init_worker(maps_spec, interpolation, slabs_spec=None, estimator_options=None):
+    # Parallelism comes from the processes, OpenCV threads would oversubscribe the CPUs
+    cv2.setNumThreads(1)
+    maps, rectifier = attach_rectifier(maps_spec, interpolation)
+    _worker['maps'] = maps
+    _worker['rectifier'] = rectifier
+    if slabs_spec is not None:
+        _worker['slabs'] = SharedArrays.attach(slabs_spec)
+    if estimator_options is not None:
+        _worker['pipeline'] = DepthPipeline(rectifier, DepthEstimator(**estimator_options))
+
+
+def _rectify_slab(index):
+    slabs = _worker['slabs']
+    inputs = slabs['inputs'][index]
+    outputs = slabs['outputs'][index]
+    _worker['rectifier'].rectify(inputs[0], inputs[1], outputs[0], outputs[1])
+    return index
+
+
+def _match_slab(index):
+    slabs = _worker['slabs']
+    inputs = slabs['inputs'][index]
+    outputs = slabs['outputs'][index]
+    left_rect, right_rect = _worker['rectifier'].rectify(inputs[0], inputs[1], outputs[0], outputs[1])
+    slabs['disparity'][index] = _worker['pipeline'].estimator.disparity(left_rect, right_rect)
+    return index
+
+
+def _rectify_files(task):
+    left_path, right_path, output_folder, outputs, options = task
+    _worker['buffers'], stats = write_rectified_pair(_worker['rectifier'], left_path, right_path, output_folder,
+                                                     outputs, _worker.get('buffers'), **options)
+    return stats
+
+
+def _pipeline_files(task):
+    left_path, right_path, output_folder, outputs, options = task
+    return write_pipeline_pair(_worker['pipeline'], left_path, right_path, output_folder, outputs, **options)
+
+
+def _init_depth_worker(estimator_options):
+    cv2.setNumThreads(1)
+    _worker['estimator'] = DepthEstimator(**estimator_options)
+
+
+def _depth_files(task):
+    left_path, right_path, output_folder, options = task
+    return write_depth_pair(_worker['estimator'], left_path, right_path, output_folder, **options)
+
+
+class RectifierPool:
+    """ Process pool for stereo rectification, with the maps and the frames in shared memory
+
+    The maps are copied once into shared memory and every worker remaps from the same pages, so memory does not
+    grow with the number of workers. In-memory frames (rectify_many) are exchanged through preallocated shared
+    slabs: only a slab index is pickled per pair. Batch jobs over files (write_many) only send the paths, the
+    workers decode, rectify and encode themselves.
+
+    Example
+    -------
+    with RectifierPool(StereoRectifier.from_file('stereo_params.yml'), (480, 640), workers=4) as pool:
+        for left_rect, right_rect in pool.rectify_many(pairs):
+            ...
+
+    Parameters
+    ----------
+    rectifier (StereoRectifier):
+        Rectification maps
+    frame_shape (tuple):
+        Shape of the uint8 input frames, (height, width) for gray or (height, width, 3) for BGR. Only needed
+        by rectify_many
+    workers (int):
+        Number of worker processes, the number of CPUs by default
+    slabs (int):
+        Number of pairs in flight, 2 per worker by default
+    estimator (DepthEstimator):
+        Matcher of the fused rectify and match methods (match_many, write_depth_many), rebuilt in the workers
+        from its options
+    """
+
+    def __init__(self, rectifier, frame_shape=None, workers=None, slabs=None, estimator=None):
+        workers = workers or multiprocessing.cpu_count()
+        self.maps = share_maps(rectifier)
+        self.slabs = None
+        slabs_spec = None
+        if frame_shape is not None:
+            width, height = rectifier.image_size
+            slabs = slabs or 2 * workers
+            shapes = {
+                'inputs': ((slabs, 2) + tuple(frame_shape), np.uint8),
+                'outputs': ((slabs, 2, height, width) + tuple(frame_shape[2:]), np.uint8),
+            }
+            if estimator is not None:
+                shapes['disparity'] = ((slabs, height, width), np.float32)
+            self.slabs = SharedArrays.create(shapes)
+            slabs_spec = self.slabs.spec
+        estimator_options = None if estimator is None else estimator.options
+        self.pool = multiprocessing.Pool(workers, _init_worker, (self.maps.spec, rectifier.interpolation, slabs_spec,
+                                                                 estimator_options))
+
+    def _check_slabs(self, name):
+        if self.slabs is None:
+            raise ValueError('RectifierPool needs frame_shape to process frames in memory')
+        if name not in self.slabs.arrays:
+            raise ValueError('RectifierPool needs an estimator to match frames')
+        return self.slabs[name]
+
+    def _run_slabs(self, pairs, function):
+        inputs = self.slabs['inputs']
+        free = deque(range(len(inputs)))
+        pending = deque()
+        for left_im, right_im in pairs:
+            if not free:
+                index = pending.popleft().get()
+                yield index
+                free.append(index)
+            index = free.popleft()
+            inputs[index, 0] = left_im
+            inputs[index, 1] = right_im
+            pending.append(self.pool.apply_async(function, (index,)))
+        while pending:
+            yield pending.popleft().get()
+
+    def rectify_many(self, pairs):
+        """ Rectifies an iterable of (left, right) frames, in order
+
+        Each pair is copied into a free input slab and rectified by a worker into the matching output slab.
+
+        Yields
+        ------
+        np.array, np.array
+            Rectified left and right images, views of an output slab that are only valid until the next pair is
+            requested (copy them to keep them)
+        """
+        outputs = self._check_slabs('outputs')
+        for index in self._run_slabs(pairs, _rectify_slab):
+            yield outputs[index, 0], outputs[index, 1]
+
+    def match_many(self, pairs):
+        """ Rectifies and matches an iterable of raw (left, right) frames, in order, as rectify_many
+
+        Yields
+        ------
+        np.array, np.array, np.array
+            Rectified left and right images and disparity (see DepthEstimator.disparity), views of the slabs that
+            are only valid until the next pair is requested
+        """
+        disparity = self._check_slabs('disparity')
+        outputs = self.slabs['outputs']
+        for index in self._run_slabs(pairs, _match_slab):
+            yield outputs[index, 0], outputs[index, 1], disparity[index]
+
+    def write_many(self, stereo_pairs, output_folder, outputs, chunksize=4, **options):
+        """ Rectifies the pairs of files and writes their outputs as cvc-stereo rect
+
+        options are the keyword arguments of write_rectified_pair (lines, line_color, color, gray)
+
+        Yields
+        ------
+        dict
+            Output counters of each written pair (see write_rectified_pair), in completion order
+        """
+        tasks = ((left_path, right_path, output_folder, outputs, options) for left_path, right_path in stereo_pairs)
+        yield from self.pool.imap_unordered(_rectify_files, tasks, chunksize)
+
+    def write_depth_many(self, stereo_pairs, output_folder, outputs=(), chunksize=4, **options):
+        """ Rectifies and matches raw pairs of files and writes their depth, and the selected rectified images
+
+        The pool needs an estimator. options are the keyword arguments of write_pipeline_pair (preview, arrays,
+        lines, line_color)
+
+        Yields
+        ------
+        dict
+            Output counters of each written pair, in completion order
+        """
+        tasks = ((left_path, right_path, output_folder, outputs, options) for left_path, right_path in stereo_pairs)
+        yield from self.pool.imap_unordered(_pipeline_files, tasks, chunksize)
+
+    def close(self):
+        """ Stops the workers and frees the shared memory """
+        self.pool.close()
+        self.pool.join()
+        self.maps.close()
+        if self.slabs is not None:
+            self.slabs.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DepthPool:
+    """ Process pool computing the depth of rectified pairs of files, each worker builds its own matcher
+
+    Parameters
+    ----------
+    estimator (DepthEstimator):
+        Matcher and calibration, rebuilt in the workers from its options
+    workers (int):
+        Number of worker processes, the number of CPUs by default
+    """
+
+    def __init__(self, estimator, workers=None):
+        workers = workers or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(workers, _init_depth_worker, (estimator.options,))
+
+    def write_many(self, stereo_pairs, output_folder, chunksize=4, **options):
+        """ Computes and writes the depth of the pairs of files as cvc-stereo depth
+
+        options are the keyword arguments of write_depth_pair (preview, arrays)
+
+        Yields
+        ------
+        dict
+            Output counters of each written pair (see write_depth_pair), in completion order
+        """
+        tasks = ((left_path, right_path, output_folder, options) for left_path, right_path in stereo_pairs)
+        yield from self.pool.imap_unordered(_depth_files, tasks, chunksize)
+
+    def close(self):
+        """ Stops the workers """
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,114 @@
+import cv2
+import threading
+import numpy as np
+from collections import OrderedDict
+
+
+def load_stacked_pair(left_path, right_path, max_width=1280):
+    """ Reads a stereo pair and stacks it side by side, downscaled to at most max_width pixels (0 keeps the size)
+
+    Each image is downscaled before stacking, so the full resolution stack is never built.
+    """
+    left_im = cv2.imread(left_path)
+    right_im = cv2.imread(right_path)
+    if left_im is None or right_im is None:
+        raise ValueError(f'Can not read the pair {left_path}, {right_path}')
+    scale = max_width / (left_im.shape[1] + right_im.shape[1]) if max_width else 1
+    if scale < 1:
+        left_im = cv2.resize(left_im, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        right_im = cv2.resize(right_im, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return np.hstack((left_im, right_im))
+
+
+class PairPrefetcher:
+    """ Decodes and downscales stereo pairs in a background thread, around the pair being viewed
+
+    The next and previous `ahead` pairs of the current position are loaded in advance (next ones first) into a
+    LRU cache, so stepping forwards or backwards does not wait for the decoder.
+
+    Example
+    -------
+    with PairPrefetcher(stereo_pairs, ahead=8) as pairs:
+        cv2.imshow('stereo_pair', pairs.get(0))
+
+    Parameters
+    ----------
+    stereo_pairs (list):
+        (left path, right path) of each pair
+    ahead (int):
+        Pairs loaded before and after the current one
+    max_width (int):
+        Width of the stacked pairs, see load_stacked_pair
+    """
+
+    def __init__(self, stereo_pairs, ahead=8, max_width=1280):
+        self.stereo_pairs = stereo_pairs
+        self.ahead = ahead
+        self.max_width = max_width
+        self.cache = OrderedDict()
+        self.position = 0
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _window(self):
+        """ Indices to keep around the position, in loading order """
+        indices = [self.position]
+        for offset in range(1, self.ahead + 1):
+            indices += [self.position + offset, self.position - offset]
+        return [index for index in indices if 0 <= index < len(self.stereo_pairs)]
+
+    def _next_missing(self):
+        for index in self._window():
+            if index not in self.cache:
+                return index
+        return None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and self._next_missing() is None:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                index = self._next_missing()
+            try:
+                pair = load_stacked_pair(*self.stereo_pairs[index], self.max_width)
+            except Exception as e:
+                # Raised by get in the viewer thread
+                pair = e
+            with self.condition:
+                self.cache[index] = pair
+                window = set(self._window())
+                for old in [old for old in self.cache if old not in window][:max(0, len(self.cache) - len(window))]:
+                    del self.cache[old]
+                self.condition.notify_all()
+
+    def get(self, index):
+        """ Stacked pair index, waits for it if it is not loaded yet. Moves the prefetch window around index """
+        if not 0 <= index < len(self.stereo_pairs):
+            raise IndexError(f'Pair {index} out of range')
+        with self.condition:
+            self.position = index
+            self.condition.notify_all()
+            while index not in self.cache:
+                self.condition.wait()
+            self.cache.move_to_end(index)
+            pair = self.cache[index]
+        if isinstance(pair, Exception):
+            raise pair
+        return pair
+
+    def close(self):
+        """ Stops the background thread """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
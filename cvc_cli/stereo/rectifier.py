@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+from cvc_cli.stereo.params import load_stereo_params, save_stereo_params
+
+
+class StereoRectifier:
+    """ Stereo rectification with the remap tables kept in memory
+
+    Example
+    -------
+    rectifier = StereoRectifier.from_file('stereo_params.yml')
+    left_rect, right_rect = rectifier.rectify(left_im, right_im)
+
+    Parameters
+    ----------
+    left_map, right_map (tuple):
+        Rectification maps (map_x, map_y) of each camera, as written by cvc-stereo cal
+    params (dict):
+        Parametric calibration (M1, D1, M2, D2, R, T, E, F, R1, R2, P1, P2, Q, image_size), may be empty
+    interpolation (int):
+        cv2.remap interpolation
+    """
+
+    def __init__(self, left_map, right_map, params=None, interpolation=cv2.INTER_LANCZOS4):
+        self.left_map = left_map
+        self.right_map = right_map
+        self.params = params or {}
+        self.interpolation = interpolation
+
+    @classmethod
+    def from_file(cls, filename, interpolation=cv2.INTER_LANCZOS4):
+        """ Loads the maps (and the parametric calibration, if any) of a stereo calibration file """
+        cv_file = cv2.FileStorage(filename, cv2.FILE_STORAGE_READ)
+        if not cv_file.isOpened():
+            raise ValueError(f'Can not read {filename}')
+        left_map = (cv_file.getNode('left_stereo_map_x').mat(), cv_file.getNode('left_stereo_map_y').mat())
+        right_map = (cv_file.getNode('right_stereo_map_x').mat(), cv_file.getNode('right_stereo_map_y').mat())
+        cv_file.release()
+        if left_map[0] is None or right_map[0] is None:
+            raise ValueError(f'No stereo rectification maps found in {filename}')
+        return cls(left_map, right_map, load_stereo_params(filename), interpolation)
+
+    def save(self, filename):
+        """ Writes the maps and the parametric calibration, readable by from_file and cvc-stereo rect """
+        save_stereo_params(filename, self.left_map, self.right_map, self.params)
+
+    @property
+    def image_size(self):
+        """ (width, height) of the rectified images """
+        return self.left_map[0].shape[1], self.left_map[0].shape[0]
+
+    @property
+    def Q(self):
+        """ Disparity-to-depth matrix, None if the file has no parametric calibration """
+        return self.params.get('Q')
+
+    def _remap(self, im, stereo_map, dst):
+        return cv2.remap(im, stereo_map[0], stereo_map[1], self.interpolation, dst=dst,
+                         borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+    def rectify_left(self, im, dst=None):
+        """ Rectifies a left image (gray or color), into dst if given """
+        return self._remap(im, self.left_map, dst)
+
+    def rectify_right(self, im, dst=None):
+        """ Rectifies a right image (gray or color), into dst if given """
+        return self._remap(im, self.right_map, dst)
+
+    def rectify(self, left_im, right_im, dst_left=None, dst_right=None):
+        """ Rectifies a stereo pair
+
+        dst_left and dst_right are optional preallocated outputs (image_size, same type as the inputs), which
+        avoids an allocation per frame in long running loops.
+
+        Returns
+        -------
+        np.array, np.array
+            Rectified left and right images
+        """
+        return self.rectify_left(left_im, dst_left), self.rectify_right(right_im, dst_right)
+
+    def rectify_stack(self, left_im, right_im, stack=None):
+        """ Rectifies a stereo pair directly into the halves of a side-by-side image
+
+        Parameters
+        ----------
+        left_im, right_im (np.array):
+            Stereo pair (gray or color)
+        stack (np.array):
+            Preallocated (height, 2 * width[, channels]) buffer of the inputs type, reuse it between pairs to
+            avoid any allocation. Allocated if None or if its shape does not match
+
+        Returns
+        -------
+        np.array, np.array, np.array
+            Stack, and its left and right halves (views, no copy)
+        """
+        width, height = self.image_size
+        shape = (height, 2 * width) + left_im.shape[2:]
+        if stack is None or stack.shape != shape or stack.dtype != left_im.dtype:
+            stack = np.empty(shape, left_im.dtype)
+        left_rect, right_rect = stack[:, :width], stack[:, width:]
+        self.rectify(left_im, right_im, left_rect, right_rect)
+        return stack, left_rect, right_rect
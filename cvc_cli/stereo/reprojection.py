@@ -0,0 +1,155 @@
+import cv2
+import numpy as np
+from collections import namedtuple
+
+
+ReprojectionError = namedtuple('ReprojectionError', ['residuals', 'view_index', 'per_point', 'per_view_rms',
+                                                     'rms', 'max'])
+ReprojectionError.__doc__ = """ Reprojection residuals of a calibration
+
+residuals: (N, 2) image residuals (detected - projected) of all the points of all the views
+view_index: (N,) view of each point
+per_point: (N,) euclidean error of each point in pixels
+per_view_rms: (V,) RMS error of each view in pixels
+rms: RMS error over all the points in pixels
+max: maximum point error in pixels
+"""
+
+
+def rodrigues(rvecs):
+    """ Vectorized cv2.Rodrigues, (V, 3) rotation vectors to (V, 3, 3) rotation matrices """
+    rvecs = np.asarray(rvecs, np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(rvecs, axis=1)
+    k = rvecs / np.where(theta > 1e-12, theta, 1)[:, None]
+    K = np.zeros((len(rvecs), 3, 3))
+    K[:, 0, 1], K[:, 0, 2], K[:, 1, 2] = -k[:, 2], k[:, 1], -k[:, 0]
+    K[:, 1, 0], K[:, 2, 0], K[:, 2, 1] = k[:, 2], -k[:, 1], k[:, 0]
+    s = np.sin(theta)[:, None, None]
+    c = (1 - np.cos(theta))[:, None, None]
+    return np.eye(3) + s * K + c * (K @ K)
+
+
+def project_points(obj_pts, rvecs, tvecs, mtx, dist, view_index=None):
+    """ Vectorized projection of the points of all the views (pinhole model with up to 12 distortion terms)
+
+    Parameters
+    ----------
+    obj_pts (np.array):
+        (N, 3) object points of all the views, concatenated
+    rvecs, tvecs (list):
+        Rotation and translation vectors of each view
+    mtx (np.array):
+        Intrinsic matrix
+    dist (np.array):
+        Distortion coefficients (k1, k2, p1, p2[, k3[, k4, k5, k6[, s1, s2, s3, s4]]])
+    view_index (np.array):
+        (N,) view of each point
+
+    Returns
+    -------
+    np.array
+        (N, 2) projected points
+    """
+    R = rodrigues(rvecs)[view_index]
+    t = np.asarray(tvecs, np.float64).reshape(-1, 3)[view_index]
+    X = np.einsum('nij,nj->ni', R, obj_pts) + t
+    x = X[:, 0] / X[:, 2]
+    y = X[:, 1] / X[:, 2]
+
+    d = np.zeros(12)
+    dist = np.asarray(dist, np.float64).ravel()
+    d[:min(len(dist), 12)] = dist[:12]
+    k1, k2, p1, p2, k3, k4, k5, k6, s1, s2, s3, s4 = d
+
+    r2 = x * x + y * y
+    r4 = r2 * r2
+    r6 = r4 * r2
+    radial = (1 + k1 * r2 + k2 * r4 + k3 * r6) / (1 + k4 * r2 + k5 * r4 + k6 * r6)
+    xd = x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x * x) + s1 * r2 + s2 * r4
+    yd = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * x * y + s3 * r2 + s4 * r4
+
+    # As cv2.projectPoints, the skew term mtx[0, 1] is ignored
+    u = mtx[0, 0] * xd + mtx[0, 2]
+    v = mtx[1, 1] * yd + mtx[1, 2]
+    return np.stack((u, v), axis=1)
+
+
+def project_points_fisheye(obj_pts, rvecs, tvecs, mtx, dist, view_index=None):
+    """ Vectorized projection of the points of all the views with the fisheye (equidistant) model of cv2.fisheye
+
+    Parameters are the same as project_points, with the distortion coefficients (k1, k2, k3, k4)
+    """
+    R = rodrigues(rvecs)[view_index]
+    t = np.asarray(tvecs, np.float64).reshape(-1, 3)[view_index]
+    X = np.einsum('nij,nj->ni', R, obj_pts) + t
+    x = X[:, 0] / X[:, 2]
+    y = X[:, 1] / X[:, 2]
+
+    k1, k2, k3, k4 = np.asarray(dist, np.float64).ravel()[:4]
+    r = np.sqrt(x * x + y * y)
+    theta = np.arctan(r)
+    theta2 = theta * theta
+    theta_d = theta * (1 + theta2 * (k1 + theta2 * (k2 + theta2 * (k3 + theta2 * k4))))
+    scale = np.where(r > 1e-8, theta_d / np.where(r > 1e-8, r, 1), 1)
+    xd = x * scale
+    yd = y * scale
+
+    # Unlike the pinhole model, the fisheye model keeps the skew (cv2.fisheye.calibrate stores alpha * fx)
+    u = mtx[0, 0] * xd + mtx[0, 1] * yd + mtx[0, 2]
+    v = mtx[1, 1] * yd + mtx[1, 2]
+    return np.stack((u, v), axis=1)
+
+
+def reprojection_errors(obj_pts, img_pts, rvecs, tvecs, mtx, dist, fisheye=False):
+    """ Reprojection residuals of all the views, computed in one pass
+
+    Views can have different number of points (partial patterns). The tilted sensor model (14 distortion
+    coefficients) is not vectorized and falls back to cv2.projectPoints per view.
+
+    Parameters
+    ----------
+    obj_pts (list):
+        Object points of each view
+    img_pts (list):
+        Detected image points of each view
+    rvecs, tvecs (list):
+        Rotation and translation vectors of each view
+    mtx (np.array):
+        Intrinsic matrix
+    dist (np.array):
+        Distortion coefficients
+    fisheye (bool):
+        True for the fisheye model (cv2.fisheye)
+
+    Returns
+    -------
+    ReprojectionError
+        Residuals, per point and per view errors, RMS and max error
+    """
+    counts = [np.asarray(p).reshape(-1, 3).shape[0] for p in obj_pts]
+    view_index = np.repeat(np.arange(len(counts)), counts)
+    detected = np.concatenate([np.asarray(p, np.float64).reshape(-1, 2) for p in img_pts])
+
+    if fisheye:
+        points = np.concatenate([np.asarray(p, np.float64).reshape(-1, 3) for p in obj_pts])
+        projected = project_points_fisheye(points, rvecs, tvecs, np.asarray(mtx, np.float64), dist, view_index)
+    elif np.asarray(dist).size > 12:
+        projected = np.concatenate([cv2.projectPoints(o, r, t, mtx, dist)[0].reshape(-1, 2)
+                                    for o, r, t in zip(obj_pts, rvecs, tvecs)])
+    else:
+        points = np.concatenate([np.asarray(p, np.float64).reshape(-1, 3) for p in obj_pts])
+        projected = project_points(points, rvecs, tvecs, np.asarray(mtx, np.float64), dist, view_index)
+
+    residuals = detected - projected
+    squared = (residuals ** 2).sum(axis=1)
+    per_view_rms = np.sqrt(np.bincount(view_index, squared) / np.asarray(counts))
+    per_point = np.sqrt(squared)
+    return ReprojectionError(residuals, view_index, per_point, per_view_rms, float(np.sqrt(squared.mean())),
+                             float(per_point.max()))
+
+
+def print_errors(errors, name=''):
+    """ Prints the summary of a ReprojectionError """
+    worst = int(np.argmax(errors.per_view_rms))
+    print(f'{name}reprojection RMS {errors.rms:.4f} px, max {errors.max:.4f} px, '
+          f'worst view {worst} ({errors.per_view_rms[worst]:.4f} px RMS)')
@@ -0,0 +1,150 @@
+import cv2
+import numpy as np
+
+
+def board_tilt(corners, obj_points):
+    """ Out-of-plane tilt of a planar pattern, from the homography between the board and its detected corners
+
+    The homography is linearized at the board center: its Jacobian maps board lengths (in the pattern units, so
+    the board aspect ratio does not matter) to image lengths, and the ratio of its singular values is the
+    foreshortening, about cos(tilt) for a tilted board. The direction is the image direction in which the board
+    recedes (the side that shrinks), given by the projective row of the homography.
+
+    Parameters
+    ----------
+    corners (np.array):
+        Detected corners, shape (N, 1, 2) or (N, 2)
+    obj_points (np.array):
+        Matching pattern points on the board plane (z = 0), shape (N, 3) or (N, 1, 3)
+
+    Returns
+    -------
+    float, float
+        Foreshortening 1 - s_min / s_max (0 for a fronto-parallel board) and its image direction in radians
+    """
+    img = np.asarray(corners, np.float64).reshape(-1, 2)
+    obj = np.asarray(obj_points, np.float64).reshape(-1, 3)[:, :2]
+    if len(obj) < 4:
+        return 0.0, 0.0
+    center = obj.mean(axis=0)
+    H, _ = cv2.findHomography(obj - center, img)
+    if H is None:
+        return 0.0, 0.0
+    H = H / H[2, 2]
+    # Jacobian of the homography at the board center (the center maps to H[:2, 2])
+    J = H[:2, :2] - np.outer(H[:2, 2], H[2, :2])
+    singular_values = np.linalg.svd(J, compute_uv=False)
+    foreshortening = 1 - singular_values[1] / max(singular_values[0], 1e-12)
+    # The projective scale grows along H[2, :2] in the board plane, so the board recedes along -J H[2, :2]
+    direction = -J @ H[2, :2]
+    return foreshortening, np.arctan2(direction[1], direction[0])
+
+
+def view_descriptor(corners, obj_points, image_size):
+    """ Describes the pose of a detected pattern from its image corners
+
+    The descriptor holds the normalized board position, its scale and its out-of-plane tilt (see board_tilt),
+    encoded with the image direction of the tilt.
+
+    Parameters
+    ----------
+    corners (np.array):
+        Detected corners, shape (N, 1, 2) or (N, 2)
+    obj_points (np.array):
+        Matching pattern points, shape (N, 3) or (N, 1, 3)
+    image_size (tuple):
+        (width, height) of the image
+
+    Returns
+    -------
+    np.array
+        [x, y, scale, tilt_cos, tilt_sin]
+    """
+    pts = np.asarray(corners, np.float64).reshape(-1, 2) / np.asarray(image_size, np.float64)
+    center = pts.mean(axis=0)
+    scale = np.sqrt(np.var(pts, axis=0).sum())
+    tilt, angle = board_tilt(corners, obj_points)
+    return np.array([center[0], center[1], scale, tilt * np.cos(angle), tilt * np.sin(angle)])
+
+
+def select_diverse_views(descriptors, max_views):
+    """ Greedy farthest point selection of views in descriptor space
+
+    The first view is the largest board (usually the best conditioned), then each step adds the view that is
+    farthest from the already selected ones. Views are never selected twice, so fewer than max_views are returned
+    when the remaining views duplicate the selected ones.
+
+    Parameters
+    ----------
+    descriptors (np.array):
+        View descriptors, shape (V, D). For stereo, left and right descriptors can be concatenated
+    max_views (int):
+        Number of views to select
+
+    Returns
+    -------
+    list
+        Sorted indices of the selected views
+    """
+    descriptors = np.asarray(descriptors, np.float64)
+    n_views = len(descriptors)
+    if max_views <= 0 or n_views <= max_views:
+        return list(range(n_views))
+
+    # The scale column of the (first) camera
+    selected = [int(np.argmax(descriptors[:, 2]))]
+    min_dist = np.linalg.norm(descriptors - descriptors[selected[0]], axis=1)
+    min_dist[selected[0]] = -np.inf
+    for _ in range(max_views - 1):
+        index = int(np.argmax(min_dist))
+        if min_dist[index] <= 0:
+            break
+        selected.append(index)
+        min_dist = np.minimum(min_dist, np.linalg.norm(descriptors - descriptors[index], axis=1))
+        min_dist[index] = -np.inf
+    return sorted(selected)
+
+
+def coverage(corners_list, image_size, grid=(8, 8)):
+    """ Fraction of the image covered by the detected corners
+
+    Parameters
+    ----------
+    corners_list (list):
+        Detected corners of each view
+    image_size (tuple):
+        (width, height) of the image
+    grid (tuple):
+        Number of cells (columns, rows) used to measure the coverage
+
+    Returns
+    -------
+    float
+        Fraction of grid cells that contain at least one corner
+    """
+    if len(corners_list) == 0:
+        return 0.0
+    pts = np.concatenate([np.asarray(c, np.float64).reshape(-1, 2) for c in corners_list])
+    cells = np.floor(pts / np.asarray(image_size, np.float64) * np.asarray(grid)).astype(int)
+    cells = np.clip(cells, 0, np.asarray(grid) - 1)
+    return len(np.unique(cells[:, 1] * grid[0] + cells[:, 0])) / float(grid[0] * grid[1])
+
+
+def report_selection(views_corners, selected, image_size):
+    """ Prints the coverage of the selected views compared with all the views
+
+    Parameters
+    ----------
+    views_corners (list):
+        For each camera, the list of detected corners of every view
+    selected (list):
+        Indices of the selected views
+    image_size (tuple):
+        (width, height) of the image
+    """
+    n_views = len(views_corners[0])
+    print(f'View selection: {len(selected)}/{n_views} views')
+    for camera, corners_list in enumerate(views_corners):
+        all_cov = coverage(corners_list, image_size)
+        sel_cov = coverage([corners_list[i] for i in selected], image_size)
+        print(f'  camera {camera}: image coverage {100 * sel_cov:.1f}% (all views {100 * all_cov:.1f}%)')
@@ -0,0 +1,222 @@
+import os
+import socket
+import socketserver
+import stat
+import struct
+import threading
+import time
+import numpy as np
+
+
+# Message header: height, width and channels of the (uint8) images, and a status (STATUS_OK) in the replies.
+# On connection, the server sends a header with the size of its maps (0 channels). A request is the header followed
+# by the left and right images, a reply the header followed by the rectified left and right images. Requests whose
+# size differs from the maps are answered with STATUS_ERROR and the connection is closed
+HEADER = struct.Struct('<IIII')
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+def recv_into(sock, buffer):
+    """ Receives exactly len(buffer) bytes into buffer (bytearray or contiguous np.array), without copies """
+    view = memoryview(buffer).cast('B')
+    received = 0
+    while received < len(view):
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError('Connection closed by the peer')
+        received += n
+
+
+def _remove_socket(path):
+    """ Removes the Unix socket at path, if any, raises FileExistsError if path is not a socket """
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f'{path} exists and is not a socket')
+    os.remove(path)
+
+
+def _pair_shape(height, width, channels):
+    """ Shape of a stacked (left, right) pair of uint8 images """
+    return (2, height, width) if channels == 1 else (2, height, width, channels)
+
+
+class _RectificationHandler(socketserver.BaseRequestHandler):
+    """ Serves the requests of one client connection
+
+    The input and output pairs are preallocated per connection and only reallocated when the number of channels
+    changes. Frames are received straight into the input buffer, rectified into the output buffer, and the
+    output buffer is sent as is.
+    """
+
+    def handle(self):
+        rectifier = self.server.rectifier
+        width, height = rectifier.image_size
+        header = bytearray(HEADER.size)
+        inputs = outputs = None
+        self.request.sendall(HEADER.pack(height, width, 0, STATUS_OK))
+        while True:
+            try:
+                recv_into(self.request, header)
+            except ConnectionError:
+                return
+            in_height, in_width, channels, _ = HEADER.unpack(header)
+            # The maps only apply to images of the calibrated size
+            if channels not in (1, 3) or (in_width, in_height) != (width, height):
+                self.request.sendall(HEADER.pack(0, 0, 0, STATUS_ERROR))
+                return
+            shape = _pair_shape(in_height, in_width, channels)
+            if inputs is None or inputs.shape != shape:
+                inputs = np.empty(shape, np.uint8)
+                outputs = np.empty(_pair_shape(height, width, channels), np.uint8)
+            try:
+                recv_into(self.request, inputs)
+            except ConnectionError:
+                return
+            rectifier.rectify(inputs[0], inputs[1], outputs[0], outputs[1])
+            self.request.sendall(HEADER.pack(height, width, channels, STATUS_OK))
+            self.request.sendall(outputs)
+
+
+class RectificationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ Unix socket server rectifying stereo pairs with maps loaded once (one thread per client)
+
+    Parameters
+    ----------
+    socket_path (str):
+        Path of the Unix socket, an existing socket file is replaced, any other file raises FileExistsError
+    rectifier (StereoRectifier):
+        Rectification maps
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, rectifier):
+        _remove_socket(socket_path)
+        self.rectifier = rectifier
+        super().__init__(socket_path, _RectificationHandler)
+
+    def server_close(self):
+        super().server_close()
+        _remove_socket(self.server_address)
+
+
+class RectificationClient:
+    """ Client of RectificationServer
+
+    image_size is the (width, height) of the server maps, announced by the server on connection.
+
+    Example
+    -------
+    with RectificationClient('/tmp/cvc-stereo.sock') as client:
+        left_rect, right_rect = client.rectify(left_im, right_im)
+    """
+
+    def __init__(self, socket_path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.header = bytearray(HEADER.size)
+        recv_into(self.sock, self.header)
+        height, width, _, _ = HEADER.unpack(self.header)
+        self.image_size = (width, height)
+
+    def rectify(self, left_im, right_im):
+        """ Rectifies a stereo pair of uint8 images (gray or BGR, same shape), of the size of the server maps
+
+        Raises ValueError, without sending them, if the images do not have the size of the maps.
+
+        Returns
+        -------
+        np.array, np.array
+            Rectified left and right images, views of a single received buffer
+        """
+        if left_im.shape != right_im.shape:
+            raise ValueError(f'The left {left_im.shape} and right {right_im.shape} images have different shapes')
+        height, width = left_im.shape[:2]
+        if (width, height) != self.image_size:
+            raise ValueError(f'Image size {(width, height)} does not match the server maps {self.image_size}')
+        channels = left_im.shape[2] if left_im.ndim == 3 else 1
+        self.sock.sendall(HEADER.pack(height, width, channels, 0))
+        self.sock.sendall(np.ascontiguousarray(left_im))
+        self.sock.sendall(np.ascontiguousarray(right_im))
+
+        recv_into(self.sock, self.header)
+        height, width, channels, status = HEADER.unpack(self.header)
+        if status != STATUS_OK:
+            raise ValueError('The server rejected the frame pair')
+        outputs = np.empty(_pair_shape(height, width, channels), np.uint8)
+        recv_into(self.sock, outputs)
+        return outputs[0], outputs[1]
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def benchmark_server(socket_path, pairs, requests=300, clients=1, rate=0):
+    """ Load generator, measures the round trip latency of the rectification server
+
+    Parameters
+    ----------
+    socket_path (str):
+        Path of the server Unix socket
+    pairs (list):
+        Decoded (left, right) images, sent in a loop
+    requests (int):
+        Number of requests of each client
+    clients (int):
+        Number of concurrent clients (one thread and one connection each)
+    rate (float):
+        Requests per second of each client, 0 sends them back to back
+
+    Returns
+    -------
+    np.array, float
+        Latency of every request in seconds, and the elapsed time
+    """
+    # Connecting in the calling thread raises the connection errors there, and the size errors before starting
+    connections = [RectificationClient(socket_path) for _ in range(clients)]
+    for left_im, _ in pairs:
+        if left_im.shape[1::-1] != connections[0].image_size:
+            for client in connections:
+                client.close()
+            raise ValueError(f'Image size {left_im.shape[1::-1]} does not match the server maps '
+                             f'{connections[0].image_size}')
+    latencies = [[] for _ in range(clients)]
+
+    def run(client, client_latencies):
+        period = 1 / rate if rate > 0 else 0
+        with client:
+            next_time = time.perf_counter()
+            for i in range(requests):
+                if period:
+                    time.sleep(max(0, next_time - time.perf_counter()))
+                    next_time += period
+                left_im, right_im = pairs[i % len(pairs)]
+                start = time.perf_counter()
+                client.rectify(left_im, right_im)
+                client_latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=run, args=(client, client_latencies))
+               for client, client_latencies in zip(connections, latencies)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return np.concatenate([np.asarray(client_latencies) for client_latencies in latencies]), elapsed
+
+
+def print_latencies(latencies, elapsed):
+    """ Prints the latency percentiles and the throughput of benchmark_server """
+    p50, p90, p99 = 1000 * np.percentile(latencies, [50, 90, 99])
+    print(f'{len(latencies)} pairs in {elapsed:.2f} s ({len(latencies) / elapsed:.1f} pairs/s)')
+    print(f'latency ms: p50 {p50:.2f}, p90 {p90:.2f}, p99 {p99:.2f}, max {1000 * latencies.max():.2f}')
@@ -0,0 +1,275 @@
+import cv2
+import time
+import numpy as np
+from collections import namedtuple
+from cvc_cli.stereo.reprojection import reprojection_errors
+
+
+CameraCalibration = namedtuple('CameraCalibration', ['ret', 'mtx', 'dist', 'rvecs', 'tvecs', 'errors'])
+
+
+def _fisheye_flag(name):
+    """ cv2.fisheye calibration flag, they live in cv2.fisheye up to OpenCV 4 and in cv2 since OpenCV 5 """
+    return getattr(cv2.fisheye, name, None) or getattr(cv2, name)
+
+
+# cv2.calibrateCamera flags of each distortion model, the fisheye model is solved with cv2.fisheye.calibrate
+DISTORTION_MODELS = {
+    'k1k2': cv2.CALIB_FIX_K3 | cv2.CALIB_ZERO_TANGENT_DIST,                        # k1, k2
+    'standard': 0,                                                                 # k1, k2, p1, p2, k3
+    'rational': cv2.CALIB_RATIONAL_MODEL,                                          # + k4, k5, k6
+    'thin-prism': cv2.CALIB_RATIONAL_MODEL | cv2.CALIB_THIN_PRISM_MODEL,           # + s1, s2, s3, s4
+    'tilted': cv2.CALIB_RATIONAL_MODEL | cv2.CALIB_THIN_PRISM_MODEL | cv2.CALIB_TILTED_MODEL,  # + taux, tauy
+    'fisheye': _fisheye_flag('CALIB_RECOMPUTE_EXTRINSIC') | _fisheye_flag('CALIB_FIX_SKEW'),  # equidistant k1..k4
+}
+
+# Number of distortion coefficients returned by OpenCV for each model ('k1k2' is returned as 'standard')
+_DISTORTION_SIZES = {4: 'fisheye', 5: 'standard', 8: 'rational', 12: 'thin-prism', 14: 'tilted'}
+_MODEL_SIZES = dict({model: size for size, model in _DISTORTION_SIZES.items()}, k1k2=5)
+
+
+def termination_criteria(max_iter=30, eps=0.001):
+    """ Termination criteria of the iterative solvers, stop after max_iter iterations or a change below eps """
+    return (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, max_iter, eps)
+
+
+def distortion_model(dist):
+    """ Distortion model of a distortion coefficients vector, from its size """
+    size = np.asarray(dist).size
+    if size not in _DISTORTION_SIZES:
+        raise ValueError(f'Unknown distortion model with {size} coefficients')
+    return _DISTORTION_SIZES[size]
+
+
+def check_init_distortion(dist, model):
+    """ Raises ValueError if the initial distortion coefficients can not be used with the distortion model
+
+    The fisheye model only takes its own 4 coefficients, the other models any of the pinhole models (missing
+    coefficients start at 0 and extra ones are dropped by OpenCV).
+    """
+    init_model = distortion_model(dist)
+    if (init_model == 'fisheye') != (model == 'fisheye'):
+        raise ValueError(f'The initial distortion has {np.asarray(dist).size} coefficients ({init_model} model), '
+                         f'it can not be used with the {model} model')
+
+
+def _solve_poses(obj_pts, img_pts, mtx, dist, model):
+    """ Pose of each view for fixed intrinsics (cv2.solvePnP) """
+    if model == 'fisheye':
+        # Fisheye points are undistorted to normalized coordinates and solved as an ideal pinhole camera
+        img_pts = [cv2.fisheye.undistortPoints(np.asarray(p, np.float64).reshape(-1, 1, 2), mtx, dist)
+                   for p in img_pts]
+        mtx, dist = np.eye(3), None
+    poses = [cv2.solvePnP(o, p, mtx, dist)[1:] for o, p in zip(obj_pts, img_pts)]
+    return [rvec for rvec, _ in poses], [tvec for _, tvec in poses]
+
+
+def calibrate_camera(obj_pts, img_pts, image_size, mtx=None, dist=None, flags=0, fix_intrinsics=False,
+                     model='standard', criteria=None):
+    """ cv2.calibrateCamera (cv2.fisheye.calibrate for the fisheye model) followed by the reprojection errors of
+    every view
+
+    If mtx and dist are given, they are used as initial guess (CALIB_USE_INTRINSIC_GUESS). With fix_intrinsics
+    they are kept as they are and only the pose of each view is estimated (cv2.solvePnP), which is much faster.
+    Raises ValueError if dist does not fit the model (see check_init_distortion).
+
+    Parameters
+    ----------
+    flags (int):
+        Solver flags added to the flags of the distortion model
+    model (str):
+        Distortion model, key of DISTORTION_MODELS
+    criteria (tuple):
+        Termination criteria of the solver (see termination_criteria), OpenCV default if None
+
+    Returns
+    -------
+    CameraCalibration
+        RMS error, intrinsics, distortion, extrinsics of each view and ReprojectionError
+    """
+    fisheye = model == 'fisheye'
+    if dist is not None:
+        check_init_distortion(dist, model)
+    if fix_intrinsics:
+        rvecs, tvecs = _solve_poses(obj_pts, img_pts, mtx, dist, model)
+        errors = reprojection_errors(obj_pts, img_pts, rvecs, tvecs, mtx, dist, fisheye)
+        return CameraCalibration(errors.rms, mtx, dist, rvecs, tvecs, errors)
+    flags |= DISTORTION_MODELS[model]
+    if mtx is not None:
+        flags |= _fisheye_flag('CALIB_USE_INTRINSIC_GUESS') if fisheye else cv2.CALIB_USE_INTRINSIC_GUESS
+        mtx = mtx.copy()
+        dist = dist.copy()
+    if fisheye:
+        # cv2.fisheye.calibrate only accepts (1, N, 3) and (1, N, 2) float64 points
+        fisheye_obj_pts = [np.asarray(o, np.float64).reshape(1, -1, 3) for o in obj_pts]
+        fisheye_img_pts = [np.asarray(p, np.float64).reshape(1, -1, 2) for p in img_pts]
+        mtx = np.zeros((3, 3)) if mtx is None else mtx
+        dist = np.zeros((1, 4)) if dist is None else dist.reshape(1, 4)
+        criteria = criteria or termination_criteria(100, np.finfo(np.float64).eps)   # cv2.fisheye default
+        ret, mtx, dist, rvecs, tvecs = cv2.fisheye.calibrate(fisheye_obj_pts, fisheye_img_pts, image_size, mtx, dist,
+                                                             flags=flags, criteria=criteria)
+    elif criteria is None:
+        ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(obj_pts, img_pts, image_size, mtx, dist, flags=flags)
+    else:
+        ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(obj_pts, img_pts, image_size, mtx, dist, flags=flags,
+                                                           criteria=criteria)
+    if not fisheye:
+        # OpenCV 5 pads the rational model with zeros up to 14 coefficients, which would read as the tilted model
+        dist = dist.reshape(1, -1)[:, :_MODEL_SIZES[model]]
+    errors = reprojection_errors(obj_pts, img_pts, rvecs, tvecs, mtx, dist, fisheye)
+    return CameraCalibration(ret, mtx, dist, rvecs, tvecs, errors)
+
+
+def calibrate_cameras(obj_pts, cameras_img_pts, image_size, reject_threshold=0, max_rounds=3, min_views=3,
+                      flags=0, init=None, fix_intrinsics=False, model='standard', criteria=None, timings=None,
+                      verbose=True):
+    """ Calibrates the cameras observing the same views, iteratively rejecting outlier views
+
+    After each solve, the views whose reprojection RMS is above reject_threshold in any camera are dropped
+    and the cameras are solved again, warm-started from the previous intrinsics, for at most max_rounds rounds.
+
+    Parameters
+    ----------
+    obj_pts (list):
+        Object points of each view
+    cameras_img_pts (list):
+        For each camera, the image points of each view (one camera for mono, two for stereo)
+    image_size (tuple):
+        (width, height) of the images
+    reject_threshold (float):
+        Maximum per view RMS error in pixels, 0 disables the rejection
+    max_rounds (int):
+        Maximum number of rejection rounds
+    min_views (int):
+        The rejection stops if less than min_views views would be kept
+    flags (int):
+        cv2.calibrateCamera flags
+    init (list):
+        Initial (intrinsic matrix, distortion) of each camera, used as initial guess
+    fix_intrinsics (bool):
+        Keep the initial intrinsics, only the views poses are estimated
+    model (str):
+        Distortion model, key of DISTORTION_MODELS
+    criteria (tuple):
+        Termination criteria of the solver, OpenCV default if None
+    timings (dict):
+        If given, the solve time of each camera (all the rounds) is added to it, in seconds
+    verbose (bool):
+        Print the views dropped by each rejection round
+
+    Returns
+    -------
+    list, list
+        Indices of the kept views, and the CameraCalibration of each camera
+    """
+    timings = {} if timings is None else timings
+
+    def solve(camera, view_obj_pts, img_pts, mtx, dist):
+        start = time.perf_counter()
+        result = calibrate_camera(view_obj_pts, img_pts, image_size, mtx, dist, flags, fix_intrinsics, model,
+                                  criteria)
+        key = f'camera {camera} solve'
+        timings[key] = timings.get(key, 0) + time.perf_counter() - start
+        return result
+
+    kept = list(range(len(obj_pts)))
+    init = init or [(None, None)] * len(cameras_img_pts)
+    results = [solve(camera, obj_pts, img_pts, mtx, dist)
+               for camera, (img_pts, (mtx, dist)) in enumerate(zip(cameras_img_pts, init))]
+    for round_index in range(max_rounds if reject_threshold > 0 else 0):
+        worst = np.max([result.errors.per_view_rms for result in results], axis=0)
+        bad = worst > reject_threshold
+        if not bad.any() or len(kept) - bad.sum() < min_views:
+            break
+        if verbose:
+            print(f'Rejection round {round_index + 1}: dropping {bad.sum()} views above {reject_threshold} px '
+                  f'(worst {worst.max():.3f} px)')
+        kept = [view for view, is_bad in zip(kept, bad) if not is_bad]
+        view_obj_pts = [obj_pts[i] for i in kept]
+        results = [solve(camera, view_obj_pts, [img_pts[i] for i in kept], result.mtx, result.dist)
+                   for camera, (img_pts, result) in enumerate(zip(cameras_img_pts, results))]
+    return kept, results
+
+
+def stereo_calibrate(obj_pts, img_ptsL, img_ptsR, mtxL, distL, mtxR, distR, image_size, model='standard',
+                     criteria=None):
+    """ Rotation and translation between two calibrated cameras (intrinsics are kept fixed)
+
+    The pinhole models use cv2.stereoCalibrate, the fisheye model cv2.fisheye.stereoCalibrate, for which the
+    essential and fundamental matrices are computed from R and T (F relates undistorted image points).
+
+    Parameters
+    ----------
+    obj_pts (list):
+        Object points of each view
+    img_ptsL, img_ptsR (list):
+        Image points of each view in the left and right cameras
+    mtxL, distL, mtxR, distR (np.array):
+        Intrinsic matrix and distortion of each camera
+    image_size (tuple):
+        (width, height) of the images
+    model (str):
+        Distortion model, key of DISTORTION_MODELS
+    criteria (tuple):
+        Termination criteria of the solver, 30 iterations or a change below 0.001 by default
+
+    Returns
+    -------
+    float, np.array, np.array, np.array, np.array
+        RMS error, R, T, E and F
+    """
+    criteria = termination_criteria() if criteria is None else criteria
+    if model != 'fisheye':
+        # The model flags keep the size of the distortion vectors, which would be truncated to 5 coefficients
+        flags = cv2.CALIB_FIX_INTRINSIC | DISTORTION_MODELS[model]
+        ret, _, _, _, _, R, T, E, F = cv2.stereoCalibrate(obj_pts, img_ptsL, img_ptsR, mtxL, distL, mtxR, distR,
+                                                          image_size, flags=flags, criteria=criteria)
+        return ret, R, T, E, F
+
+    flags = _fisheye_flag('CALIB_FIX_INTRINSIC') | DISTORTION_MODELS[model]
+    result = cv2.fisheye.stereoCalibrate([np.asarray(o, np.float64).reshape(1, -1, 3) for o in obj_pts],
+                                         [np.asarray(p, np.float64).reshape(1, -1, 2) for p in img_ptsL],
+                                         [np.asarray(p, np.float64).reshape(1, -1, 2) for p in img_ptsR],
+                                         mtxL, distL, mtxR, distR, image_size, flags=flags, criteria=criteria)
+    # Newer OpenCV versions also return the views poses
+    ret, R, T = result[0], result[5], np.asarray(result[6], np.float64).reshape(3, 1)
+    Tx = np.array([[0, -T[2, 0], T[1, 0]], [T[2, 0], 0, -T[0, 0]], [-T[1, 0], T[0, 0], 0]])
+    E = Tx @ R
+    F = np.linalg.inv(mtxR).T @ E @ np.linalg.inv(mtxL)
+    return ret, R, T, E, F / F[2, 2]
+
+
+def stereo_rectify(mtxL, distL, mtxR, distR, image_size, R, T, model='standard', rectify_scale=-1):
+    """ Rectification transforms and the remap tables of both cameras
+
+    Parameters
+    ----------
+    mtxL, distL, mtxR, distR (np.array):
+        Intrinsic matrix and distortion of each camera
+    image_size (tuple):
+        (width, height) of the images
+    R, T (np.array):
+        Rotation and translation between the cameras
+    model (str):
+        Distortion model, key of DISTORTION_MODELS
+    rectify_scale (float):
+        0 keeps only valid pixels, 1 keeps all the source pixels (alpha of cv2.stereoRectify, balance of
+        cv2.fisheye.stereoRectify). The default -1 lets OpenCV choose the scaling (balance 0 for fisheye), as
+        cvc-stereo cal has always done
+
+    Returns
+    -------
+    tuple, tuple, dict
+        Left (map_x, map_y) and right (map_x, map_y) CV_16SC2 maps, and R1, R2, P1, P2 and Q
+    """
+    if model == 'fisheye':
+        R1, R2, P1, P2, Q = cv2.fisheye.stereoRectify(mtxL, distL, mtxR, distR, image_size, R, T,
+                                                      cv2.CALIB_ZERO_DISPARITY, balance=max(rectify_scale, 0))
+        init_map = cv2.fisheye.initUndistortRectifyMap
+    else:
+        R1, R2, P1, P2, Q, _, _ = cv2.stereoRectify(mtxL, distL, mtxR, distR, image_size, R, T,
+                                                    alpha=rectify_scale, newImageSize=(0, 0))
+        init_map = cv2.initUndistortRectifyMap
+    left_map = init_map(mtxL, distL, R1, P1, image_size, cv2.CV_16SC2)
+    right_map = init_map(mtxR, distR, R2, P2, image_size, cv2.CV_16SC2)
+    return left_map, right_map, {'R1': R1, 'R2': R2, 'P1': P1, 'P2': P2, 'Q': Q}
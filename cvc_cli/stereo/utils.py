@@ -1,6 +1,57 @@
-import pathlib
 import os
-from glob import glob
+import random
+import re
+
+
+# Image file extensions understood by the listing helpers (matched case-insensitively)
+IMAGE_EXTENSIONS = frozenset(['.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.pgm', '.ppm', '.webp', '.exr'])
+
+_IMAGE_RE = re.compile('|'.join(re.escape(ext) + '$' for ext in sorted(IMAGE_EXTENSIONS)), re.IGNORECASE)
+
+
+def is_image_file(name):
+    """ Checks if a file name has one of the supported image extensions (case-insensitive)
+
+    Parameters
+    ----------
+    name: string
+        File name or path
+
+    Returns
+    -------
+    bool
+        True if the name ends with an image extension
+    """
+    return _IMAGE_RE.search(name) is not None
+
+
+def scan_images(image_folder, recursive=False):
+    """ Lazily yields the image entries of a folder
+
+    Entries are produced while the directory is being read, so callers can start working before the listing of
+    a very large folder completes. The order is the file system order, not sorted.
+
+    Parameters
+    ----------
+    image_folder: string
+        Folder that contains images.
+    recursive: bool
+        If True, sub folders are scanned too
+
+    Yields
+    ------
+    os.DirEntry
+        Image entries (use entry.path and entry.name, entry.stat() is cached)
+    """
+    pending = [image_folder]
+    while pending:
+        folder = pending.pop()
+        with os.scandir(folder) as it:
+            for entry in it:
+                if recursive and entry.is_dir():
+                    pending.append(entry.path)
+                elif is_image_file(entry.name) and entry.is_file():
+                    yield entry
 
 
 def get_list_of_stereo_images(stereo_folder):
@@ -49,35 +100,60 @@ def get_list_of_stereo_images(stereo_folder):
 
     """
     # Read folder structure
-    path = pathlib.Path(stereo_folder)
-    subfolders = [x.name for x in path.iterdir() if x.is_dir()]
+    with os.scandir(stereo_folder) as it:
+        subfolders = [entry.name for entry in it if entry.is_dir()]
     minimun_folders = ['left', 'right']
     if not set(minimun_folders).issubset(set(subfolders)):
         exit('The folders doesnt contain the minimum required folders {subfolders }(check documentation)')
 
     # Read stereo pairs
     stereo_pairs = []
-    left_folder = os.path.join(stereo_folder, 'left')
-    image_types = ['.png', '.jpg', 'jpeg', 'tiff', 'bmp']
-    left_list = [im_path for im_path in glob(f'{left_folder}/*.*') if pathlib.Path(im_path).suffix in image_types]
-    left_list = sorted(left_list)
+    left_list = sorted(entry.path for entry in scan_images(os.path.join(stereo_folder, 'left')))
+    right_names = set(entry.name for entry in scan_images(os.path.join(stereo_folder, 'right')))
     for left_im_path in left_list:
-        name = pathlib.Path(left_im_path).name
+        name = os.path.basename(left_im_path)
         right_im_path = os.path.join(stereo_folder, 'right', name)
-        if pathlib.Path(right_im_path).exists():
+        if name in right_names:
             stereo_pairs.append((left_im_path, right_im_path))
         else:
             print(f'Missing pair {right_im_path}')
     return stereo_pairs, subfolders
 
 
-def get_list_of_images(image_folder):
-    """ Reads images in a folder and returns a list of images paths.
+def iter_stereo_pairs(stereo_folder):
+    """ Lazily yields the stereo pairs of a stereo folder, in file system order.
+
+    Unlike get_list_of_stereo_images, pairs are produced while the left folder is being read, which is useful
+    to start streaming over recordings with a huge number of frames.
+
+    Parameters
+    ----------
+    stereo_folder: string
+        Root path of the stereo dataset (with left and right folders).
+
+    Yields
+    ------
+    tuple
+        (left image path, right image path)
+    """
+    right_folder = os.path.join(stereo_folder, 'right')
+    for entry in scan_images(os.path.join(stereo_folder, 'left')):
+        right_im_path = os.path.join(right_folder, entry.name)
+        if os.path.isfile(right_im_path):
+            yield entry.path, right_im_path
+        else:
+            print(f'Missing pair {right_im_path}')
+
+
+def get_list_of_images(image_folder, recursive=False):
+    """ Reads images in a folder and returns a sorted list of images paths.
 
     Parameters
     ----------
     image_folder: string
         Folder that contains images.
+    recursive: bool
+        If True, images in sub folders are included
 
     Returns
     -------
@@ -86,7 +162,54 @@ def get_list_of_images(image_folder):
 
     """
     # Read folder
-    path = pathlib.Path(image_folder)
-    image_types = ['.png', '.jpg', 'jpeg', 'tiff', 'bmp']
-    paths = [str(x.absolute()) for x in path.iterdir() if x.suffix in image_types]
+    paths = sorted(os.path.abspath(entry.path) for entry in scan_images(image_folder, recursive))
     return paths
+
+
+def subsample(items, max_frames=0, stride=1, seed=0):
+    """ Deterministic subsampling of a frame list
+
+    First every stride-th item is kept. Then, if there are more than max_frames items left, the list is split in
+    max_frames consecutive strata of (almost) equal length and one item is drawn from each stratum with a seeded
+    random generator, so the subset covers the whole recording and is reproducible.
+
+    Parameters
+    ----------
+    items (list):
+        Frames (image paths or stereo pairs)
+    max_frames (int):
+        Maximum number of frames to return, 0 keeps all of them
+    stride (int):
+        Keep one frame out of stride
+    seed (int):
+        Seed of the random generator
+
+    Returns
+    -------
+    list
+        Subset of items, in their original order
+    """
+    items = list(items)[::max(stride, 1)]
+    if max_frames <= 0 or len(items) <= max_frames:
+        return items
+    rng = random.Random(seed)
+    bounds = [i * len(items) // max_frames for i in range(max_frames + 1)]
+    return [items[rng.randrange(start, end)] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def print_timings(timings, title='Timing breakdown'):
+    """ Prints the time spent in each stage of a process
+
+    Parameters
+    ----------
+    timings (dict):
+        Seconds spent in each stage, in execution order
+    title (str):
+        First printed line
+    """
+    total = sum(timings.values())
+    print(title)
+    for name, seconds in timings.items():
+        share = 100 * seconds / total if total > 0 else 0
+        print(f'  {name:<24} {seconds:9.3f} s {share:6.1f}%')
+    print(f'  {"total":<24} {total:9.3f} s')
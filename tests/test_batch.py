@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+import pytest
+from cvc_cli.stereo.batch import OutputSpec, draw_epipolar_lines, parse_outputs, write_rectified_pair
+from cvc_cli.stereo.rectifier import StereoRectifier
+
+
+def test_parse_outputs():
+    assert parse_outputs('left:jpg, right:JPG:90,stack:.png:1') == [
+        OutputSpec('left', '.jpg', None), OutputSpec('right', '.jpg', 90), OutputSpec('stack', '.png', 1)]
+    assert parse_outputs('left,stack:png') == [OutputSpec('left', None, None), OutputSpec('stack', '.png', None)]
+
+
+@pytest.mark.parametrize('spec', [
+    'middle',
+    'left:png:1:2',
+    'left:xyz',
+    'left:bmp:5',
+    'left,left:png',
+    'left,right,right',
+    'left:png,right',
+    'left:png,right:jpg',
+    'left:png:10',
+    'left:jpg:101',
+    'left:webp:-1',
+    'left:jpg:high',
+])
+def test_parse_outputs_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_outputs(spec)
+
+
+def test_parse_outputs_quality_bounds():
+    assert parse_outputs('left:png:0,right:png:9') == [OutputSpec('left', '.png', 0), OutputSpec('right', '.png', 9)]
+    assert parse_outputs('left:jpeg:100,stack:webp:0')[0].quality == 100
+
+
+def test_draw_epipolar_lines():
+    stack = draw_epipolar_lines(np.zeros((100, 20, 3), np.uint8), lines=4, color=(1, 2, 3))
+    rows = np.flatnonzero(stack.any(axis=(1, 2)))
+    assert rows.tolist() == [20, 40, 60, 80]
+    assert np.all(stack[rows] == (1, 2, 3))
+    gray = draw_epipolar_lines(np.zeros((100, 20), np.uint8), lines=4, color=(7, 0, 0))
+    assert np.all(gray[20] == 7)
+
+
+def test_write_rectified_pair_gray_outputs(tmp_path):
+    x, y = np.meshgrid(np.arange(64, dtype=np.float32), np.arange(48, dtype=np.float32))
+    rectifier = StereoRectifier((x, y), (x, y))
+    left_im, right_im = np.random.default_rng(0).integers(0, 255, (2, 48, 64, 3), np.uint8)
+    cv2.imwrite(str(tmp_path / 'left.png'), left_im)
+    cv2.imwrite(str(tmp_path / 'right.png'), right_im)
+    outputs = parse_outputs('left,right,stack')
+    for name in ['left', 'right', 'stack', 'left_gray', 'right_gray', 'stack_gray']:
+        (tmp_path / 'output' / name).mkdir(parents=True)
+
+    _, stats = write_rectified_pair(rectifier, str(tmp_path / 'left.png'), str(tmp_path / 'right.png'),
+                                    str(tmp_path / 'output'), outputs, color=True, gray=True, lines=0)
+    assert [stats[name][0] for name in sorted(stats)] == [1] * 6
+    np.testing.assert_array_equal(cv2.imread(str(tmp_path / 'output' / 'left' / 'left.png'), cv2.IMREAD_UNCHANGED),
+                                  left_im)
+    left_gray = cv2.imread(str(tmp_path / 'output' / 'left_gray' / 'left.png'), cv2.IMREAD_UNCHANGED)
+    np.testing.assert_array_equal(left_gray, cv2.cvtColor(left_im, cv2.COLOR_BGR2GRAY))
+    stack_gray = cv2.imread(str(tmp_path / 'output' / 'stack_gray' / 'right.png'), cv2.IMREAD_UNCHANGED)
+    assert stack_gray.shape == (48, 128)
+
+    with pytest.raises(ValueError):
+        write_rectified_pair(rectifier, str(tmp_path / 'left.png'), str(tmp_path / 'right.png'),
+                             str(tmp_path / 'output'), outputs, gray=True)
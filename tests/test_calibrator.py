@@ -0,0 +1,37 @@
+import os
+import numpy as np
+from cvc_cli import Calibrator
+from cvc_cli.stereo.params import load_intrinsics
+from cvc_cli.stereo.utils import get_list_of_images, get_list_of_stereo_images
+
+
+STEREO_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'data', 'stereo')
+
+
+def test_calibrator_is_quiet_by_default(capsys):
+    images = get_list_of_images(os.path.join(STEREO_FOLDER, 'left'))[:6]
+    rectifier = Calibrator('checkerboard', (9, 6), 25).calibrate_mono(images)
+    assert rectifier.mtx.shape == (3, 3)
+    captured = capsys.readouterr()
+    assert captured.out == '' and captured.err == ''
+
+
+def test_calibrator_verbose(capsys):
+    stereo_pairs, _ = get_list_of_stereo_images(STEREO_FOLDER)
+    Calibrator('checkerboard', (9, 6), 25, verbose=True).calibrate_stereo(stereo_pairs[:6])
+    captured = capsys.readouterr()
+    assert 'From a total of 6 image pairs' in captured.out
+    assert '6/6' in captured.err
+
+
+def test_recalibration_keeps_the_intrinsics():
+    stereo_pairs, _ = get_list_of_stereo_images(STEREO_FOLDER)
+    cameras = load_intrinsics(os.path.join(STEREO_FOLDER, 'intrinsics.yml'))
+    calibrator = Calibrator('checkerboard', (9, 6), 25)
+    rectifier = calibrator.calibrate_stereo(stereo_pairs[:6], init_intrinsics=cameras, fix_intrinsics=True)
+    for (mtx, dist), mtx_key, dist_key in zip(cameras, ['M1', 'M2'], ['D1', 'D2']):
+        np.testing.assert_array_equal(rectifier.params[mtx_key], mtx)
+        np.testing.assert_array_equal(rectifier.params[dist_key], dist)
+    # The extrinsics are estimated, the baseline is along x
+    T = rectifier.params['T'].ravel()
+    assert abs(T[0]) > 5 * np.abs(T[1:]).max()
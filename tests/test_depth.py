@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from cvc_cli.stereo.depth import DepthEstimator
+
+
+Q = np.array([[1, 0, 0, -320], [0, 1, 0, -240], [0, 0, 0, 500], [0, 0, 12.5, 0]], np.float64)
+
+
+@pytest.mark.parametrize('options', [
+    {'matcher': 'census'},
+    {'num_disparities': 40},
+    {'block_size': 4},
+    {'matcher': 'bm', 'block_size': 3},
+    {'scale': 0},
+    {'tile_height': -1},
+    {'tile_overlap': -1},
+])
+def test_invalid_options(options):
+    with pytest.raises(ValueError):
+        DepthEstimator(Q, **options)
+
+
+def test_depth_from_disparity():
+    disparity = np.array([[-1, 0, 4, 8]], np.float32)
+    depth = DepthEstimator(Q).depth(disparity)
+    np.testing.assert_allclose(depth, [[0, 0, 500 / (12.5 * 4), 500 / (12.5 * 8)]])
+    assert depth.dtype == np.float32
+
+
+def test_tiles_match_the_whole_image():
+    rng = np.random.default_rng(0)
+    right = rng.integers(0, 255, (48, 96), np.uint8)
+    left = np.roll(right, 6, axis=1)
+    whole = DepthEstimator(Q, num_disparities=16).disparity(left, right)
+    # With an overlap larger than the image, every band is matched with the whole image as context
+    tiled = DepthEstimator(Q, num_disparities=16, tile_height=10, tile_overlap=48).disparity(left, right)
+    np.testing.assert_array_equal(tiled, whole)
+    assert np.median(whole[:, 30:]) == 6
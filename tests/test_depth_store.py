@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from cvc_cli.stereo.depth_store import DepthReader, DepthWriter
+
+
+def depth_maps(n_frames=7, shape=(12, 16)):
+    rng = np.random.default_rng(0)
+    maps = rng.uniform(0.5, 20, (n_frames,) + shape).astype(np.float32)
+    maps[:, :2] = 0
+    return maps
+
+
+@pytest.mark.parametrize('compression', ['zlib', 'lz4', 'none'])
+@pytest.mark.parametrize('dtype, atol', [('uint16', 0.0005), ('float16', 0.01), ('float32', 0)])
+def test_round_trip(tmp_path, dtype, atol, compression):
+    if compression == 'lz4':
+        pytest.importorskip('lz4')
+    maps = depth_maps()
+    filename = str(tmp_path / 'depth.cvcd')
+    with DepthWriter(filename, dtype, compression, chunk_frames=3) as writer:
+        for i, depth in enumerate(maps):
+            writer.append(depth, f'frame_{i}')
+    with DepthReader(filename) as reader:
+        assert len(reader) == len(maps)
+        assert reader.shape == maps.shape[1:]
+        np.testing.assert_allclose(np.stack(list(reader)), maps, atol=atol, rtol=1e-3 if dtype == 'float16' else 0)
+        # Random access across chunks, by index and by name
+        for index in [6, 0, 4, -1]:
+            np.testing.assert_allclose(reader[index], maps[index], atol=atol, rtol=1e-3 if dtype == 'float16' else 0)
+        np.testing.assert_array_equal(reader.frame('frame_5'), reader[5])
+        assert not reader[3][:2].any()
+        with pytest.raises(IndexError):
+            reader[7]
+        with pytest.raises(KeyError):
+            reader.frame('frame_7')
+
+
+def test_uint16_stores_out_of_range_depth_as_unknown(tmp_path):
+    filename = str(tmp_path / 'depth.cvcd')
+    with DepthWriter(filename, scale=0.01) as writer:
+        writer.append(np.array([[1000, 655.35, 1.234, -1, np.nan, np.inf]], np.float32))
+    with DepthReader(filename) as reader:
+        np.testing.assert_allclose(reader[0], [[0, 655.35, 1.23, 0, 0, 0]], atol=1e-4)
+
+
+def test_shape_mismatch(tmp_path):
+    with DepthWriter(str(tmp_path / 'depth.cvcd')) as writer:
+        writer.append(np.zeros((4, 4), np.float32))
+        with pytest.raises(ValueError):
+            writer.append(np.zeros((4, 5), np.float32))
+
+
+def test_incomplete_file(tmp_path):
+    filename = str(tmp_path / 'depth.cvcd')
+    writer = DepthWriter(filename, chunk_frames=2)
+    for depth in depth_maps(3):
+        writer.append(depth)
+    writer.file.flush()
+    with pytest.raises(ValueError):
+        DepthReader(filename)
+    writer.close()
+    with DepthReader(filename) as reader:
+        assert len(reader) == 3
+
+    (tmp_path / 'empty.cvcd').write_bytes(b'CVCDEPTH')
+    with pytest.raises(ValueError):
+        DepthReader(str(tmp_path / 'empty.cvcd'))
+    (tmp_path / 'other.cvcd').write_bytes(b'\x93NUMPY' + bytes(100))
+    with pytest.raises(ValueError):
+        DepthReader(str(tmp_path / 'other.cvcd'))
+
+
+def test_invalid_options(tmp_path):
+    with pytest.raises(ValueError):
+        DepthWriter(str(tmp_path / 'depth.cvcd'), dtype='int8')
+    with pytest.raises(ValueError):
+        DepthWriter(str(tmp_path / 'depth.cvcd'), compression='gzip')
+    for chunk_frames in [0, -1]:
+        with pytest.raises(ValueError):
+            DepthWriter(str(tmp_path / 'depth.cvcd'), chunk_frames=chunk_frames)
@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+import pytest
+from cvc_cli.stereo.detection import CalibrationPattern, aruco_dictionary, match_ids
+
+
+def chessboard_image(squares=(10, 7), square=40, border=40):
+    board = np.indices((squares[1], squares[0])).sum(axis=0) % 2 * 255
+    board = np.kron(board, np.ones((square, square))).astype(np.uint8)
+    return cv2.copyMakeBorder(board, border, border, border, border, cv2.BORDER_CONSTANT, value=255)
+
+
+@pytest.mark.parametrize('precheck', ['fast', 'check'])
+def test_precheck_rejects_blank_images_and_passes_boards(precheck):
+    pattern = CalibrationPattern('checkerboard', (9, 6), 25, precheck=precheck)
+    assert not pattern.passes_precheck(np.full((480, 640), 128, np.uint8))
+    assert pattern.passes_precheck(chessboard_image())
+
+
+def test_detection_after_precheck():
+    pattern = CalibrationPattern('checkerboard', (9, 6), 25, precheck='fast')
+    found, corners, ids = pattern.detect(chessboard_image())
+    assert found and corners.reshape(-1, 2).shape == (54, 2) and ids is None
+
+
+def test_sb_detector_matches_the_classic_one():
+    im = chessboard_image()
+    pattern = CalibrationPattern('checkerboard', (9, 6), 25, detector='sb')
+    found, classic, _ = CalibrationPattern('checkerboard', (9, 6), 25).detect(im)
+    found_sb, sb, ids = pattern.detect(im)
+    assert found and found_sb and ids is None
+    # Same corners, in the same or the reversed order (this board is symmetric under a 180 degrees rotation)
+    classic, sb = classic.reshape(-1, 2), sb.reshape(-1, 2)
+    assert min(np.abs(sb - classic).max(), np.abs(sb[::-1] - classic).max()) < 0.5
+    assert not pattern.detect(np.full((480, 640), 128, np.uint8))[0]
+
+
+def test_precheck_is_skipped_for_other_patterns():
+    pattern = CalibrationPattern('circles', (4, 11), 20, precheck='fast')
+    assert pattern.passes_precheck(np.zeros((100, 100), np.uint8))
+
+
+def circles_image(pattern, spacing=40, radius=10, border=60):
+    """ Fronto-parallel image of a circle grid, spacing pixels between the circles """
+    centers = border + pattern.object_points().reshape(-1, 3)[:, :2] / (pattern.pattern_size / 1000) * spacing
+    width, height = (centers.max(axis=0) + border).astype(int)
+    im = np.full((height, width), 255, np.uint8)
+    for x, y in centers:
+        cv2.circle(im, (int(round(x)), int(round(y))), radius, 0, -1, cv2.LINE_AA)
+    return im
+
+
+@pytest.mark.parametrize('pattern_type, pattern_shape', [('circles', (7, 5)), ('acircles', (4, 11))])
+def test_circle_grids(pattern_type, pattern_shape):
+    pattern = CalibrationPattern(pattern_type, pattern_shape, 20)
+    objp = pattern.object_points().reshape(-1, 3)
+    assert len(objp) == pattern_shape[0] * pattern_shape[1]
+    if pattern_type == 'acircles':
+        # Odd rows are shifted by one spacing, the rows are one spacing apart and the columns two
+        np.testing.assert_allclose(objp[:6], [[0, 0, 0], [0.04, 0, 0], [0.08, 0, 0], [0.12, 0, 0],
+                                              [0.02, 0.02, 0], [0.06, 0.02, 0]], atol=1e-7)
+    found, centers, ids = pattern.detect(circles_image(pattern))
+    assert found and ids is None
+    # The detected centers are in the order of the object points
+    design = np.c_[objp[:, :2], np.ones(len(objp))]
+    solution = np.linalg.lstsq(design, centers.reshape(-1, 2), rcond=None)[0]
+    assert np.abs(design @ solution - centers.reshape(-1, 2)).max() < 0.1
+
+
+def charuco_image(pattern, size=(700, 500)):
+    if hasattr(pattern.board, 'generateImage'):
+        return pattern.board.generateImage(size, marginSize=20)
+    return pattern.board.draw(size, marginSize=20)
+
+
+def test_unknown_aruco_dictionary():
+    with pytest.raises(ValueError, match='DICT_5X5_100'):
+        aruco_dictionary('DICT_FOO')
+
+
+def test_partial_charuco_detection():
+    pattern = CalibrationPattern('charuco', (7, 5), 40)
+    im = charuco_image(pattern)
+    found, corners, ids = pattern.detect(im)
+    assert found and len(ids) == 24
+    # Hiding the right half of the board keeps the corners of the visible markers
+    im[:, im.shape[1] // 2:] = 255
+    found, corners, ids = pattern.detect(im)
+    assert found and pattern.min_charuco_corners <= len(ids) < 24
+    # The corners of a fronto-parallel board are an affine transform of their object points
+    objp = pattern.object_points(ids).reshape(-1, 3)
+    design = np.c_[objp[:, :2], np.ones(len(objp))]
+    solution = np.linalg.lstsq(design, corners.reshape(-1, 2), rcond=None)[0]
+    assert np.abs(design @ solution - corners.reshape(-1, 2)).max() < 1
+    # Too few corners is not a detection
+    im[:, im.shape[1] // 4:] = 255
+    assert pattern.detect(im) == (False, None, None)
+
+
+def test_match_ids():
+    corners_left = np.arange(8, dtype=np.float32).reshape(4, 1, 2)
+    corners_right = 10 + np.arange(6, dtype=np.float32).reshape(3, 1, 2)
+    left, right, ids = match_ids(corners_left, np.array([[3], [1], [7], [5]]), corners_right,
+                                 np.array([[5], [2], [3]]))
+    np.testing.assert_array_equal(ids, [[3], [5]])
+    np.testing.assert_array_equal(left, corners_left[[0, 3]])
+    np.testing.assert_array_equal(right, corners_right[[2, 0]])
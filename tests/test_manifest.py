@@ -0,0 +1,73 @@
+import cv2
+import os
+import numpy as np
+import pytest
+from cvc_cli.stereo.manifest import build_manifest, image_size, is_stale, load_manifest, load_stereo_pairs, \
+    save_manifest
+
+
+def write_image(path, width=40, height=30, params=()):
+    cv2.imwrite(str(path), np.random.default_rng(0).integers(0, 255, (height, width, 3), np.uint8), list(params))
+
+
+@pytest.mark.parametrize('name, params', [
+    ('im.png', ()),
+    ('im.jpg', ()),
+    ('progressive.jpg', (cv2.IMWRITE_JPEG_PROGRESSIVE, 1)),
+    ('im.bmp', ()),
+])
+def test_image_size_from_headers(tmp_path, name, params):
+    write_image(tmp_path / name, 37, 21, params)
+    assert image_size(str(tmp_path / name)) == (37, 21)
+
+
+def test_image_size_of_unreadable_images(tmp_path):
+    (tmp_path / 'empty.png').write_bytes(b'')
+    (tmp_path / 'truncated.jpg').write_bytes(b'\xff\xd8\xff\xe0\x00')
+    assert image_size(str(tmp_path / 'empty.png')) == (0, 0)
+    assert image_size(str(tmp_path / 'truncated.jpg')) == (0, 0)
+
+
+def make_dataset(root, names):
+    for side in ['left', 'right']:
+        (root / side).mkdir(exist_ok=True)
+        for name in names:
+            write_image(root / side / name)
+
+
+def test_manifest_pairs_and_round_trip(tmp_path):
+    make_dataset(tmp_path, ['0.png', '1.png'])
+    write_image(tmp_path / 'left' / 'only_left.png')
+    manifest = build_manifest(str(tmp_path), content_hash=True)
+    assert manifest['pairs'] == ['0.png', '1.png']
+    entry = manifest['folders']['left']['entries']['0.png']
+    assert entry[2:4] == [40, 30] and len(entry[4]) == 32
+
+    save_manifest(manifest, str(tmp_path / 'manifest.json.gz'))
+    assert load_manifest(str(tmp_path / 'manifest.json.gz')) == manifest
+
+
+def test_manifest_refresh(tmp_path):
+    make_dataset(tmp_path, ['0.png'])
+    manifest = build_manifest(str(tmp_path))
+    save_manifest(manifest, str(tmp_path / 'manifest.json.gz'))
+    assert not is_stale(manifest, str(tmp_path))
+
+    make_dataset(tmp_path, ['1.png'])
+    # Some file systems have a coarse directory mtime
+    for side in ['left', 'right']:
+        os.utime(tmp_path / side, ns=(0, manifest['folders'][side]['mtime_ns'] + 1))
+    assert is_stale(manifest, str(tmp_path))
+    refreshed = build_manifest(str(tmp_path), previous=manifest)
+    assert refreshed['pairs'] == ['0.png', '1.png']
+    assert refreshed['folders']['left']['entries']['0.png'] is manifest['folders']['left']['entries']['0.png']
+
+    stereo_pairs, subfolders = load_stereo_pairs(str(tmp_path), str(tmp_path / 'manifest.json.gz'))
+    assert [os.path.basename(left) for left, _ in stereo_pairs] == ['0.png', '1.png']
+    assert subfolders == ['left', 'right']
+
+
+def test_manifest_needs_left_and_right(tmp_path):
+    (tmp_path / 'left').mkdir()
+    with pytest.raises(FileNotFoundError):
+        build_manifest(str(tmp_path))
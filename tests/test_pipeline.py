@@ -0,0 +1,59 @@
+import cv2
+import numpy as np
+from cvc_cli.stereo.batch import parse_outputs
+from cvc_cli.stereo.depth import DepthEstimator
+from cvc_cli.stereo.depth_store import DepthReader, DepthWriter
+from cvc_cli.stereo.pipeline import DepthPipeline, write_pipeline_pair
+from cvc_cli.stereo.rectifier import StereoRectifier
+
+
+Q = np.array([[1, 0, 0, -48], [0, 1, 0, -24], [0, 0, 0, 500], [0, 0, 12.5, 0]], np.float64)
+
+
+def shifted_pairs(n_pairs=3, shape=(48, 96), shift=6):
+    rng = np.random.default_rng(0)
+    for _ in range(n_pairs):
+        right = rng.integers(0, 255, shape, np.uint8)
+        yield np.roll(right, shift, axis=1), right
+
+
+def make_pipeline():
+    x, y = np.meshgrid(np.arange(96, dtype=np.float32), np.arange(48, dtype=np.float32))
+    # The left map shifts the raw left image one pixel to the right, the right map keeps the image
+    return DepthPipeline(StereoRectifier((x - 1, y), (x, y)), DepthEstimator(Q, num_disparities=16))
+
+
+def test_pipeline_matches_the_rectified_pairs():
+    pipeline = make_pipeline()
+    stacks = set()
+    for (left_im, right_im), (left_rect, right_rect, disparity) in zip(shifted_pairs(), pipeline.run(shifted_pairs())):
+        expected_left, expected_right = pipeline.rectifier.rectify(left_im, right_im)
+        np.testing.assert_array_equal(left_rect, expected_left)
+        np.testing.assert_array_equal(right_rect, expected_right)
+        np.testing.assert_array_equal(disparity, pipeline.estimator.disparity(expected_left, expected_right))
+        # The rectified left image is shifted by one more pixel
+        assert np.median(disparity[:, 30:]) == 7
+        assert np.shares_memory(left_rect, pipeline.stack) and np.shares_memory(right_rect, pipeline.stack)
+        stacks.add(id(pipeline.stack))
+    # One side-by-side buffer for all the pairs
+    assert len(stacks) == 1
+
+
+def test_write_pipeline_pair(tmp_path):
+    pipeline = make_pipeline()
+    left_im, right_im = next(shifted_pairs(1))
+    cv2.imwrite(str(tmp_path / 'left.png'), left_im)
+    cv2.imwrite(str(tmp_path / 'right.png'), right_im)
+    for name in ['depth', 'depth_npy', 'left']:
+        (tmp_path / 'output' / name).mkdir(parents=True)
+
+    with DepthWriter(str(tmp_path / 'depth.cvcd'), 'float32') as writer:
+        stats = write_pipeline_pair(pipeline, str(tmp_path / 'left.png'), str(tmp_path / 'right.png'),
+                                    str(tmp_path / 'output'), parse_outputs('left'), depth_writer=writer)
+    assert sorted(stats) == ['depth', 'depth_npy', 'left']
+    depth = np.load(tmp_path / 'output' / 'depth_npy' / 'left.npy')
+    np.testing.assert_allclose(np.median(depth[:, 30:]), 500 / (12.5 * 7))
+    with DepthReader(str(tmp_path / 'depth.cvcd')) as reader:
+        np.testing.assert_array_equal(reader.frame('left'), depth)
+    left_rect = cv2.imread(str(tmp_path / 'output' / 'left' / 'left.png'), cv2.IMREAD_UNCHANGED)
+    np.testing.assert_array_equal(left_rect, pipeline.rectifier.rectify(left_im, right_im)[0])
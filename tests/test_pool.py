@@ -0,0 +1,17 @@
+import numpy as np
+from cvc_cli.stereo.pool import RectifierPool
+from cvc_cli.stereo.rectifier import StereoRectifier
+
+
+def test_rectify_many_matches_the_rectifier():
+    x, y = np.meshgrid(np.arange(64, dtype=np.float32), np.arange(48, dtype=np.float32))
+    rectifier = StereoRectifier((x * 0.9 + 3, y), (x, y * 0.95 + 1))
+    rng = np.random.default_rng(0)
+    pairs = [tuple(rng.integers(0, 255, (2, 48, 64), np.uint8)) for _ in range(7)]
+    with RectifierPool(rectifier, (48, 64), workers=2, slabs=3) as pool:
+        results = [(left.copy(), right.copy()) for left, right in pool.rectify_many(pairs)]
+    assert len(results) == len(pairs)
+    for (left_im, right_im), (left_rect, right_rect) in zip(pairs, results):
+        expected_left, expected_right = rectifier.rectify(left_im, right_im)
+        np.testing.assert_array_equal(left_rect, expected_left)
+        np.testing.assert_array_equal(right_rect, expected_right)
@@ -0,0 +1,105 @@
+import cv2
+import threading
+import numpy as np
+import pytest
+from cvc_cli.stereo import prefetch
+from cvc_cli.stereo.prefetch import PairPrefetcher, load_stacked_pair
+
+
+STEREO_PAIRS = [(f'left/{i}.png', f'right/{i}.png') for i in range(10)]
+
+
+class LoadLog(list):
+    def __init__(self):
+        super().__init__()
+        self.loading_6 = threading.Event()
+        self.release_6 = threading.Event()
+        self.release_6.set()
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """ Replaces the decoder, records the loaded pair indices. Pair 7 can not be read, and the loading of pair 6
+    sets loads.loading_6 then waits for loads.release_6 """
+    loaded = LoadLog()
+
+    def load(left_path, right_path, max_width):
+        index = int(left_path.split('/')[1].split('.')[0])
+        loaded.append(index)
+        if index == 6:
+            loaded.loading_6.set()
+            assert loaded.release_6.wait(5)
+        if index == 7:
+            raise ValueError(f'Can not read the pair {left_path}, {right_path}')
+        return np.full((1, 2), index)
+
+    monkeypatch.setattr(prefetch, 'load_stacked_pair', load)
+    return loaded
+
+
+def settle(pairs):
+    """ Waits until the whole window around the current position is loaded """
+    with pairs.condition:
+        assert pairs.condition.wait_for(lambda: pairs._next_missing() is None, timeout=5)
+        return set(pairs.cache)
+
+
+def test_window_and_eviction(loads):
+    with PairPrefetcher(STEREO_PAIRS, ahead=2) as pairs:
+        assert pairs.get(0)[0, 0] == 0
+        assert settle(pairs) == {0, 1, 2}
+        assert pairs.get(4)[0, 0] == 4
+        # The pairs out of the window are evicted
+        assert settle(pairs) == {2, 3, 4, 5, 6}
+    assert sorted(loads) == [0, 1, 2, 3, 4, 5, 6]
+
+
+def test_lru_eviction(loads):
+    with PairPrefetcher(STEREO_PAIRS, ahead=1) as pairs:
+        pairs.get(1)
+        assert settle(pairs) == {0, 1, 2}
+        # Viewing 0 again (its window is loaded) makes 1 the least recently used pair, 0 the most recent one
+        pairs.get(0)
+        loads.release_6.clear()
+        pairs.get(5)
+        # The loader is blocked on pair 6, 1 was evicted to make room for 5 (without viewing 0 again, 0 would be)
+        assert loads.loading_6.wait(5)
+        with pairs.condition:
+            assert set(pairs.cache) == {0, 2, 5}
+        loads.release_6.set()
+        assert settle(pairs) == {4, 5, 6}
+
+
+def test_stepping_backwards(loads):
+    with PairPrefetcher(STEREO_PAIRS, ahead=2) as pairs:
+        pairs.get(5)
+        assert settle(pairs) == {3, 4, 5, 6, 7}
+        cached = pairs.cache[4]
+        loads.clear()
+        # The previous pairs were loaded in advance, they are not decoded again
+        assert pairs.get(4) is cached
+        assert pairs.get(3)[0, 0] == 3
+        assert settle(pairs) == {1, 2, 3, 4, 5}
+    assert sorted(loads) == [1, 2]
+
+
+def test_loader_errors_are_raised_by_get(loads):
+    with PairPrefetcher(STEREO_PAIRS, ahead=1) as pairs:
+        with pytest.raises(ValueError, match='Can not read the pair left/7.png'):
+            pairs.get(7)
+        # The loader thread keeps working after the error
+        assert pairs.get(8)[0, 0] == 8
+        with pytest.raises(IndexError):
+            pairs.get(10)
+    assert not pairs.thread.is_alive()
+
+
+def test_load_stacked_pair(tmp_path):
+    cv2.imwrite(str(tmp_path / 'left.png'), np.zeros((80, 100, 3), np.uint8))
+    cv2.imwrite(str(tmp_path / 'right.png'), np.full((80, 100, 3), 255, np.uint8))
+    stack = load_stacked_pair(str(tmp_path / 'left.png'), str(tmp_path / 'right.png'), max_width=100)
+    assert stack.shape == (40, 100, 3)
+    assert not stack[:, :50].any() and np.all(stack[:, 50:] == 255)
+    assert load_stacked_pair(str(tmp_path / 'left.png'), str(tmp_path / 'right.png'), 0).shape == (80, 200, 3)
+    with pytest.raises(ValueError):
+        load_stacked_pair(str(tmp_path / 'left.png'), str(tmp_path / 'missing.png'))
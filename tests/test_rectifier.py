@@ -0,0 +1,40 @@
+import numpy as np
+from cvc_cli.stereo.rectifier import StereoRectifier
+
+
+WIDTH, HEIGHT = 64, 48
+
+
+def shift_rectifier():
+    x, y = np.meshgrid(np.arange(WIDTH, dtype=np.float32), np.arange(HEIGHT, dtype=np.float32))
+    # The right map shifts the image one pixel to the left
+    return StereoRectifier((x, y), (x + 1, y))
+
+
+def test_rectify_stack_color():
+    rectifier = shift_rectifier()
+    left_im, right_im = np.random.default_rng(0).integers(0, 255, (2, HEIGHT, WIDTH, 3), np.uint8)
+    stack, left_rect, right_rect = rectifier.rectify_stack(left_im, right_im)
+    assert stack.shape == (HEIGHT, 2 * WIDTH, 3)
+    np.testing.assert_array_equal(stack[:, :WIDTH], left_im)
+    np.testing.assert_array_equal(stack[:, WIDTH:-1], right_im[:, 1:])
+    assert np.shares_memory(left_rect, stack) and np.shares_memory(right_rect, stack)
+
+
+def test_rectify_stack_reuses_the_buffer():
+    rectifier = shift_rectifier()
+    rng = np.random.default_rng(1)
+    buffer = np.zeros((HEIGHT, 2 * WIDTH), np.uint8)
+    for _ in range(3):
+        left_im, right_im = rng.integers(0, 255, (2, HEIGHT, WIDTH), np.uint8)
+        stack, left_rect, right_rect = rectifier.rectify_stack(left_im, right_im, buffer)
+        # Written in place into the caller's buffer, the halves are views of it
+        assert stack is buffer
+        assert left_rect.base is buffer and right_rect.base is buffer
+        np.testing.assert_array_equal(buffer[:, :WIDTH], left_im)
+        np.testing.assert_array_equal(buffer[:, WIDTH:-1], right_im[:, 1:])
+    # A buffer of another shape or type is replaced
+    stack, _, _ = rectifier.rectify_stack(left_im, right_im, np.zeros((HEIGHT, WIDTH), np.uint8))
+    assert stack.shape == (HEIGHT, 2 * WIDTH)
+    stack, _, _ = rectifier.rectify_stack(left_im, right_im, buffer.astype(np.float32))
+    assert stack.dtype == np.uint8
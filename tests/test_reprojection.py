@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+import pytest
+from cvc_cli.stereo.reprojection import project_points, project_points_fisheye, reprojection_errors, rodrigues
+
+
+MTX = np.array([[520.0, 0, 318.0], [0, 515.0, 242.0], [0, 0, 1]])
+RNG = np.random.default_rng(0)
+
+
+def views(n_views=4, n_points=30):
+    obj_pts = [np.c_[RNG.uniform(-0.1, 0.1, (n_points, 2)), np.zeros(n_points)] for _ in range(n_views)]
+    rvecs = [RNG.uniform(-0.4, 0.4, 3) for _ in range(n_views)]
+    tvecs = [np.r_[RNG.uniform(-0.05, 0.05, 2), RNG.uniform(0.4, 0.8)] for _ in range(n_views)]
+    return obj_pts, rvecs, tvecs
+
+
+def test_rodrigues_matches_opencv():
+    rvecs = RNG.uniform(-2, 2, (5, 3))
+    rvecs[0] = 0
+    for rvec, R in zip(rvecs, rodrigues(rvecs)):
+        np.testing.assert_allclose(R, cv2.Rodrigues(rvec)[0], atol=1e-12)
+
+
+@pytest.mark.parametrize('dist', [
+    [-0.2, 0.05, 0.001, -0.002, 0.01],
+    [-0.2, 0.05, 0.001, -0.002, 0.01, 0.03, -0.01, 0.002],
+    [-0.2, 0.05, 0.001, -0.002, 0.01, 0.03, -0.01, 0.002, 0.001, -0.0005, 0.0007, 0.0002],
+])
+def test_project_points_matches_opencv(dist):
+    dist = np.array(dist)
+    obj_pts, rvecs, tvecs = views()
+    view_index = np.repeat(np.arange(len(obj_pts)), [len(o) for o in obj_pts])
+    projected = project_points(np.concatenate(obj_pts), rvecs, tvecs, MTX, dist, view_index)
+    expected = np.concatenate([cv2.projectPoints(o, r, t, MTX, dist)[0].reshape(-1, 2)
+                               for o, r, t in zip(obj_pts, rvecs, tvecs)])
+    np.testing.assert_allclose(projected, expected, atol=1e-6)
+
+
+def test_project_points_fisheye_matches_opencv():
+    dist = np.array([0.05, -0.01, 0.003, -0.001])
+    obj_pts, rvecs, tvecs = views()
+    view_index = np.repeat(np.arange(len(obj_pts)), [len(o) for o in obj_pts])
+    projected = project_points_fisheye(np.concatenate(obj_pts), rvecs, tvecs, MTX, dist, view_index)
+    expected = np.concatenate([cv2.fisheye.projectPoints(o.reshape(1, -1, 3), r, t, MTX, dist)[0].reshape(-1, 2)
+                               for o, r, t in zip(obj_pts, rvecs, tvecs)])
+    np.testing.assert_allclose(projected, expected, atol=1e-6)
+
+
+def test_reprojection_errors_of_partial_views():
+    dist = np.array([-0.1, 0.01, 0, 0, 0])
+    obj_pts, rvecs, tvecs = views()
+    obj_pts[1] = obj_pts[1][:10]
+    img_pts = [cv2.projectPoints(o, r, t, MTX, dist)[0] for o, r, t in zip(obj_pts, rvecs, tvecs)]
+    img_pts[2] = img_pts[2] + np.array([3.0, 4.0])
+
+    errors = reprojection_errors(obj_pts, img_pts, rvecs, tvecs, MTX, dist)
+    np.testing.assert_allclose(errors.per_view_rms, [0, 0, 5, 0], atol=1e-6)
+    assert errors.max == pytest.approx(5, abs=1e-6)
+    assert errors.rms == pytest.approx(np.sqrt(25 * 30 / (30 + 10 + 30 + 30)), abs=1e-6)
+    assert len(errors.residuals) == len(errors.view_index) == 100
@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+import pytest
+from cvc_cli.stereo.selection import board_tilt, select_diverse_views, view_descriptor
+
+
+K = np.array([[500, 0, 320], [0, 500, 240], [0, 0, 1]], np.float64)
+
+
+def board(shape=(9, 6), size=0.025):
+    obj = np.zeros((shape[0] * shape[1], 3))
+    obj[:, :2] = np.mgrid[0:shape[0], 0:shape[1]].T.reshape(-1, 2) * size
+    return obj
+
+
+def project(obj, tilt_deg, roll_deg=0, axis=0):
+    rvec = np.zeros(3)
+    rvec[axis] = np.radians(tilt_deg)
+    R = cv2.Rodrigues(np.array([0, 0, np.radians(roll_deg)]))[0] @ cv2.Rodrigues(rvec)[0]
+    img, _ = cv2.projectPoints(obj - obj.mean(axis=0), cv2.Rodrigues(R)[0], np.array([0, 0, 0.5]), K, None)
+    return img
+
+
+@pytest.mark.parametrize('roll', [0, 30, 90])
+def test_fronto_parallel_board_has_no_tilt(roll):
+    obj = board()
+    tilt, _ = board_tilt(project(obj, 0, roll), obj)
+    assert tilt == pytest.approx(0, abs=1e-6)
+
+
+@pytest.mark.parametrize('shape', [(9, 6), (4, 11)])
+@pytest.mark.parametrize('deg', [20, 45])
+def test_tilt_is_foreshortening_whatever_the_board_aspect(shape, deg):
+    obj = board(shape)
+    tilt, _ = board_tilt(project(obj, deg, roll_deg=25, axis=1), obj)
+    assert tilt == pytest.approx(1 - np.cos(np.radians(deg)), abs=0.01)
+
+
+def test_opposite_tilts_have_opposite_directions():
+    obj = board()
+    _, a = board_tilt(project(obj, 30, axis=1), obj)
+    _, b = board_tilt(project(obj, -30, axis=1), obj)
+    assert abs(np.cos(a - b) + 1) < 1e-3
+
+
+def test_selection_prefers_different_tilts():
+    obj = board()
+    views = [project(obj, 0) for _ in range(5)] + [project(obj, 40, axis=1)]
+    descriptors = [view_descriptor(img, obj, (640, 480)) for img in views]
+    assert 5 in select_diverse_views(descriptors, 2)
+
+
+def test_selection_never_repeats_views():
+    descriptors = np.zeros((8, 5))
+    descriptors[6] = [0.5, 0.5, 0.1, 0, 0]
+    selected = select_diverse_views(descriptors, 4)
+    assert len(selected) == len(set(selected)) == 2
+    assert 6 in selected
+
+    # Each group of duplicated views contributes a single view
+    descriptors = np.repeat(np.random.default_rng(0).uniform(size=(3, 5)), 3, axis=0)
+    selected = select_diverse_views(descriptors, 5)
+    assert len(selected) == len(set(selected)) == 3
+    assert sorted(set(np.asarray(selected) // 3)) == [0, 1, 2]
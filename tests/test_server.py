@@ -0,0 +1,81 @@
+import socket
+import threading
+import numpy as np
+import pytest
+from cvc_cli.stereo.rectifier import StereoRectifier
+from cvc_cli.stereo.server import HEADER, STATUS_ERROR, STATUS_OK, RectificationClient, RectificationServer, \
+    recv_into
+
+
+WIDTH, HEIGHT = 64, 48
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    x, y = np.meshgrid(np.arange(WIDTH, dtype=np.float32), np.arange(HEIGHT, dtype=np.float32))
+    # The right map shifts the image one pixel to the left
+    rectifier = StereoRectifier((x, y), (x + 1, y))
+    path = str(tmp_path / 'cvc-stereo.sock')
+    server = RectificationServer(path, rectifier)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_rectify(socket_path):
+    rng = np.random.default_rng(0)
+    with RectificationClient(socket_path) as client:
+        assert client.image_size == (WIDTH, HEIGHT)
+        for shape in [(HEIGHT, WIDTH), (HEIGHT, WIDTH, 3)]:
+            left_im, right_im = rng.integers(0, 255, (2,) + shape, np.uint8)
+            left_rect, right_rect = client.rectify(left_im, right_im)
+            np.testing.assert_array_equal(left_rect, left_im)
+            np.testing.assert_array_equal(right_rect[:, :-1], right_im[:, 1:])
+
+
+def test_client_rejects_other_sizes(socket_path):
+    im = np.zeros((HEIGHT, WIDTH), np.uint8)
+    with RectificationClient(socket_path) as client:
+        with pytest.raises(ValueError):
+            client.rectify(np.zeros((HEIGHT, WIDTH + 1), np.uint8), np.zeros((HEIGHT, WIDTH + 1), np.uint8))
+        with pytest.raises(ValueError):
+            client.rectify(im, np.zeros((HEIGHT, WIDTH, 3), np.uint8))
+        # Nothing was sent, the connection is still usable
+        client.rectify(im, im)
+
+
+@pytest.mark.parametrize('height, width, channels', [(HEIGHT, WIDTH + 1, 1), (HEIGHT - 1, WIDTH, 3),
+                                                     (HEIGHT, WIDTH, 2)])
+def test_server_rejects_other_sizes(socket_path, height, width, channels):
+    header = bytearray(HEADER.size)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        recv_into(sock, header)
+        assert HEADER.unpack(header) == (HEIGHT, WIDTH, 0, STATUS_OK)
+        sock.sendall(HEADER.pack(height, width, channels, 0))
+        recv_into(sock, header)
+        assert HEADER.unpack(header)[3] == STATUS_ERROR
+        assert sock.recv(1) == b''
+
+
+def test_server_keeps_other_files(tmp_path):
+    x, y = np.meshgrid(np.arange(WIDTH, dtype=np.float32), np.arange(HEIGHT, dtype=np.float32))
+    path = tmp_path / 'cvc-stereo.sock'
+    path.write_text('not a socket')
+    with pytest.raises(FileExistsError):
+        RectificationServer(str(path), StereoRectifier((x, y), (x, y)))
+    assert path.read_text() == 'not a socket'
+
+
+def test_server_handles_closed_connections(socket_path):
+    # A client disconnecting in the middle of a request does not break the server
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        recv_into(sock, bytearray(HEADER.size))
+        sock.sendall(HEADER.pack(HEIGHT, WIDTH, 1, 0))
+        sock.sendall(bytes(WIDTH))
+    im = np.zeros((HEIGHT, WIDTH), np.uint8)
+    with RectificationClient(socket_path) as client:
+        client.rectify(im, im)
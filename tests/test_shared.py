@@ -0,0 +1,54 @@
+import multiprocessing
+import numpy as np
+import pytest
+from cvc_cli.stereo.shared import SharedArrays
+
+
+def _fill(spec, value):
+    arrays = SharedArrays.attach(spec)
+    arrays['frames'][:] = value
+    arrays.close()
+
+
+def test_create_layout():
+    arrays = SharedArrays.create({'a': ((3,), np.uint8), 'b': ((2, 5), np.float32), 'c': ((4, 4, 3), np.uint8)})
+    try:
+        assert arrays['b'].shape == (2, 5) and arrays['b'].dtype == np.float32
+        assert [offset % 64 for _, _, _, offset in arrays.layout] == [0, 0, 0]
+        arrays['a'][:] = 255
+        arrays['c'][:] = 7
+        assert not arrays['b'].any()
+        assert np.all(arrays['a'] == 255)
+    finally:
+        arrays.close()
+
+
+def test_from_arrays_copies():
+    source = {'x': np.arange(12, dtype=np.int16).reshape(3, 4), 'y': np.ones((2, 2))}
+    arrays = SharedArrays.from_arrays(source)
+    try:
+        for name, array in source.items():
+            np.testing.assert_array_equal(arrays[name], array)
+            assert arrays[name].dtype == array.dtype
+    finally:
+        arrays.close()
+
+
+def test_other_process_writes_are_visible():
+    arrays = SharedArrays.create({'frames': ((2, 8, 8), np.uint8)})
+    try:
+        process = multiprocessing.Process(target=_fill, args=(arrays.spec, 42))
+        process.start()
+        process.join()
+        assert process.exitcode == 0
+        assert np.all(arrays['frames'] == 42)
+    finally:
+        arrays.close()
+
+
+def test_close_frees_the_block():
+    arrays = SharedArrays.create({'frames': ((4,), np.uint8)})
+    spec = arrays.spec
+    arrays.close()
+    with pytest.raises(FileNotFoundError):
+        SharedArrays.attach(spec)
@@ -0,0 +1,105 @@
+import cv2
+import numpy as np
+import pytest
+from cvc_cli.stereo.solver import calibrate_camera, calibrate_cameras, check_init_distortion, distortion_model, \
+    stereo_rectify, termination_criteria
+
+
+MTX = np.array([[500.0, 0, 320.0], [0, 500.0, 240.0], [0, 0, 1]])
+DIST = np.array([-0.1, 0.02, 0, 0, 0])
+
+
+def board_views(n_views=8):
+    grid = np.mgrid[0:9, 0:6].T.reshape(-1, 2) * 0.025
+    obj = np.c_[grid - grid.mean(axis=0), np.zeros(len(grid))].astype(np.float32)
+    rng = np.random.default_rng(0)
+    obj_pts, img_pts = [], []
+    for _ in range(n_views):
+        rvec = rng.uniform(-0.5, 0.5, 3)
+        tvec = np.r_[rng.uniform(-0.05, 0.05, 2), rng.uniform(0.4, 0.6)]
+        obj_pts.append(obj)
+        img_pts.append(cv2.projectPoints(obj, rvec, tvec, MTX, DIST)[0].astype(np.float32))
+    return obj_pts, img_pts
+
+
+@pytest.mark.parametrize('model, size, name', [
+    ('k1k2', 5, 'standard'),
+    ('standard', 5, 'standard'),
+    ('rational', 8, 'rational'),
+    ('thin-prism', 12, 'thin-prism'),
+])
+def test_distortion_model_of_calibrations(model, size, name):
+    obj_pts, img_pts = board_views()
+    calibration = calibrate_camera(obj_pts, img_pts, (640, 480), model=model, criteria=termination_criteria(100))
+    assert calibration.dist.size == size
+    assert distortion_model(calibration.dist) == name
+    assert calibration.errors.rms < 0.01
+    if model == 'k1k2':
+        assert np.all(calibration.dist.ravel()[2:] == 0)
+
+
+def test_distortion_model_sizes():
+    assert distortion_model(np.zeros((1, 4))) == 'fisheye'
+    assert distortion_model(np.zeros(14)) == 'tilted'
+    with pytest.raises(ValueError):
+        distortion_model(np.zeros(6))
+
+
+def test_fix_intrinsics_only_solves_the_poses():
+    obj_pts, img_pts = board_views()
+    calibration = calibrate_camera(obj_pts, img_pts, (640, 480), MTX, DIST, fix_intrinsics=True)
+    assert calibration.mtx is MTX and calibration.dist is DIST
+    assert calibration.errors.rms < 1e-3
+
+
+def test_init_distortion_must_fit_the_model():
+    obj_pts, img_pts = board_views()
+    with pytest.raises(ValueError, match='standard model.*fisheye model'):
+        calibrate_camera(obj_pts, img_pts, (640, 480), MTX, DIST, model='fisheye')
+    with pytest.raises(ValueError, match='fisheye model.*rational model'):
+        check_init_distortion(np.zeros(4), 'rational')
+    # Any pinhole model can start from another one
+    check_init_distortion(DIST, 'rational')
+    calibration = calibrate_camera(obj_pts, img_pts, (640, 480), MTX, DIST, model='rational')
+    assert calibration.dist.size == 8
+
+
+def corrupt(img_pts, views, seed=1):
+    rng = np.random.default_rng(seed)
+    img_pts = list(img_pts)
+    for view in views:
+        img_pts[view] = img_pts[view] + rng.normal(0, 5, img_pts[view].shape).astype(np.float32)
+    return img_pts
+
+
+def test_calibrate_cameras_rejects_outlier_views():
+    obj_pts, img_pts = board_views(8)
+    img_pts = corrupt(img_pts, [3])
+    kept, (calibration,) = calibrate_cameras(obj_pts, [img_pts], (640, 480), reject_threshold=1, verbose=False)
+    assert kept == [0, 1, 2, 4, 5, 6, 7]
+    assert len(calibration.errors.per_view_rms) == 7
+    assert calibration.errors.rms < 0.01
+    # Without threshold every view is kept
+    kept, (calibration,) = calibrate_cameras(obj_pts, [img_pts], (640, 480), verbose=False)
+    assert kept == list(range(8)) and calibration.errors.rms > 1
+
+
+def test_calibrate_cameras_keeps_min_views():
+    obj_pts, img_pts = board_views(5)
+    img_pts = corrupt(img_pts, [0, 2, 4])
+    kept, _ = calibrate_cameras(obj_pts, [img_pts], (640, 480), reject_threshold=1, min_views=3, verbose=False)
+    assert kept == list(range(5))
+    kept, _ = calibrate_cameras(obj_pts, [img_pts], (640, 480), reject_threshold=1, min_views=2, verbose=False)
+    assert kept == [1, 3]
+
+
+def test_stereo_rectify_defaults_to_opencv_free_scaling():
+    R = cv2.Rodrigues(np.array([0.01, -0.02, 0.005]))[0]
+    T = np.array([[-0.08], [0.001], [0.002]])
+    _, _, rectification = stereo_rectify(MTX, DIST, MTX, DIST, (640, 480), R, T)
+    R1, R2, P1, P2, Q, _, _ = cv2.stereoRectify(MTX, DIST, MTX, DIST, (640, 480), R, T)
+    np.testing.assert_allclose(rectification['P1'], P1)
+    np.testing.assert_allclose(rectification['Q'], Q)
+
+    _, _, keep_all = stereo_rectify(MTX, DIST, MTX, DIST, (640, 480), R, T, rectify_scale=1)
+    assert keep_all['P1'][0, 0] < P1[0, 0]
@@ -0,0 +1,66 @@
+import os
+import types
+from cvc_cli.stereo.utils import get_list_of_images, is_image_file, scan_images, subsample
+
+
+def test_subsample_keeps_everything_by_default():
+    assert subsample(range(10)) == list(range(10))
+    assert subsample(range(10), max_frames=20) == list(range(10))
+
+
+def test_subsample_stride():
+    assert subsample(range(10), stride=3) == [0, 3, 6, 9]
+    assert subsample(range(10), stride=0) == list(range(10))
+
+
+def test_subsample_max_frames_draws_one_frame_per_stratum():
+    items = list(range(100))
+    subset = subsample(items, max_frames=10, seed=1)
+    assert len(subset) == 10
+    assert [item // 10 for item in subset] == list(range(10))
+    assert subset == subsample(items, max_frames=10, seed=1)
+    assert subset != subsample(items, max_frames=10, seed=2)
+
+
+def test_subsample_stride_then_max_frames():
+    subset = subsample(range(100), max_frames=5, stride=2)
+    assert len(subset) == 5
+    assert all(item % 2 == 0 for item in subset)
+    assert subset == sorted(subset)
+
+
+def test_is_image_file():
+    for name in ['a.png', 'a.PNG', 'b.JPG', 'c.jpeg', 'd.Jpeg', 'e.tif', 'f.TIFF', 'g.bmp', 'dir/h.webp']:
+        assert is_image_file(name), name
+    for name in ['a.txt', 'png', 'a.png.bak', 'a.npy', 'a.yml']:
+        assert not is_image_file(name), name
+
+
+def make_images(folder, names):
+    for name in names:
+        path = folder / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'')
+
+
+def test_scan_images(tmp_path):
+    make_images(tmp_path, ['a.PNG', 'b.jpeg', 'c.tif', 'd.TIFF', 'e.bmp', 'notes.txt', 'sub/f.jpg', 'sub/deep/g.png'])
+    (tmp_path / 'folder.png').mkdir()
+    names = sorted(entry.name for entry in scan_images(str(tmp_path)))
+    assert names == ['a.PNG', 'b.jpeg', 'c.tif', 'd.TIFF', 'e.bmp']
+    recursive = sorted(os.path.relpath(entry.path, tmp_path) for entry in scan_images(str(tmp_path), True))
+    assert recursive == ['a.PNG', 'b.jpeg', 'c.tif', 'd.TIFF', 'e.bmp', os.path.join('sub', 'deep', 'g.png'),
+                         os.path.join('sub', 'f.jpg')]
+    paths = sorted(os.path.join(tmp_path, path) for path in recursive)
+    assert get_list_of_images(str(tmp_path), recursive=True) == paths
+
+
+def test_scan_images_is_lazy(tmp_path):
+    make_images(tmp_path, [f'{i}.png' for i in range(3)])
+    entries = scan_images(str(tmp_path))
+    assert isinstance(entries, types.GeneratorType)
+    # The folder is only read when the entries are consumed
+    make_images(tmp_path, ['3.png'])
+    first = next(entries)
+    assert first.name.endswith('.png')
+    assert len([first] + list(entries)) == 4